@@ -1,29 +1,32 @@
 #!/usr/bin/env python3
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import json
-import os
-from datetime import datetime, timedelta
-import mysql.connector
-from mysql.connector import Error
-import openpyxl
-import io
-import base64
-from streamlit_elements import elements, mui, html, dashboard as dash_component, nivo
+from datetime import datetime
+from mysql_stream import DEFAULT_CHUNK_SIZE, build_select, column_type_dtype, quote_identifier, read_streaming
+from data_cache import get_cache, schema_hash
+from data_store import DataSourceStore, get_budget, get_registry
+from file_ingest import content_digest, read_upload
+from kpi_cache import get_kpi_cache
+from kpi_catalog import CATALOG, format_kpi_value, kpi_statuses, kpi_values
+from kpi_engine import PERIOD_WINDOWS, KPIEngine, kpi_signature, resolve_sources
+from incremental import new_refresh_state, refresh, scoped_predicate, suggest_watermark, watermark_of
+from report_jobs import FINISHED, get_job_queue
+from chart_cache import get_chart_cache
+from report_store import BATCH_OWNER, LOCAL_OWNER, get_report_store
+from report_generator import APPENDIX_MAX_ROWS, build_management_report
+from chart_aggregate import AGGREGATIONS, DEFAULT_TOP_N, cached_aggregate
+from expressions import parse_expression
+from transformations import (
+    AGGREGATIONS as PIPELINE_AGGREGATIONS, FILTER_OPERATORS, JOIN_TYPES, OPERATIONS, PipelineEngine, describe,
+    get_pipeline_cache, pipeline_name
+)
+from instrumentation import KINDS, get_metrics, process_rss_bytes, timed
+from dashboard_plan import MONTH_SUFFIX, DashboardPlan
+from downsample import DEFAULT_POINT_BUDGET, DEFAULT_WEBGL_THRESHOLD, METHODS as DOWNSAMPLE_METHODS, downsample
 import streamlit_option_menu as option_menu
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from io import BytesIO
-import plotly.io as pio
-from PIL import Image as PILImage
-import uuid
+import secrets
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 st.set_page_config(
     page_title="Compliance Analytics Platform",
@@ -33,11 +36,9 @@ st.set_page_config(
 )
 
 if 'data_sources' not in st.session_state:
-    st.session_state.data_sources = {}
+    st.session_state.data_sources = DataSourceStore()
 if 'dashboards' not in st.session_state:
     st.session_state.dashboards = {}
-if 'current_dashboard' not in st.session_state:
-    st.session_state.current_dashboard = None
 if 'transformations' not in st.session_state:
     st.session_state.transformations = {}
 if 'theme' not in st.session_state:
@@ -46,10 +47,24 @@ if 'primary_color' not in st.session_state:
     st.session_state.primary_color = '#422AFB'
 if 'secondary_color' not in st.session_state:
     st.session_state.secondary_color = '#7551FF'
-if 'dashboard_layouts' not in st.session_state:
-    st.session_state.dashboard_layouts = {}
-if 'saved_reports' not in st.session_state:
-    st.session_state.saved_reports = {}
+if 'refresh_state' not in st.session_state:
+    st.session_state.refresh_state = {}
+if 'ingested_files' not in st.session_state:
+    st.session_state.ingested_files = {}
+if 'upload_digests' not in st.session_state:
+    st.session_state.upload_digests = {}
+if 'kpi_source_map' not in st.session_state:
+    st.session_state.kpi_source_map = {}
+if 'use_disk_cache' not in st.session_state:
+    st.session_state.use_disk_cache = True
+if 'sql_pushdown' not in st.session_state:
+    st.session_state.sql_pushdown = True
+if 'widget_runs' not in st.session_state:
+    st.session_state.widget_runs = {}
+if 'source_origin' not in st.session_state:
+    st.session_state.source_origin = {}
+if 'remote_tables' not in st.session_state:
+    st.session_state.remote_tables = {}
 
 
 def get_dynamic_css():
@@ -165,159 +180,321 @@ def get_dynamic_css():
     </style>
     """
 
-st.markdown(get_dynamic_css(), unsafe_allow_html=True)
+get_metrics().begin_run()
+with get_metrics().timer("get_dynamic_css"):
+    st.markdown(get_dynamic_css(), unsafe_allow_html=True)
 
 
 class MySQLConnector:
+    # mysql.connector and the pool are imported on first use, so pages that
+    # never touch a database do not load the driver.
+    @staticmethod
+    def pool(host, port, user, password, database):
+        from db_pool import get_pool
+
+        return get_pool(host, port, user, password, database)
+
     @staticmethod
     def test_connection(host, port, user, password, database):
+        from mysql.connector import Error
+
         try:
-            connection = mysql.connector.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
-            )
-            if connection.is_connected():
-                return True, "Conexão bem-sucedida!"
-            return False, "Falha na conexão"
+            with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+                if connection.is_connected():
+                    return True, "Conexão bem-sucedida!"
+                return False, "Falha na conexão"
         except Error as e:
             return False, f"Erro: {str(e)}"
-        finally:
-            if 'connection' in locals() and connection.is_connected():
-                connection.close()
 
     @staticmethod
     def get_tables(host, port, user, password, database):
+        from mysql.connector import Error
+
         try:
-            connection = mysql.connector.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
-            )
-            cursor = connection.cursor()
-            cursor.execute("SHOW TABLES")
-            tables = [table[0] for table in cursor.fetchall()]
+            with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("SHOW TABLES")
+                    tables = [table[0] for table in cursor.fetchall()]
+                finally:
+                    cursor.close()
             return tables
         except Error as e:
             st.error(f"Erro ao listar tabelas: {str(e)}")
             return []
-        finally:
-            if 'connection' in locals() and connection.is_connected():
+
+    @staticmethod
+    @timed('MySQLConnector.fetch_table', 'load')
+    def fetch_table(host, port, user, password, database, table_name, columns=None, where=None,
+                    params=None, streaming=False, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        query = build_select(table_name, columns, where)
+        with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+            # The complete mode buffers the whole result on the client before
+            # converting it; both modes convert and report progress per chunk.
+            cursor = connection.cursor(buffered=not streaming)
+            try:
+                return read_streaming(cursor, query, params, chunk_size, progress)
+            finally:
                 cursor.close()
-                connection.close()
+
+    @staticmethod
+    @timed('MySQLConnector.fetch_query', 'load')
+    def fetch_query(host, port, user, password, database, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        from mysql.connector import Error
+
+        try:
+            with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+                cursor = connection.cursor(buffered=False)
+                try:
+                    return read_streaming(cursor, query, params, chunk_size)
+                finally:
+                    cursor.close()
+        except Error as e:
+            st.warning(f"⚠️ Consulta no MySQL falhou, executando em pandas: {str(e)}")
+            return None
 
     @staticmethod
     def load_table(host, port, user, password, database, table_name):
+        from mysql.connector import Error
+
         try:
-            connection = mysql.connector.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
+            return MySQLConnector.fetch_table(host, port, user, password, database, table_name)
+        except Error as e:
+            st.error(f"Erro ao carregar tabela: {str(e)}")
+            return None
+
+    @staticmethod
+    def stream_table(host, port, user, password, database, table_name, columns=None, where=None,
+                     params=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        from mysql.connector import Error
+
+        try:
+            return MySQLConnector.fetch_table(
+                host, port, user, password, database, table_name, columns=columns, where=where,
+                params=params, streaming=True, chunk_size=chunk_size, progress=progress
             )
-            query = f"SELECT * FROM {table_name}"
-            df = pd.read_sql(query, connection)
-            return df
         except Error as e:
             st.error(f"Erro ao carregar tabela: {str(e)}")
             return None
-        finally:
-            if 'connection' in locals() and connection.is_connected():
-                connection.close()
-
-
-class ReportGenerator:
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.custom_styles = {
-            'Title': ParagraphStyle(
-                'CustomTitle',
-                parent=self.styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#422AFB'),
-                spaceAfter=30,
-                alignment=1
-            ),
-            'Heading': ParagraphStyle(
-                'CustomHeading',
-                parent=self.styles['Heading2'],
-                fontSize=18,
-                textColor=colors.HexColor('#7551FF'),
-                spaceAfter=20
-            ),
-            'Normal': ParagraphStyle(
-                'CustomNormal',
-                parent=self.styles['Normal'],
-                fontSize=12,
-                spaceAfter=12
+
+    @staticmethod
+    def row_estimates(host, port, user, password, database):
+        from mysql.connector import Error
+
+        try:
+            with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(
+                        "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s",
+                        (database,)
+                    )
+                    return {name: int(rows or 0) for name, rows in cursor.fetchall()}
+                finally:
+                    cursor.close()
+        except Error:
+            return {}
+
+    @staticmethod
+    def table_columns(host, port, user, password, database):
+        from mysql.connector import Error
+
+        try:
+            with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(
+                        "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+                        "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION",
+                        (database,)
+                    )
+                    columns = {}
+                    for table, column, column_type in cursor.fetchall():
+                        columns.setdefault(table, []).append((column, column_type))
+                finally:
+                    cursor.close()
+            return columns
+        except Error:
+            return {}
+
+    @staticmethod
+    def schema_hashes(host, port, user, password, database):
+        columns = MySQLConnector.table_columns(host, port, user, password, database)
+        return {table: schema_hash(cols) for table, cols in columns.items()}
+
+    @staticmethod
+    def count_rows(host, port, user, password, database, table_name, where=None):
+        with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+            cursor = connection.cursor()
+            try:
+                query = f"SELECT COUNT(*) FROM {quote_identifier(table_name)}"
+                if where:
+                    query += f" WHERE {where}"
+                cursor.execute(query)
+                return int(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def primary_key(host, port, user, password, database, table_name):
+        from mysql.connector import Error
+
+        try:
+            with MySQLConnector.pool(host, port, user, password, database).connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(
+                        "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+                        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' "
+                        "ORDER BY ORDINAL_POSITION",
+                        (database, table_name)
+                    )
+                    return [row[0] for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+        except Error:
+            return []
+
+    @staticmethod
+    def refresh_table(config, df, state):
+        table = state['table']
+        columns = state.get('columns') or None
+
+        def fetch(where, params):
+            return MySQLConnector.fetch_table(
+                **config, table_name=table, columns=columns, where=scoped_predicate(state, where, params), params=params,
+                streaming=True
             )
-        }
 
-    def create_report(self, report_data, output_buffer):
-        doc = SimpleDocTemplate(
-            output_buffer,
-            pagesize=A4,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=18
+        def count_rows():
+            return MySQLConnector.count_rows(**config, table_name=table, where=scoped_predicate(state))
+
+        def fetch_keys(primary_key):
+            return MySQLConnector.fetch_table(
+                **config, table_name=table, columns=primary_key, where=scoped_predicate(state), streaming=True
+            )
+
+        return refresh(df, state, fetch, count_rows, fetch_keys)
+
+
+def mysql_connection_id(config):
+    return f"mysql://{config['user']}@{config['host']}:{config['port']}/{config['database']}"
+
+
+def signed_in_user():
+    if st.user.get('is_logged_in'):
+        return f"user:{st.user.get('email') or st.user.get('sub')}"
+    return None
+
+
+def report_owner():
+    # Saved reports outlive the browser session, so they belong to the
+    # signed-in user or, without authentication, to the MySQL user.
+    if signed_in_user():
+        return signed_in_user()
+    config = st.session_state.get('mysql_config')
+    if config:
+        return f"mysql:{config['user']}@{config['host']}"
+    return LOCAL_OWNER
+
+
+def mysql_table_id(table, columns=None, where=None):
+    if not columns and not where:
+        return table
+    return f"{table}|{','.join(columns or [])}|{where or ''}"
+
+
+def parse_mysql_table_id(table_id):
+    table, _, rest = table_id.partition('|')
+    columns, _, where = rest.partition('|')
+    return table, [column for column in columns.split(',') if column], where or None
+
+
+def cache_owner():
+    # Cached sources are restored at session start, before any connection
+    # is made, so they belong to the signed-in user or, without
+    # authentication, to a token kept in the page URL.
+    if signed_in_user():
+        return signed_in_user()
+    token = st.query_params.get('sessao')
+    if not token:
+        token = secrets.token_urlsafe(16)
+        st.query_params['sessao'] = token
+    return f"sessao:{token}"
+
+
+def owns_cache_entry(entry):
+    # The disk cache is shared by the whole process; a session only sees its
+    # own entries, the tables of its connection and the files it uploaded.
+    config = st.session_state.get('mysql_config')
+    if cache_owner() in entry.get('owners', []):
+        return True
+    if entry['connection'] == "arquivo":
+        return entry['table'] in st.session_state.upload_digests.values()
+    return config is not None and entry['connection'] == mysql_connection_id(config)
+
+
+def cache_source(name, connection, table, schema=None):
+    st.session_state.source_origin[name] = {'connection': connection, 'table': table, 'schema': schema}
+    if st.session_state.use_disk_cache:
+        get_cache().put(name, st.session_state.data_sources[name], connection, table, schema, owner=cache_owner())
+
+
+def restore_cached_sources():
+    # Read straight from the Arrow files: reopening the app brings back the
+    # session's sources without a round-trip to MySQL.
+    cache = get_cache()
+    for cache_key, entry in cache.entries(owner=cache_owner()).items():
+        if entry['source'] in st.session_state.data_sources:
+            continue
+        df = cache.get_key(cache_key)
+        if df is not None:
+            st.session_state.data_sources[entry['source']] = df
+            st.session_state.source_origin[entry['source']] = {
+                'connection': entry['connection'], 'table': entry['table'], 'schema': entry['schema']
+            }
+            if entry['connection'] == "arquivo":
+                st.session_state.ingested_files[entry['source']] = entry['table']
+
+
+class ParallelTableLoad:
+    def __init__(self, config, tables, max_workers=4, **options):
+        self.config = config
+        self.options = options
+        self.rows_read = {table: 0 for table in tables}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mysql-load")
+        self.pending = {self.executor.submit(self._load, table): table for table in tables}
+
+    def _load(self, table):
+        def progress(rows):
+            self.rows_read[table] = rows
+        started = time.perf_counter()
+        df = MySQLConnector.fetch_table(
+            self.config['host'], self.config['port'], self.config['user'], self.config['password'],
+            self.config['database'], table, progress=progress, **self.options
         )
-        story = []
-        title = Paragraph(report_data['title'], self.custom_styles['Title'])
-        story.append(title)
-        story.append(Spacer(1, 20))
-        info_data = [
-            ['Data de Geração:', datetime.now().strftime('%d/%m/%Y %H:%M')],
-            ['Período:', report_data.get('period', 'Últimos 12 meses')],
-            ['Responsável:', report_data.get('responsible', 'Sistema Automático')]
-        ]
-        info_table = Table(info_data, colWidths=[150, 350])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333'))
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 30))
-        for section in report_data['sections']:
-            heading = Paragraph(section['title'], self.custom_styles['Heading'])
-            story.append(heading)
-            if section['type'] == 'text':
-                para = Paragraph(section['content'], self.custom_styles['Normal'])
-                story.append(para)
-            elif section['type'] == 'metrics':
-                metrics_data = []
-                for metric in section['content']:
-                    metrics_data.append([
-                        metric['name'],
-                        str(metric['value']),
-                        metric.get('status', '✓')
-                    ])
-                metrics_table = Table(metrics_data, colWidths=[200, 100, 50])
-                metrics_table.setStyle(TableStyle([
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f0f0f0'))
-                ]))
-                story.append(metrics_table)
-            elif section['type'] == 'chart':
-                if 'figure' in section['content']:
-                    img_buffer = BytesIO()
-                    section['content']['figure'].write_image(img_buffer, format='png')
-                    img_buffer.seek(0)
-                    img = Image(img_buffer, width=450, height=300)
-                    story.append(img)
-            story.append(Spacer(1, 20))
-        doc.build(story)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.rows_read[table] = len(df)
+        size_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+        return df, {
+            'rows': len(df),
+            'seconds': elapsed,
+            'mb': size_mb,
+            'rows_per_s': len(df) / elapsed,
+            'mb_per_s': size_mb / elapsed
+        }
+
+    def poll(self, timeout=0.25):
+        done, _ = wait(self.pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            table = self.pending.pop(future)
+            try:
+                df, metrics = future.result()
+                yield table, df, metrics, None
+            except Exception as e:
+                yield table, None, None, e
+        if not self.pending:
+            self.executor.shutdown(wait=False)
 
 
 def get_dashboard_templates():
@@ -328,12 +505,21 @@ def get_dashboard_templates():
                 "rows": 3,
                 "cols": 4,
                 "widgets": [
-                    {"type": "kpi", "title": "Compliance Score", "row": 0, "col": 0, "width": 1, "height": 1},
-                    {"type": "kpi", "title": "Riscos Críticos", "row": 0, "col": 1, "width": 1, "height": 1},
-                    {"type": "kpi", "title": "Treinamentos", "row": 0, "col": 2, "width": 1, "height": 1},
-                    {"type": "kpi", "title": "Incidentes", "row": 0, "col": 3, "width": 1, "height": 1},
-                    {"type": "chart", "title": "Evolução Compliance", "row": 1, "col": 0, "width": 2, "height": 2},
-                    {"type": "chart", "title": "Riscos por Área", "row": 1, "col": 2, "width": 2, "height": 2}
+                    {"type": "kpi", "title": "Compliance Score", "row": 0, "col": 0, "width": 1, "height": 1,
+                     "query": {"compliance_score": True}},
+                    {"type": "kpi", "title": "Riscos Críticos", "row": 0, "col": 1, "width": 1, "height": 1,
+                     "query": {"kpi": ("2. Avaliação de Riscos", "Riscos Críticos")}},
+                    {"type": "kpi", "title": "Treinamentos", "row": 0, "col": 2, "width": 1, "height": 1,
+                     "query": {"kpi": ("5. Treinamento e Comunicação", "Taxa de Participação")}},
+                    {"type": "kpi", "title": "Incidentes", "row": 0, "col": 3, "width": 1, "height": 1,
+                     "query": {"kpi": ("10. Avaliação de Terceiros", "Incidentes")}},
+                    {"type": "chart", "title": "Evolução Compliance", "row": 1, "col": 0, "width": 2, "height": 2,
+                     "query": {"source": "riscos", "by": ["data_identificacao:mes"], "measures": [("score", "mean")],
+                               "date": "data_identificacao", "window": "12m",
+                               "sort": "data_identificacao:mes", "ascending": True}},
+                    {"type": "chart", "title": "Riscos por Área", "row": 1, "col": 2, "width": 2, "height": 2,
+                     "query": {"source": "riscos", "by": ["unidade"], "agg": "count",
+                               "date": "data_identificacao", "window": "12m", "sort": "valor", "limit": 15}}
                 ]
             }
         },
@@ -343,9 +529,14 @@ def get_dashboard_templates():
                 "rows": 4,
                 "cols": 3,
                 "widgets": [
-                    {"type": "table", "title": "Ações Pendentes", "row": 0, "col": 0, "width": 3, "height": 1},
-                    {"type": "chart", "title": "Performance por Pilar", "row": 1, "col": 0, "width": 3, "height": 2},
-                    {"type": "metrics", "title": "Métricas Detalhadas", "row": 3, "col": 0, "width": 3, "height": 1}
+                    {"type": "table", "title": "Ações Pendentes", "row": 0, "col": 0, "width": 3, "height": 1,
+                     "query": {"source": "denuncias", "filters": {"status": ["Aberta", "Em análise"]},
+                               "top": 10, "order_by": "severidade",
+                               "columns": ["data_recebimento", "categoria", "status", "severidade"]}},
+                    {"type": "chart", "title": "Performance por Pilar", "row": 1, "col": 0, "width": 3, "height": 2,
+                     "query": {"pillar_scores": True}},
+                    {"type": "metrics", "title": "Métricas Detalhadas", "row": 3, "col": 0, "width": 3, "height": 1,
+                     "query": {"kpi_table": True}}
                 ]
             }
         },
@@ -355,161 +546,57 @@ def get_dashboard_templates():
                 "rows": 3,
                 "cols": 3,
                 "widgets": [
-                    {"type": "heatmap", "title": "Matriz de Riscos", "row": 0, "col": 0, "width": 3, "height": 2},
-                    {"type": "table", "title": "Top 10 Riscos", "row": 2, "col": 0, "width": 2, "height": 1},
-                    {"type": "kpi", "title": "Score de Risco", "row": 2, "col": 2, "width": 1, "height": 1}
+                    {"type": "heatmap", "title": "Matriz de Riscos", "row": 0, "col": 0, "width": 3, "height": 2,
+                     "query": {"source": "riscos", "by": ["nivel", "unidade"], "agg": "count",
+                               "date": "data_identificacao", "window": "12m"}},
+                    {"type": "table", "title": "Top 10 Riscos", "row": 2, "col": 0, "width": 2, "height": 1,
+                     "query": {"source": "riscos", "top": 10, "order_by": "score",
+                               "columns": ["unidade", "nivel", "score", "data_identificacao"],
+                               "date": "data_identificacao", "window": "12m"}},
+                    {"type": "kpi", "title": "Score de Risco", "row": 2, "col": 2, "width": 1, "height": 1,
+                     "query": {"kpi": ("2. Avaliação de Riscos", "Score de Risco")}}
                 ]
             }
         }
     }
 
 
-def create_compliance_pillars():
-    return {
-        "1. Suporte da Alta Administração": {
-            "icon": "👥",
-            "kpis": [
-                {"name": "Participação em Reuniões", "type": "percentage", "target": 95},
-                {"name": "Orçamento Aprovado", "type": "currency", "target": 2500000},
-                {"name": "Tempo de Resposta", "type": "days", "target": 5},
-                {"name": "Comunicações Oficiais", "type": "count", "target": 12},
-                {"name": "Treinamentos Liderança", "type": "count", "target": 4}
-            ]
-        },
-        "2. Avaliação de Riscos": {
-            "icon": "⚠️",
-            "kpis": [
-                {"name": "Riscos Identificados", "type": "count", "target": 100},
-                {"name": "Riscos Críticos", "type": "count", "target": 10},
-                {"name": "Tempo de Mitigação", "type": "days", "target": 30},
-                {"name": "Cobertura de Avaliação", "type": "percentage", "target": 100},
-                {"name": "Score de Risco", "type": "score", "target": 80}
-            ]
-        },
-        "3. Código de Conduta": {
-            "icon": "📜",
-            "kpis": [
-                {"name": "Taxa de Aceitação", "type": "percentage", "target": 100},
-                {"name": "Revisões Realizadas", "type": "count", "target": 1},
-                {"name": "Violações Reportadas", "type": "count", "target": 0},
-                {"name": "Tempo de Atualização", "type": "days", "target": 365},
-                {"name": "Índice de Compreensão", "type": "score", "target": 90}
-            ]
-        },
-        "4. Controles Internos": {
-            "icon": "🔒",
-            "kpis": [
-                {"name": "Controles Implementados", "type": "percentage", "target": 95},
-                {"name": "Taxa de Efetividade", "type": "percentage", "target": 90},
-                {"name": "Deficiências Identificadas", "type": "count", "target": 5},
-                {"name": "Tempo de Correção", "type": "days", "target": 15},
-                {"name": "Automatização", "type": "percentage", "target": 70}
-            ]
-        },
-        "5. Treinamento e Comunicação": {
-            "icon": "🎓",
-            "kpis": [
-                {"name": "Horas per Capita", "type": "hours", "target": 8},
-                {"name": "Taxa de Participação", "type": "percentage", "target": 98},
-                {"name": "Score de Avaliação", "type": "score", "target": 85},
-                {"name": "Comunicações Enviadas", "type": "count", "target": 24},
-                {"name": "Engajamento", "type": "percentage", "target": 80}
-            ]
-        },
-        "6. Monitoramento e Auditoria": {
-            "icon": "🔍",
-            "kpis": [
-                {"name": "Cobertura de Auditoria", "type": "percentage", "target": 100},
-                {"name": "Findings por Auditoria", "type": "count", "target": 10},
-                {"name": "Tempo de Resolução", "type": "days", "target": 30},
-                {"name": "Reincidências", "type": "count", "target": 0},
-                {"name": "Score de Maturidade", "type": "score", "target": 85}
-            ]
-        },
-        "7. Resposta a Violações": {
-            "icon": "⚡",
-            "kpis": [
-                {"name": "Tempo de Resposta", "type": "hours", "target": 24},
-                {"name": "Taxa de Resolução", "type": "percentage", "target": 95},
-                {"name": "Severidade Média", "type": "score", "target": 30},
-                {"name": "Ações Disciplinares", "type": "count", "target": 5},
-                {"name": "Lições Aprendidas", "type": "count", "target": 12}
-            ]
-        },
-        "8. Melhoria Contínua": {
-            "icon": "📈",
-            "kpis": [
-                {"name": "Melhorias Implementadas", "type": "count", "target": 20},
-                {"name": "ROI de Compliance", "type": "percentage", "target": 150},
-                {"name": "Benchmarking Score", "type": "score", "target": 90},
-                {"name": "Inovações Adotadas", "type": "count", "target": 5},
-                {"name": "Feedback Score", "type": "score", "target": 85}
-            ]
-        },
-        "9. Documentação e Evidências": {
-            "icon": "📄",
-            "kpis": [
-                {"name": "Documentos Atualizados", "type": "percentage", "target": 95},
-                {"name": "Completude de Evidências", "type": "percentage", "target": 98},
-                {"name": "Tempo de Recuperação", "type": "minutes", "target": 30},
-                {"name": "Auditabilidade", "type": "percentage", "target": 100},
-                {"name": "Digitalização", "type": "percentage", "target": 90}
-            ]
-        },
-        "10. Avaliação de Terceiros": {
-            "icon": "🤝",
-            "kpis": [
-                {"name": "Due Diligence", "type": "percentage", "target": 100},
-                {"name": "Score de Risco", "type": "score", "target": 70},
-                {"name": "Contratos Conformes", "type": "percentage", "target": 95},
-                {"name": "Monitoramento", "type": "percentage", "target": 90},
-                {"name": "Incidentes", "type": "count", "target": 0}
-            ]
-        },
-        "11. LGPD e Privacidade": {
-            "icon": "🛡️",
-            "kpis": [
-                {"name": "Consentimentos", "type": "percentage", "target": 100},
-                {"name": "Solicitações Atendidas", "type": "percentage", "target": 95},
-                {"name": "Tempo de Resposta", "type": "days", "target": 15},
-                {"name": "Incidentes", "type": "count", "target": 0},
-                {"name": "Mapeamento de Dados", "type": "percentage", "target": 100}
-            ]
-        }
-    }
-
-
 def main():
+    if 'cache_restored' not in st.session_state:
+        st.session_state.cache_restored = True
+        if st.session_state.use_disk_cache:
+            restore_cached_sources()
     st.markdown('<h1 class="main-header">🛡️ Compliance Analytics Platform</h1>', unsafe_allow_html=True)
     with st.sidebar:
         st.markdown("## 🎯 Menu Principal")
-        pillars = create_compliance_pillars()
+        pillars = CATALOG.pillars
         pillar_labels = [f"{data['icon']} {name}" for name, data in pillars.items()]
         pillar_map = {label: name for label, name in zip(pillar_labels, pillars.keys())}
         menu_items = ["Visão Geral"] + pillar_labels + ["🔗 Conexões", "🔄 Transformações", "📈 Visualizações", "📑 Relatórios", "⚙️ Configurações"]
-        selected = option_menu.option_menu(
-            menu_title=None,
-            options=menu_items,
-            icons=["graph-up"] + ["" for _ in pillar_labels] + ["link-45deg", "arrow-repeat", "bar-chart-line", "file-text", "gear"],
-            menu_icon="cast",
-            default_index=0,
-            styles={
-                "container": {"padding": "0!important", "background-color": "transparent"},
-                "icon": {"color": st.session_state.primary_color, "font-size": "20px"},
-                "nav-link": {
-                    "font-size": "16px",
-                    "text-align": "left",
-                    "margin": "5px",
-                    "border-radius": "10px",
-                    "background-color": "rgba(255, 255, 255, 0.05)",
-                    "--hover-color": "rgba(102, 126, 234, 0.2)"
-                },
-                "nav-link-selected": {
-                    "background-color": "rgba(102, 126, 234, 0.3)",
-                    "font-weight": "bold"
+        with get_metrics().timer("option_menu"):
+            selected = option_menu.option_menu(
+                menu_title=None,
+                options=menu_items,
+                icons=["graph-up"] + ["" for _ in pillar_labels] + ["link-45deg", "arrow-repeat", "bar-chart-line", "file-text", "gear"],
+                menu_icon="cast",
+                default_index=0,
+                styles={
+                    "container": {"padding": "0!important", "background-color": "transparent"},
+                    "icon": {"color": st.session_state.primary_color, "font-size": "20px"},
+                    "nav-link": {
+                        "font-size": "16px",
+                        "text-align": "left",
+                        "margin": "5px",
+                        "border-radius": "10px",
+                        "background-color": "rgba(255, 255, 255, 0.05)",
+                        "--hover-color": "rgba(102, 126, 234, 0.2)"
+                    },
+                    "nav-link-selected": {
+                        "background-color": "rgba(102, 126, 234, 0.3)",
+                        "font-weight": "bold"
+                    }
                 }
-            }
-        )
+            )
         theme_toggle = st.toggle("Modo Claro", value=st.session_state.theme == "light")
         if theme_toggle and st.session_state.theme != "light":
             st.session_state.theme = "light"
@@ -520,9 +607,8 @@ def main():
     if selected == "Visão Geral":
         render_dashboard()
     elif selected in pillar_map:
-        pillars = create_compliance_pillars()
         key = pillar_map[selected]
-        render_pillar_dashboard(key, pillars[key])
+        render_pillar_dashboard(key, CATALOG.pillars[key])
     elif selected == "🔗 Conexões":
         render_connections()
     elif selected == "🔄 Transformações":
@@ -535,9 +621,10 @@ def main():
         render_settings()
 
 
+@timed()
 def render_dashboard():
     st.markdown("## 📊 Dashboard de Compliance")
-    col1, col2, col3 = st.columns([2, 2, 1])
+    col1, col2 = st.columns(2)
     with col1:
         template_options = ["Customizado"] + list(get_dashboard_templates().keys())
         selected_template = st.selectbox("Selecione um template:", template_options)
@@ -545,29 +632,135 @@ def render_dashboard():
         if selected_template != "Customizado":
             template_info = get_dashboard_templates()[selected_template]
             st.info(f"📋 {template_info['description']}")
-    with col3:
-        if st.button("💾 Salvar Layout"):
-            layout_name = f"Layout_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            st.session_state.dashboard_layouts[layout_name] = st.session_state.current_dashboard
-            st.success("Layout salvo!")
-    st.markdown("### 🎯 Área de Dashboard (Drag & Drop)")
-    with elements("dashboard"):
-        layout = [
-            dash_component.Item("kpi1", 0, 0, 3, 2),
-            dash_component.Item("kpi2", 3, 0, 3, 2),
-            dash_component.Item("kpi3", 6, 0, 3, 2),
-            dash_component.Item("kpi4", 9, 0, 3, 2),
-            dash_component.Item("chart1", 0, 2, 6, 4),
-            dash_component.Item("chart2", 6, 2, 6, 4),
-            dash_component.Item("table1", 0, 6, 12, 3),
-        ]
-        with dash_component.Grid(layout, cols=12, rowHeight=60):
-            for i in range(1, 5):
-                with mui.Card(key=f"kpi{i}", sx={"p": 2, "bgcolor": "rgba(102, 126, 234, 0.1)"}):
-                    mui.Typography(f"KPI {i}", variant="h6", sx={"color": st.session_state.primary_color})
-                    mui.Typography(f"{np.random.randint(70, 100)}%", variant="h3", sx={"color": st.session_state.secondary_color})
-                    mui.Typography("Meta: 95%", variant="body2", sx={"opacity": 0.7})
-            with mui.Card(key="chart1", sx={"p": 2}):
+    st.markdown("### 🎯 Área de Dashboard")
+    if selected_template != "Customizado":
+        render_template_dashboard(selected_template)
+        return
+    visible = [widget for widget in DASHBOARD_WIDGETS if not widget.get('optional')]
+    for row in sorted({widget['row'] for widget in visible}):
+        widgets = [widget for widget in visible if widget['row'] == row]
+        for widget, column in zip(widgets, st.columns([widget['width'] for widget in widgets])):
+            with column:
+                render_dashboard_widget(widget)
+    # Optional widgets are only computed once the section is opened.
+    if st.toggle("📋 Mostrar widgets adicionais", key="dashboard_show_optional"):
+        for widget in DASHBOARD_WIDGETS:
+            if widget.get('optional'):
+                render_dashboard_widget(widget)
+
+
+@timed()
+def render_template_dashboard(template_name):
+    widgets = get_dashboard_templates()[template_name]['layout']['widgets']
+    period = st.selectbox("Período:", list(PERIOD_WINDOWS.keys()), index=3, key="template_period")
+    window = PERIOD_WINDOWS[period]
+    plan = DashboardPlan(widgets, window=window)
+    sources = get_datasets()
+    resolved = resolve_sources(sources, plan.sources, st.session_state.kpi_source_map)
+    frames = {logical: sources[name] for logical, name in resolved.items()}
+    versions = {logical: sources.version(name) for logical, name in resolved.items()}
+    kpi_results = compute_kpis(window=window, entries=plan.kpi_entries) if plan.kpi_entries else None
+    results, stats = plan.execute(frames, kpi_results, versions)
+    for row in sorted({widget['row'] for widget in widgets}):
+        row_widgets = sorted(
+            [(index, widget) for index, widget in enumerate(widgets) if widget['row'] == row],
+            key=lambda item: item[1]['col']
+        )
+        columns = st.columns([widget['width'] for _, widget in row_widgets])
+        for (index, widget), column in zip(row_widgets, columns):
+            with column:
+                render_template_widget(widget, results[index])
+    with st.expander("🧭 Plano de Execução"):
+        st.caption(
+            f"{stats['widgets']} widgets · {stats['scans']} varredura(s) executada(s) "
+            f"({stats['rows_scanned']:,} linhas) · {stats['cached_scans']} em cache · "
+            f"{stats['group_bys']} agrupamento(s) · {stats['derived']} derivado(s) · {stats['seconds'] * 1000:.0f} ms"
+        )
+        st.dataframe(plan.explain(), use_container_width=True, hide_index=True)
+
+
+@timed()
+def render_template_widget(widget, result):
+    import plotly.express as px
+
+    query = widget.get('query') or {}
+    if result is None:
+        source = query.get('source')
+        st.info(f"{widget['title']}: sem dados" + (f" — carregue a fonte '{source}'." if source else "."))
+        return
+    if widget['type'] == 'kpi':
+        if 'compliance_score' in query:
+            st.metric(widget['title'], f"{result:.1f}%")
+        else:
+            pillar, name = query['kpi']
+            kpi = next(kpi for kpi in CATALOG.pillars[pillar]['kpis'] if kpi['name'] == name)
+            st.metric(widget['title'], format_kpi_value(kpi, result['value']), result['status'], delta_color="off")
+    elif widget['type'] == 'heatmap':
+        rows, columns = result.columns[:2]
+        matrix = result.pivot(index=rows, columns=columns, values=result.columns[-1]).fillna(0)
+        fig = px.imshow(matrix, title=widget['title'], aspect='auto', color_continuous_scale='Reds')
+        fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+        st.plotly_chart(fig, use_container_width=True)
+    elif widget['type'] == 'chart':
+        x, y = result.columns[0], result.columns[-1]
+        if str(x).endswith(MONTH_SUFFIX):
+            fig = px.line(result, x=x, y=y, title=widget['title'], markers=True)
+        else:
+            fig = px.bar(result, x=x, y=y, title=widget['title'])
+        fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', xaxis_title=None)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.markdown(f"**{widget['title']}**")
+        st.dataframe(result, use_container_width=True, hide_index=True)
+
+
+DASHBOARD_WIDGETS = [
+    {"key": "kpi1", "type": "kpi", "row": 0, "width": 3, "kpi": ("2. Avaliação de Riscos", "Riscos Críticos")},
+    {"key": "kpi2", "type": "kpi", "row": 0, "width": 3, "kpi": ("5. Treinamento e Comunicação", "Taxa de Participação")},
+    {"key": "kpi3", "type": "kpi", "row": 0, "width": 3, "kpi": ("7. Resposta a Violações", "Taxa de Resolução")},
+    {"key": "kpi4", "type": "kpi", "row": 0, "width": 3, "kpi": ("10. Avaliação de Terceiros", "Incidentes")},
+    {"key": "chart1", "type": "line", "row": 1, "width": 6},
+    {"key": "chart2", "type": "pie", "row": 1, "width": 6},
+    {"key": "table1", "type": "table", "row": 2, "width": 12, "optional": True},
+]
+
+
+def record_widget_run(key, started):
+    run = st.session_state.widget_runs.setdefault(key, {'runs': 0})
+    run['runs'] += 1
+    run['ms'] = (time.perf_counter() - started) * 1000
+    # Drawn inside the fragment so it is refreshed whenever this widget
+    # reruns on its own.
+    st.caption(f"🔁 #{run['runs']} · {datetime.now().strftime('%H:%M:%S')} · {run['ms']:.0f} ms")
+
+
+@st.fragment
+@timed()
+def render_dashboard_widget(widget):
+    from streamlit_elements import elements, mui, nivo
+
+    started = time.perf_counter()
+    key = widget['key']
+    if widget['type'] == 'kpi':
+        options = [f"{pillar} · {kpi['name']}" for pillar, kpi in CATALOG.entries]
+        default = options.index(f"{widget['kpi'][0]} · {widget['kpi'][1]}")
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            choice = st.selectbox("KPI:", options, index=default, key=f"{key}_kpi", label_visibility="collapsed")
+        with col2:
+            st.button("🔄", key=f"{key}_refresh", help="Recalcular este widget")
+        pillar, kpi = CATALOG.entries[options.index(choice)]
+        results = compute_kpis(entries=[(pillar, kpi)])
+        value = kpi_values(results, pillar).get(kpi['name'])
+        status = kpi_statuses(results, pillar).get(kpi['name'], "⚪")
+        with elements(f"dashboard_{key}"):
+            with mui.Card(sx={"p": 2, "bgcolor": "rgba(102, 126, 234, 0.1)"}):
+                mui.Typography(kpi['name'], variant="h6", sx={"color": st.session_state.primary_color})
+                mui.Typography(format_kpi_value(kpi, value), variant="h3", sx={"color": st.session_state.secondary_color})
+                mui.Typography(f"Meta: {kpi['target']} {status}", variant="body2", sx={"opacity": 0.7})
+    elif widget['type'] == 'line':
+        with elements(f"dashboard_{key}"):
+            with mui.Card(sx={"p": 2, "height": 240}):
                 mui.Typography("Evolução Compliance", variant="h6")
                 nivo.Line(
                     data=[{
@@ -587,7 +780,9 @@ def render_dashboard():
                     enableGridY=True,
                     theme={"axis": {"legend": {"text": {"fill": "#ffffff"}}}}
                 )
-            with mui.Card(key="chart2", sx={"p": 2}):
+    elif widget['type'] == 'pie':
+        with elements(f"dashboard_{key}"):
+            with mui.Card(sx={"p": 2, "height": 240}):
                 mui.Typography("Riscos por Categoria", variant="h6")
                 nivo.Pie(
                     data=[
@@ -600,7 +795,9 @@ def render_dashboard():
                     padAngle=0.7,
                     cornerRadius=3,
                 )
-            with mui.Card(key="table1", sx={"p": 2}):
+    elif widget['type'] == 'table':
+        with elements(f"dashboard_{key}"):
+            with mui.Card(sx={"p": 2}):
                 mui.Typography("Ações Pendentes", variant="h6")
                 with mui.Table():
                     with mui.TableHead():
@@ -616,38 +813,137 @@ def render_dashboard():
                                 mui.TableCell(f"Ação de compliance {i+1}")
                                 mui.TableCell("Alta" if i < 2 else "Média")
                                 mui.TableCell(f"{i+5} dias")
+    record_widget_run(key, started)
+
+
+def mysql_remote(name):
+    config = st.session_state.get('mysql_config')
+    if name in st.session_state.data_sources:
+        origin = st.session_state.source_origin.get(name)
+    else:
+        origin = st.session_state.remote_tables.get(name)
+    if not (st.session_state.sql_pushdown and config and origin and name.startswith("MySQL: ")):
+        return None
+    table = name[len("MySQL: "):]
+    # Only sources that hold the whole table of the current connection can be
+    # swapped for a query; column or WHERE subsets would change the result.
+    if origin['connection'] != mysql_connection_id(config) or origin['table'] != table:
+        return None
+
+    def fetch(query, params):
+        return MySQLConnector.fetch_query(**config, query=query, params=params)
+    return table, fetch
 
 
+def register_remote_tables(config, tables):
+    # Tables are described from information_schema only; pipelines over them
+    # run as SQL and the table is loaded the first time pandas needs it.
+    columns = MySQLConnector.table_columns(**config)
+    for table in tables:
+        if table not in columns:
+            st.error(f"❌ {table}: colunas não encontradas.")
+            continue
+        st.session_state.remote_tables[f"MySQL: {table}"] = {
+            'connection': mysql_connection_id(config),
+            'table': table,
+            'schema': schema_hash(columns[table]),
+            'dtypes': {column: column_type_dtype(kind) for column, kind in columns[table]}
+        }
+        st.success(f"🗄️ Tabela '{table}' disponível para transformações no MySQL ({len(columns[table])} colunas).")
+
+
+def load_remote_table(name):
+    entry = st.session_state.remote_tables[name]
+    config = st.session_state.get('mysql_config')
+    if not config or mysql_connection_id(config) != entry['connection']:
+        raise ValueError(f"Conecte-se ao MySQL de '{name}' para carregar a tabela.")
+    st.session_state.data_sources[name] = MySQLConnector.fetch_table(**config, table_name=entry['table'], streaming=True)
+    cache_source(name, entry['connection'], entry['table'], entry['schema'])
+    return st.session_state.data_sources[name]
+
+
+def get_datasets():
+    remote_sources = {
+        name: {
+            'version': f"{entry['connection']}/{entry['table']}:{entry['schema']}",
+            'dtypes': entry['dtypes'],
+            'load': lambda name=name: load_remote_table(name)
+        }
+        for name, entry in st.session_state.remote_tables.items()
+    }
+    return PipelineEngine(
+        st.session_state.data_sources, st.session_state.transformations, remote=mysql_remote,
+        remote_sources=remote_sources
+    )
+
+
+@timed(kind='compute')
+def compute_kpis(window=None, group_by=None, entries=None):
+    catalog = entries or CATALOG.entries
+    sources = get_datasets()
+    logical_sources = {kpi['source'] for _, kpi in catalog if kpi.get('source')}
+    resolved = resolve_sources(sources, logical_sources, st.session_state.kpi_source_map)
+    as_of = pd.Timestamp.now().normalize()
+    cache = get_kpi_cache()
+    blocks = []
+    missing = []
+    for pillar, kpi in catalog:
+        name = resolved.get(kpi.get('source'))
+        if name is None:
+            continue
+        version = sources.version(name)
+        key = (pillar, kpi['name'], window, group_by, as_of, kpi_signature(kpi), version)
+        cached = cache.get(key)
+        if cached is None:
+            missing.append((pillar, kpi, key, version))
+        else:
+            blocks.append(cached)
+    if missing:
+        engine = KPIEngine([(pillar, kpi) for pillar, kpi, _, _ in missing])
+        frames = {logical: sources[resolved[logical]] for logical in engine.sources}
+        computed = engine.compute(frames, window=window, group_by=group_by)
+        for pillar, kpi, key, version in missing:
+            block = computed[(computed['pillar'] == pillar) & (computed['kpi'] == kpi['name'])]
+            cache.put(key, version, block)
+            blocks.append(block)
+    if not blocks:
+        return pd.DataFrame(columns=['pillar', 'kpi', 'value', 'status'])
+    results = pd.concat(blocks, ignore_index=True)
+    results['status'] = CATALOG.icons(CATALOG.evaluate_frame(results))
+    return results
+
+
+@timed()
+def render_kpi_source_mapping(pillar_data):
+    logical_sources = sorted({kpi['source'] for kpi in pillar_data['kpis'] if kpi.get('source')})
+    options = ["(automático)"] + get_datasets().names()
+    with st.expander("🔗 Fontes de Dados dos KPIs"):
+        for logical in logical_sources:
+            current = st.session_state.kpi_source_map.get(logical)
+            choice = st.selectbox(
+                f"{logical}:", options,
+                index=options.index(current) if current in options else 0,
+                key=f"kpi_source_{logical}"
+            )
+            if choice == "(automático)":
+                st.session_state.kpi_source_map.pop(logical, None)
+            else:
+                st.session_state.kpi_source_map[logical] = choice
+
+
+@timed()
 def render_pillar_dashboard(pillar_name, pillar_data):
     st.markdown(f"### {pillar_name}")
+    render_kpi_source_mapping(pillar_data)
+    results = compute_kpis()
+    values = kpi_values(results, pillar_name)
+    statuses = kpi_statuses(results, pillar_name)
     cols = st.columns(5)
     for idx, kpi in enumerate(pillar_data['kpis']):
         with cols[idx]:
-            if kpi['type'] == 'percentage':
-                value = np.random.randint(70, 100)
-                display_value = f"{value}%"
-            elif kpi['type'] == 'currency':
-                value = np.random.randint(1000000, 3000000)
-                display_value = f"R$ {value/1000000:.1f}M"
-            elif kpi['type'] == 'days':
-                value = np.random.randint(1, 30)
-                display_value = f"{value} dias"
-            elif kpi['type'] == 'hours':
-                value = np.random.randint(1, 48)
-                display_value = f"{value}h"
-            elif kpi['type'] == 'minutes':
-                value = np.random.randint(10, 60)
-                display_value = f"{value} min"
-            elif kpi['type'] == 'count':
-                value = np.random.randint(0, 50)
-                display_value = str(value)
-            else:
-                value = np.random.randint(60, 100)
-                display_value = f"{value}/100"
-            if kpi['type'] in ['percentage', 'score']:
-                status = "✅" if value >= kpi['target'] * 0.9 else "⚠️"
-            else:
-                status = "✅" if value <= kpi['target'] * 1.1 else "⚠️"
+            value = values.get(kpi['name'])
+            display_value = format_kpi_value(kpi, value)
+            status = statuses.get(kpi['name'], "⚪")
             st.markdown(f"""
             <div class="kpi-card">
                 <div class="kpi-value">{display_value}</div>
@@ -655,8 +951,11 @@ def render_pillar_dashboard(pillar_name, pillar_data):
                 <div class="kpi-label">Meta: {kpi['target']} {status}</div>
             </div>
             """, unsafe_allow_html=True)
+    if not values:
+        st.info("📭 Nenhuma fonte de dados deste pilar foi carregada. Carregue as tabelas em 🔗 Conexões.")
 
 
+@timed()
 def render_connections():
     st.markdown("## 🔗 Conexões de Dados")
     tab1, tab2, tab3 = st.tabs(["🗄️ MySQL", "📁 Arquivos", "🌐 APIs"])
@@ -688,8 +987,6 @@ def render_connections():
                 tables = MySQLConnector.get_tables(host, port, user, password, database)
                 if tables:
                     st.success(f"✅ Conectado! {len(tables)} tabelas encontradas.")
-                    if 'mysql_config' not in st.session_state:
-                        st.session_state.mysql_config = {}
                     st.session_state.mysql_config = {
                         'host': host,
                         'port': port,
@@ -697,55 +994,267 @@ def render_connections():
                         'password': password,
                         'database': database
                     }
-                    st.markdown("#### 📊 Tabelas Disponíveis")
-                    selected_tables = st.multiselect(
-                        "Selecione as tabelas para carregar:",
-                        tables,
-                        default=tables[:3] if len(tables) >= 3 else tables
+                    st.session_state.mysql_tables = tables
+                else:
+                    st.error("❌ Não foi possível conectar ao banco de dados.")
+        if st.session_state.get('mysql_tables'):
+            tables = st.session_state.mysql_tables
+            config = st.session_state.mysql_config
+            st.markdown("#### 📊 Tabelas Disponíveis")
+            selected_tables = st.multiselect(
+                "Selecione as tabelas para carregar:",
+                tables,
+                default=tables[:3] if len(tables) >= 3 else tables
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                load_mode = st.radio("Modo de carregamento:", ["Completo", "Streaming"], horizontal=True)
+                chunk_size = st.number_input("Linhas por bloco:", value=DEFAULT_CHUNK_SIZE, min_value=1000, step=10000)
+            with col2:
+                columns_text = st.text_input("Colunas (separadas por vírgula):", placeholder="todas")
+                where = st.text_input("Filtro WHERE:", placeholder="data >= '2024-01-01'")
+            columns = [c.strip() for c in columns_text.split(",") if c.strip()] or None
+            max_workers = st.slider("Cargas paralelas:", 1, 8, 4)
+            if st.button(
+                "🗄️ Usar no MySQL sem carregar",
+                help="As transformações sobre estas tabelas rodam como consultas; a tabela só é carregada "
+                     "quando uma etapa precisar do pandas."
+            ) and selected_tables:
+                register_remote_tables(config, selected_tables)
+            if st.button("📥 Carregar Tabelas Selecionadas") and selected_tables:
+                options = {'streaming': load_mode == "Streaming"}
+                if options['streaming']:
+                    options.update(columns=columns, where=where or None, chunk_size=int(chunk_size))
+                connection_id = mysql_connection_id(config)
+                table_ids = {
+                    table: mysql_table_id(table, options.get('columns'), options.get('where'))
+                    for table in selected_tables
+                }
+                schemas = {}
+                cached = {}
+                if st.session_state.use_disk_cache:
+                    schemas = MySQLConnector.schema_hashes(
+                        config['host'], config['port'], config['user'], config['password'], config['database']
                     )
-                    if st.button("📥 Carregar Tabelas Selecionadas"):
-                        progress_bar = st.progress(0)
-                        for idx, table in enumerate(selected_tables):
-                            progress_bar.progress((idx + 1) / len(selected_tables))
-                            df = MySQLConnector.load_table(host, port, user, password, database, table)
+                    for table in selected_tables:
+                        if table in schemas:
+                            df = get_cache().get(connection_id, table_ids[table], schemas[table], owner=cache_owner())
                             if df is not None:
-                                st.session_state.data_sources[f"MySQL: {table}"] = df
-                                st.success(f"✅ Tabela '{table}' carregada: {len(df)} registros")
-                                with st.expander(f"Preview: {table}"):
-                                    st.dataframe(df.head())
-                        st.balloons()
-                        st.success("🎉 Todas as tabelas foram carregadas com sucesso!")
+                                cached[table] = df
+                estimates = MySQLConnector.row_estimates(
+                    config['host'], config['port'], config['user'], config['password'], config['database']
+                )
+                to_load = [table for table in selected_tables if table not in cached]
+                load = ParallelTableLoad(config, to_load, max_workers=max_workers, **options)
+                total_bar = st.progress(0, text=f"0/{len(selected_tables)} tabelas")
+                table_status = {table: st.empty() for table in selected_tables}
+                finished = 0
+                failed = 0
+                loaded = {}
+                for table, df in cached.items():
+                    finished += 1
+                    name = f"MySQL: {table}"
+                    st.session_state.data_sources[name] = df
+                    st.session_state.source_origin[name] = {
+                        'connection': connection_id, 'table': table_ids[table], 'schema': schemas[table]
+                    }
+                    loaded[table] = df
+                    table_status[table].success(f"♻️ Tabela '{table}' restaurada do cache local: {len(df)} registros")
+                while load.pending:
+                    for table, df, metrics, error in load.poll():
+                        finished += 1
+                        if error is not None:
+                            failed += 1
+                            table_status[table].error(f"❌ {table}: {error}")
+                            continue
+                        st.session_state.data_sources[f"MySQL: {table}"] = df
+                        cache_source(f"MySQL: {table}", connection_id, table_ids[table], schemas.get(table))
+                        loaded[table] = df
+                        table_status[table].success(
+                            f"✅ Tabela '{table}' carregada: {metrics['rows']} registros em "
+                            f"{metrics['seconds']:.1f}s ({metrics['rows_per_s']:,.0f} linhas/s, "
+                            f"{metrics['mb_per_s']:.1f} MB/s)"
+                        )
+                    for table in load.pending.values():
+                        read = load.rows_read[table]
+                        expected = estimates.get(table)
+                        if expected:
+                            table_status[table].progress(
+                                min(read / expected, 1.0), text=f"⏳ {table}: {read:,} / ~{expected:,} linhas"
+                            )
+                        else:
+                            table_status[table].info(f"⏳ {table}: {read:,} linhas lidas")
+                    total_bar.progress(
+                        finished / len(selected_tables), text=f"{finished}/{len(selected_tables)} tabelas"
+                    )
+                for table, df in loaded.items():
+                    with st.expander(f"Preview: {table}"):
+                        st.dataframe(df.head())
+                if failed:
+                    st.warning(f"⚠️ {failed} de {len(selected_tables)} tabelas falharam.")
                 else:
-                    st.error("❌ Não foi possível conectar ao banco de dados.")
+                    st.balloons()
+                    st.success("🎉 Todas as tabelas foram carregadas com sucesso!")
+        mysql_sources = [name for name in st.session_state.data_sources if name.startswith("MySQL: ")]
+        if mysql_sources and st.session_state.get('mysql_config'):
+            render_incremental_refresh(mysql_sources)
+        from db_pool import pool_stats
+
+        stats = pool_stats()
+        if stats:
+            with st.expander("📈 Pool de Conexões"):
+                st.dataframe(pd.DataFrame(stats), use_container_width=True)
     with tab2:
         st.markdown("### 📁 Upload de Arquivos")
         st.markdown(
         """
         <div class="drag-drop-area">
             <p>📂 Arraste e solte seus arquivos aqui</p>
-            <p>Formatos aceitos: Excel (.xlsx, .xls), CSV (.csv), JSON (.json)</p>
+            <p>Formatos aceitos: Excel (.xlsx, .xls), CSV (.csv), JSON (.json, .jsonl, .ndjson)</p>
         </div>
         """,
         unsafe_allow_html=True)
         uploaded_files = st.file_uploader(
             "Ou clique para selecionar arquivos",
-            type=['xlsx', 'xls', 'csv', 'json'],
+            type=['xlsx', 'xls', 'csv', 'json', 'jsonl', 'ndjson'],
             accept_multiple_files=True
         )
         if uploaded_files:
             for file in uploaded_files:
-                if file.type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
-                    df = pd.read_excel(file)
-                elif file.type == "text/csv":
-                    df = pd.read_csv(file)
-                elif file.type == "application/json":
-                    df = pd.read_json(file)
-                st.session_state.data_sources[f"Arquivo: {file.name}"] = df
+                name = f"Arquivo: {file.name}"
+                upload_id = getattr(file, 'file_id', None) or f"{file.name}:{file.size}"
+                digest = st.session_state.upload_digests.get(upload_id)
+                if digest is None:
+                    digest = content_digest(file)
+                    st.session_state.upload_digests[upload_id] = digest
+                if st.session_state.ingested_files.get(name) == digest and name in st.session_state.data_sources:
+                    continue
+                df = get_cache().get("arquivo", digest, digest, owner=cache_owner()) if st.session_state.use_disk_cache else None
+                if df is None:
+                    try:
+                        with st.spinner(f"Processando {file.name}..."), get_metrics().timer("read_upload", 'load'):
+                            df = read_upload(file, file.name, file.type)
+                    except (ValueError, ImportError, OSError) as e:
+                        st.error(f"❌ {file.name}: {e}")
+                        continue
+                st.session_state.data_sources[name] = df
+                st.session_state.ingested_files[name] = digest
+                cache_source(name, "arquivo", digest, digest)
                 st.success(f"✅ {file.name} carregado com sucesso!")
 
 
+@timed()
+def render_incremental_refresh(mysql_sources):
+    from mysql.connector import Error
+
+    config = st.session_state.mysql_config
+    st.markdown("#### 🔄 Atualização Incremental")
+    source = st.selectbox("Fonte:", mysql_sources, key="refresh_source")
+    table = source[len("MySQL: "):]
+    df = st.session_state.data_sources[source]
+    state = st.session_state.refresh_state.get(source)
+    columns = list(df.columns)
+    with st.form(f"refresh_config_{source}"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            default_column = state['watermark_column'] if state else suggest_watermark(columns)
+            watermark_column = st.selectbox(
+                "Coluna de watermark:", columns,
+                index=columns.index(default_column) if default_column in columns else 0
+            )
+        with col2:
+            default_key = state['primary_key'] if state else MySQLConnector.primary_key(**config, table_name=table)
+            primary_key = st.multiselect(
+                "Chave primária:", columns, default=[c for c in default_key if c in columns]
+            )
+        with col3:
+            count_check_every = st.number_input(
+                "Conferir contagem a cada N atualizações:", min_value=1,
+                value=state['count_check_every'] if state else 10
+            )
+        register = st.form_submit_button("💾 Registrar watermark", use_container_width=True)
+    if register:
+        origin = st.session_state.source_origin.get(source)
+        _, loaded_columns, where = parse_mysql_table_id(origin['table']) if origin else (table, [], None)
+        state = new_refresh_state(table, watermark_column, primary_key, count_check_every, loaded_columns, where)
+        state['last_watermark'] = watermark_of(df, watermark_column)
+        st.session_state.refresh_state[source] = state
+        st.success(f"✅ Watermark registrado: {watermark_column} = {state['last_watermark']}")
+    registered = [name for name in mysql_sources if name in st.session_state.refresh_state]
+    col1, col2 = st.columns(2)
+    with col1:
+        refresh_one = st.button("🔄 Atualizar fonte", disabled=source not in st.session_state.refresh_state)
+    with col2:
+        refresh_all = st.button("🔄 Atualizar todas registradas", disabled=not registered)
+    targets = registered if refresh_all else [source] if refresh_one else []
+    for name in targets:
+        try:
+            with st.spinner(f"Atualizando {name}..."):
+                merged, report = MySQLConnector.refresh_table(
+                    config, st.session_state.data_sources.get(name), st.session_state.refresh_state[name]
+                )
+            st.session_state.data_sources[name] = merged
+            origin = st.session_state.source_origin.get(name)
+            if origin:
+                cache_source(name, origin['connection'], origin['table'], origin['schema'])
+            st.success(
+                f"✅ {name}: atualização {report['modo']}, {report['linhas_buscadas']} linhas buscadas, "
+                f"{report['linhas_removidas']} removidas, {report['total']} no total ({report['segundos']}s)"
+            )
+        except Error as e:
+            st.error(f"❌ {name}: {e}")
+    if state and state['history']:
+        with st.expander(f"Histórico de atualizações: {source}"):
+            st.dataframe(pd.DataFrame(state['history']), use_container_width=True)
+
+
+def collect_report_jobs():
+    return get_job_queue().collect(owner=report_owner())
+
+
+@timed()
+def render_report_job_list(was_active):
+    job_queue = get_job_queue()
+    jobs = job_queue.jobs(owner=report_owner())
+    active = any(job['status'] not in FINISHED for job in jobs)
+    if collect_report_jobs() or (was_active and not active):
+        st.rerun()
+    st.markdown("#### ⏳ Fila de Relatórios")
+    for job in jobs:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            total = max(job['sections_total'], 1)
+            label = f"**{job['title']}** — {job['status']} ({job['sections_done']}/{job['sections_total']} etapas)"
+            if job['current']:
+                label += f" · {job['current']}"
+            st.progress(min(job['sections_done'] / total, 1.0), text=label)
+            if job['error']:
+                st.error(f"❌ {job['error']}")
+            elif job['status'] == 'concluído':
+                st.caption("📋 Disponível em Relatórios Salvos")
+        with col2:
+            if job['status'] not in FINISHED:
+                if st.button("⛔ Cancelar", key=f"cancel_job_{job['id']}"):
+                    job_queue.cancel(job['id'])
+            elif st.button("✖️ Remover", key=f"dismiss_job_{job['id']}"):
+                job_queue.dismiss(job['id'])
+                st.rerun()
+
+
+@timed()
+def render_report_jobs():
+    jobs = get_job_queue().jobs(owner=report_owner())
+    if not jobs:
+        return
+    active = any(job['status'] not in FINISHED for job in jobs)
+    st.fragment(render_report_job_list, run_every=1.0 if active else None)(active)
+
+
+@timed()
 def render_reports():
     st.markdown("## 📑 Geração de Relatórios")
+    collect_report_jobs()
+    datasets = get_datasets()
     tab1, tab2, tab3 = st.tabs(["📊 Relatório Gerencial", "🎯 Relatório Estratégico", "📋 Relatórios Salvos"])
     with tab1:
         st.markdown("### 📊 Relatório Gerencial")
@@ -756,79 +1265,58 @@ def render_reports():
                 period = st.selectbox("Período:", ["Último mês", "Último trimestre", "Último semestre", "Último ano"])
                 pillars_to_include = st.multiselect(
                     "Pilares a incluir:",
-                    list(create_compliance_pillars().keys()),
-                    default=list(create_compliance_pillars().keys())[:5]
+                    list(CATALOG.pillars.keys()),
+                    default=list(CATALOG.pillars.keys())[:5]
                 )
             with col2:
                 include_charts = st.checkbox("Incluir gráficos", value=True)
                 include_metrics = st.checkbox("Incluir métricas detalhadas", value=True)
                 include_recommendations = st.checkbox("Incluir recomendações", value=True)
                 responsible = st.text_input("Responsável:", value="Departamento de Compliance")
+            appendix_sources = st.multiselect(
+                "Apêndices de dados:",
+                datasets.names()
+            )
+            appendix_rows = st.number_input("Linhas por apêndice (0 = todas):", min_value=0, value=APPENDIX_MAX_ROWS or 0, step=1000)
             generate_button = st.form_submit_button("📄 Gerar Relatório", use_container_width=True)
+        appendices = {}
         if generate_button:
-            with st.spinner("Gerando relatório..."):
-                report_data = {
-                    'title': report_title,
-                    'period': period,
-                    'responsible': responsible,
-                    'sections': []
-                }
-                report_data['sections'].append({
-                    'title': 'Resumo Executivo',
-                    'type': 'text',
-                    'content': f'Este relatório apresenta a situação atual do programa de compliance, cobrindo o período de {period}. O score geral de compliance é de 87.5%, representando um aumento de 2.3% em relação ao período anterior.'
-                })
-                if include_metrics:
-                    for pillar in pillars_to_include:
-                        pillar_data = create_compliance_pillars()[pillar]
-                        metrics = []
-                        for kpi in pillar_data['kpis']:
-                            value = np.random.randint(70, 100)
-                            status = "✅" if value >= 90 else "⚠️" if value >= 80 else "❌"
-                            metrics.append({'name': kpi['name'], 'value': f"{value}%", 'status': status})
-                        report_data['sections'].append({
-                            'title': f"{pillar_data['icon']} {pillar}",
-                            'type': 'metrics',
-                            'content': metrics
-                        })
-                if include_charts:
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(
-                        x=['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun'],
-                        y=[82, 85, 87, 89, 91, 93],
-                        mode='lines+markers',
-                        name='Compliance Score'
-                    ))
-                    fig.update_layout(title='Evolução do Compliance Score', height=400)
-                    report_data['sections'].append({
-                        'title': 'Análise Gráfica',
-                        'type': 'chart',
-                        'content': {'figure': fig}
-                    })
-                if include_recommendations:
-                    report_data['sections'].append({
-                        'title': 'Recomendações',
-                        'type': 'text',
-                        'content': '1. Intensificar treinamentos nos departamentos com menor aderência\n2. Revisar políticas que estão próximas do vencimento\n3. Implementar automação nos controles manuais identificados\n4. Aumentar a frequência de comunicações sobre compliance'
-                    })
-                pdf_buffer = BytesIO()
-                report_gen = ReportGenerator()
-                report_gen.create_report(report_data, pdf_buffer)
-                pdf_buffer.seek(0)
-                report_id = f"REL_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                st.session_state.saved_reports[report_id] = {
-                    'title': report_title,
-                    'date': datetime.now(),
-                    'type': 'Gerencial',
-                    'pdf': pdf_buffer.getvalue()
-                }
-                st.success("✅ Relatório gerado com sucesso!")
-                st.download_button(
-                    label="📥 Baixar Relatório PDF",
-                    data=pdf_buffer,
-                    file_name=f"{report_title}_{datetime.now().strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf"
-                )
+            try:
+                for name in appendix_sources:
+                    appendices[name] = datasets[name]
+            except Exception as e:
+                st.error(f"❌ Erro ao avaliar o apêndice {name}: {str(e)}")
+                generate_button = False
+        if generate_button:
+            with st.spinner("Preparando relatório..."):
+                kpi_results = compute_kpis(window=PERIOD_WINDOWS.get(period)) if include_metrics else None
+                with get_metrics().timer("build_management_report", 'report'):
+                    report_data = build_management_report(
+                        report_title, period, responsible, pillars_to_include, kpi_results,
+                        include_metrics=include_metrics,
+                        include_charts=include_charts,
+                        include_recommendations=include_recommendations,
+                        appendices=appendices,
+                        appendix_rows=int(appendix_rows) or None
+                    )
+                job_id = get_job_queue().submit(report_data, owner=report_owner(), kind='Gerencial')
+            st.success(f"✅ Relatório enviado para a fila de geração (job {job_id}).")
+        render_report_jobs()
+        with st.expander("⚙️ Configuração da Fila"):
+            job_queue = get_job_queue()
+            queue_stats = job_queue.stats()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Na fila", queue_stats['na fila'])
+            col2.metric("Executando", queue_stats['executando'])
+            col3.metric("Concluídos", queue_stats['concluído'])
+            col4.metric("Falhas / Cancelados", queue_stats['erro'] + queue_stats['cancelado'])
+            # The pool is shared by every session, so it is only resized on
+            # an explicit submit rather than on each rerun.
+            with st.form("report_queue_settings"):
+                workers = st.number_input("Relatórios simultâneos:", min_value=1, max_value=8, value=queue_stats['max_workers'])
+                if st.form_submit_button("💾 Aplicar"):
+                    job_queue.configure(int(workers))
+                    st.success("✅ Configuração aplicada!")
     with tab2:
         st.markdown("### 🎯 Relatório Estratégico")
         with st.form("strategic_report"):
@@ -854,25 +1342,32 @@ def render_reports():
             st.info("📊 Análise SWOT, tendências e recomendações estratégicas incluídas.")
     with tab3:
         st.markdown("### 📋 Relatórios Salvos")
-        if st.session_state.saved_reports:
+        report_store = get_report_store()
+        owner = report_owner()
+        saved_reports = {
+            report_id: entry for report_id, entry in report_store.entries().items()
+            if entry.get('owner') in (owner, BATCH_OWNER)
+        }
+        if saved_reports:
             reports_df = pd.DataFrame([
                 {
                     'ID': report_id,
                     'Título': data['title'],
                     'Tipo': data['type'],
-                    'Data': data['date'].strftime('%d/%m/%Y %H:%M')
+                    'Data': datetime.fromtimestamp(data['created']).strftime('%d/%m/%Y %H:%M'),
+                    'Tamanho (KB)': round(data['bytes'] / 1024, 1)
                 }
-                for report_id, data in st.session_state.saved_reports.items()
+                for report_id, data in saved_reports.items()
             ])
             st.dataframe(reports_df, use_container_width=True)
-            selected_report = st.selectbox("Selecione um relatório:", list(st.session_state.saved_reports.keys()))
+            selected_report = st.selectbox("Selecione um relatório:", list(saved_reports.keys()))
             if selected_report:
-                report_data = st.session_state.saved_reports[selected_report]
+                report_data = saved_reports[selected_report]
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.download_button(
                         label="📥 Baixar PDF",
-                        data=report_data['pdf'],
+                        data=lambda: report_store.read(selected_report),
                         file_name=f"{report_data['title']}.pdf",
                         mime="application/pdf"
                     )
@@ -880,45 +1375,238 @@ def render_reports():
                     if st.button("📧 Enviar por Email"):
                         st.info("📮 Funcionalidade de email em desenvolvimento")
                 with col3:
-                    if st.button("🗑️ Excluir"):
-                        del st.session_state.saved_reports[selected_report]
-                        st.experimental_rerun()
+                    if report_data.get('owner') == owner and st.button("🗑️ Excluir"):
+                        report_store.delete(selected_report)
+                        st.rerun()
         else:
             st.info("📭 Nenhum relatório salvo ainda. Gere um relatório nas abas acima.")
+        with st.expander("⚙️ Retenção e Cota"):
+            store_stats = report_store.stats()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Relatórios", store_stats['reports'])
+            col2.metric("Em disco", f"{store_stats['stored_bytes'] / 1024 ** 2:.1f} / {store_stats['max_bytes'] / 1024 ** 2:.0f} MB")
+            col3.metric("Compressão", f"{store_stats['ratio']:.0%}")
+            # The store is shared by every session, so its limits come from
+            # the environment rather than from a form any user could submit.
+            st.caption(
+                f"Retenção: {store_stats['retention_days'] or 'sem limite'} dia(s) · "
+                f"Cota: {store_stats['max_bytes'] / 1024 ** 2:.0f} MB — definidas por "
+                "COMPLIANCE_REPORT_RETENTION_DAYS e COMPLIANCE_REPORT_MAX_MB."
+            )
 
 
+@timed()
 def render_transformations():
     st.markdown("## 🔄 Transformações de Dados")
-    if not st.session_state.data_sources:
+    if not st.session_state.data_sources and not st.session_state.remote_tables:
         st.warning("⚠️ Nenhum dado carregado. Por favor, carregue dados primeiro.")
         return
+    datasets = get_datasets()
+    pipelines = st.session_state.transformations
+    with st.expander("➕ Nova Transformação", expanded=not pipelines):
+        with st.form("new_pipeline"):
+            col1, col2 = st.columns(2)
+            with col1:
+                new_name = st.text_input("Nome:")
+            with col2:
+                new_source = st.selectbox("Entrada:", datasets.inputs())
+            if st.form_submit_button("➕ Criar Transformação", use_container_width=True):
+                if not new_name.strip() or new_name.strip() in pipelines:
+                    st.error("❌ Informe um nome ainda não utilizado.")
+                else:
+                    pipelines[new_name.strip()] = {'source': new_source, 'steps': []}
+                    st.rerun()
+    if not pipelines:
+        return
+    st.session_state.sql_pushdown = st.checkbox(
+        "🗄️ Executar etapas no MySQL quando possível", value=st.session_state.sql_pushdown,
+        help="Filtros, colunas calculadas, seleções, agregações e ordenações sobre fontes MySQL completas "
+             "viram uma consulta parametrizada; as demais etapas continuam em pandas."
+    )
+    selected = st.selectbox("Transformação:", list(pipelines.keys()))
+    definition = pipelines[selected]
+    name = pipeline_name(selected)
+    st.caption(f"Entrada: {definition['source']} · {len(definition['steps'])} etapa(s) · disponível como \"{name}\"")
+    for index, step in enumerate(definition['steps']):
+        col1, col2 = st.columns([6, 1])
+        with col1:
+            st.markdown(f"**{index + 1}.** {describe(step)}")
+        with col2:
+            if st.button("🗑️", key=f"remove_step_{selected}_{index}"):
+                definition['steps'].pop(index)
+                st.rerun()
+
+    st.markdown("### ➕ Adicionar Etapa")
+    try:
+        # Only the prefix up to the last step is evaluated, and it is usually
+        # memoized already, so listing the columns is cheap.
+        columns = datasets.columns(name)
+    except Exception as e:
+        st.error(f"❌ Erro ao avaliar a transformação: {str(e)}")
+        columns = []
+    op_label = st.selectbox("Operação:", list(OPERATIONS.keys()))
+    op = OPERATIONS[op_label]
+    with st.form("pipeline_step"):
+        if op == 'filter':
+            col1, col2, col3 = st.columns(3)
+            params = {
+                'column': col1.selectbox("Coluna:", columns),
+                'operator': col2.selectbox("Operador:", FILTER_OPERATORS),
+                'value': col3.text_input("Valor:", help="Para \"em\", separe os valores por vírgula.")
+            }
+        elif op == 'derive':
+            col1, col2 = st.columns(2)
+            params = {
+                'name': col1.text_input("Nova coluna:"),
+                'expression': col2.text_input("Expressão:", placeholder="impacto * probabilidade")
+            }
+        elif op == 'select':
+            params = {'columns': st.multiselect("Colunas:", columns, default=columns)}
+        elif op == 'join':
+            col1, col2, col3 = st.columns(3)
+            params = {
+                'right': col1.selectbox("Juntar com:", [other for other in datasets.names() if other != name]),
+                'on': col2.multiselect("Chaves:", columns),
+                'how': JOIN_TYPES[col3.selectbox("Tipo:", list(JOIN_TYPES.keys()))]
+            }
+        elif op == 'aggregate':
+            col1, col2, col3 = st.columns(3)
+            by = col1.multiselect("Agrupar por:", columns)
+            measures = col2.multiselect("Medidas:", columns)
+            agg = PIPELINE_AGGREGATIONS[col3.selectbox("Agregação:", list(PIPELINE_AGGREGATIONS.keys()))]
+            params = {'by': by, 'measures': [[column, agg] for column in measures]}
+        else:
+            col1, col2, col3 = st.columns(3)
+            params = {
+                'column': col1.selectbox("Coluna:", columns),
+                'ascending': col2.checkbox("Crescente", value=False),
+                'limit': int(col3.number_input("Manter primeiras (0 = todas):", min_value=0, value=0))
+            }
+        if st.form_submit_button("➕ Adicionar Etapa", use_container_width=True):
+            try:
+                if op == 'derive':
+                    parse_expression(params['expression'])
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+            else:
+                definition['steps'].append({'op': op, 'params': params})
+                st.rerun()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        preview = st.button("👁️ Pré-visualizar", use_container_width=True)
+    with col2:
+        if st.button("🗑️ Excluir Transformação", use_container_width=True):
+            del pipelines[selected]
+            st.rerun()
+    if preview:
+        try:
+            df, info = datasets.evaluate(name)
+        except Exception as e:
+            st.error(f"❌ Erro ao avaliar a transformação: {str(e)}")
+            return
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Registros", f"{len(df):,}")
+        col2.metric("Etapas no MySQL", info['pushed'])
+        col3.metric("Etapas calculadas", info['computed'])
+        col4.metric("Etapas reutilizadas", info['reused'])
+        col5.metric("Tempo", f"{info['seconds'] * 1000:.0f} ms")
+        st.dataframe(df.head(100), use_container_width=True)
+        pushdown = datasets.pushdown(name)
+        if pushdown is not None:
+            with st.expander(f"🗄️ Etapas 1–{pushdown['steps']} executadas no MySQL"):
+                st.code(pushdown['query'], language='sql')
+                st.caption(f"Parâmetros: {pushdown['params']}")
+                for executed in info['sql']:
+                    st.caption(f"{executed['pipeline']}: {executed['rows']:,} registros em {executed['ms']:.0f} ms")
+        if info['steps']:
+            st.dataframe(pd.DataFrame(info['steps']).rename(columns={
+                'pipeline': "Transformação", 'step': "Etapa", 'description': "Descrição", 'status': "Situação",
+                'rows': "Registros", 'ms': "ms"
+            }), use_container_width=True)
+    pipeline_stats = get_pipeline_cache().stats()
+    st.caption(
+        f"🧠 Resultados intermediários em memória: {pipeline_stats['entries']} "
+        f"({pipeline_stats['bytes'] / 1024 ** 2:.1f} / {pipeline_stats['max_bytes'] / 1024 ** 2:.0f} MB) · "
+        f"taxa de acerto {pipeline_stats['hit_rate']:.0%}"
+    )
 
 
+@timed()
 def render_visualizations():
+    import plotly.express as px
+
     st.markdown("## 📈 Criador de Visualizações")
     if not st.session_state.data_sources:
         st.warning("⚠️ Nenhum dado carregado. Por favor, carregue dados primeiro.")
         return
-    data_name = st.selectbox("Fonte de Dados:", list(st.session_state.data_sources.keys()))
-    df = st.session_state.data_sources[data_name]
+    datasets = get_datasets()
+    data_name = st.selectbox("Fonte de Dados:", datasets.names())
+    try:
+        df = datasets[data_name]
+    except Exception as e:
+        st.error(f"❌ Erro ao avaliar a fonte de dados: {str(e)}")
+        return
     chart_type = st.selectbox("Tipo de Gráfico:", ["Linha", "Barra", "Pizza", "Área"])
     x_axis = st.selectbox("Eixo X:", df.columns)
     y_axis = st.selectbox("Eixo Y:", df.columns)
+    if chart_type in ("Barra", "Pizza"):
+        col1, col2 = st.columns(2)
+        with col1:
+            agg_label = st.selectbox("Agregação:", list(AGGREGATIONS.keys()))
+        with col2:
+            top_n = st.number_input("Máximo de categorias (demais em \"Outros\"):", min_value=1, value=DEFAULT_TOP_N)
+    with st.expander("⚡ Modo de grandes volumes"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            point_budget = st.number_input("Pontos máximos por série:", min_value=100, value=DEFAULT_POINT_BUDGET, step=500)
+        with col2:
+            method_label = st.selectbox("Redução de pontos:", list(DOWNSAMPLE_METHODS.keys()))
+        with col3:
+            webgl_threshold = st.number_input("WebGL a partir de (pontos):", min_value=0, value=DEFAULT_WEBGL_THRESHOLD, step=1000)
     if st.button("Gerar Gráfico"):
+        plot_df, total_points = df, len(df)
+        webgl = False
+        if chart_type in ("Linha", "Área"):
+            plot_df, total_points = downsample(df, x_axis, y_axis, int(point_budget), DOWNSAMPLE_METHODS[method_label])
+            webgl = len(plot_df) > webgl_threshold
         if chart_type == "Linha":
-            fig = px.line(df, x=x_axis, y=y_axis)
-        elif chart_type == "Barra":
-            fig = px.bar(df, x=x_axis, y=y_axis)
-        elif chart_type == "Pizza":
-            fig = px.pie(df, names=x_axis, values=y_axis)
+            fig = px.line(plot_df, x=x_axis, y=y_axis, render_mode='webgl' if webgl else 'auto')
+        elif chart_type in ("Barra", "Pizza"):
+            grouped, agg_info = cached_aggregate(
+                df, datasets.version(data_name), x_axis, y_axis,
+                AGGREGATIONS[agg_label], int(top_n)
+            )
+            grouped = grouped.rename(columns={'valor': f"{agg_label} de {y_axis}" if agg_label != "Contagem" else "Registros"})
+            value_column = grouped.columns[1]
+            if chart_type == "Barra":
+                fig = px.bar(grouped, x=x_axis, y=value_column)
+            else:
+                fig = px.pie(grouped, names=x_axis, values=value_column)
+        elif webgl:
+            fig = px.line(plot_df, x=x_axis, y=y_axis, render_mode='webgl')
+            fig.update_traces(fill='tozeroy')
         else:
-            fig = px.area(df, x=x_axis, y=y_axis)
+            fig = px.area(plot_df, x=x_axis, y=y_axis)
         st.plotly_chart(fig, use_container_width=True)
+        if chart_type in ("Barra", "Pizza"):
+            st.caption(
+                f"🧮 {agg_info['rows']:,} linhas agregadas em {agg_info['groups']:,} categorias"
+                + (f" · {agg_info['shown']} exibidas" if agg_info['shown'] < agg_info['groups'] else "")
+                + (" · resultado em cache" if agg_info['cached'] else "")
+            )
+        if chart_type in ("Linha", "Área"):
+            st.caption(
+                f"📉 {len(plot_df):,} de {total_points:,} pontos desenhados"
+                + (f" · {method_label}" if len(plot_df) < total_points else "")
+                + (" · WebGL" if webgl else "")
+            )
 
 
+@timed()
 def render_settings():
     st.markdown("## ⚙️ Configurações")
-    tab1, tab2, tab3, tab4 = st.tabs(["🎨 Aparência", "💾 Dados", "🔐 Segurança", "📱 Mobile"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🎨 Aparência", "💾 Dados", "🔐 Segurança", "📱 Mobile", "🩺 Diagnóstico"])
     with tab1:
         st.markdown("### 🎨 Personalização da Interface")
         col1, col2 = st.columns(2)
@@ -959,6 +1647,80 @@ def render_settings():
             st.experimental_rerun()
     with tab2:
         st.markdown("### 💾 Gerenciamento de Dados")
+        cache = get_cache()
+        stats = cache.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Acertos", stats['hits'])
+        col2.metric("Falhas", stats['misses'])
+        col3.metric("Taxa de acerto", f"{stats['hit_rate']:.0%}")
+        col4.metric("Em disco", f"{stats['bytes'] / 1024 ** 2:.1f} MB", f"{stats['entries']} entradas", delta_color="off")
+        with st.form("disk_cache_settings"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                use_disk_cache = st.checkbox("Cache local em disco", value=st.session_state.use_disk_cache)
+            with col2:
+                ttl_hours = st.number_input("Validade (horas):", min_value=0, value=int(stats['ttl_seconds'] // 3600))
+            with col3:
+                max_mb = st.number_input("Tamanho máximo (MB):", min_value=64, value=int(stats['max_bytes'] // 1024 ** 2))
+            if st.form_submit_button("💾 Salvar Configurações de Cache"):
+                st.session_state.use_disk_cache = use_disk_cache
+                cache.configure(max_bytes=int(max_mb) * 1024 ** 2, ttl_seconds=int(ttl_hours) * 3600)
+                st.success("✅ Configurações de cache salvas!")
+        entries = {key: entry for key, entry in cache.entries().items() if owns_cache_entry(entry)}
+        if entries:
+            st.dataframe(pd.DataFrame([
+                {
+                    'Fonte': entry['source'],
+                    'Tabela': entry['table'],
+                    'Registros': entry['rows'],
+                    'Tamanho (MB)': round(entry['bytes'] / 1024 ** 2, 2),
+                    'Criado': datetime.fromtimestamp(entry['created']).strftime('%d/%m/%Y %H:%M'),
+                    'Último acesso': datetime.fromtimestamp(entry['last_access']).strftime('%d/%m/%Y %H:%M')
+                }
+                for entry in entries.values()
+            ]), use_container_width=True)
+        if st.button("🗑️ Limpar Cache"):
+            cache.clear(list(entries))
+            st.success("✅ Cache local removido!")
+        st.markdown("#### 🧠 Memória das Fontes de Dados")
+        budget = get_budget()
+        budget_stats = budget.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Em memória (processo)", f"{budget_stats['resident_bytes'] / 1024 ** 2:.1f} MB")
+        col2.metric("Em disco (despejado)", f"{budget_stats['spilled_bytes'] / 1024 ** 2:.1f} MB")
+        col3.metric("Orçamento", f"{budget_stats['limit_bytes'] / 1024 ** 2:.0f} MB")
+        with st.form("memory_budget_settings"):
+            budget_mb = st.number_input(
+                "Orçamento de memória por processo (MB):", min_value=128,
+                value=int(budget_stats['limit_bytes'] // 1024 ** 2), step=256
+            )
+            if st.form_submit_button("💾 Salvar Orçamento"):
+                budget.configure(int(budget_mb) * 1024 ** 2)
+                st.success("✅ Orçamento de memória atualizado!")
+        memory_report = st.session_state.data_sources.report()
+        if memory_report:
+            st.dataframe(pd.DataFrame(memory_report), use_container_width=True)
+        st.markdown("#### 📊 Cache de KPIs")
+        kpi_cache = get_kpi_cache()
+        kpi_stats = kpi_cache.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Taxa de acerto", f"{kpi_stats['hit_rate']:.0%}")
+        col2.metric("Acertos / Falhas", f"{kpi_stats['hits']} / {kpi_stats['misses']}")
+        col3.metric("Entradas", f"{kpi_stats['entries']} / {kpi_stats['max_entries']}")
+        col4.metric("Invalidações", kpi_stats['invalidations'])
+        if st.button("🗑️ Limpar Cache de KPIs"):
+            kpi_cache.clear()
+            st.success("✅ Cache de KPIs limpo!")
+        st.markdown("#### 🖼️ Cache de Gráficos dos Relatórios")
+        chart_cache = get_chart_cache()
+        chart_stats = chart_cache.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Taxa de acerto", f"{chart_stats['hit_rate']:.0%}")
+        col2.metric("Imagens", chart_stats['entries'])
+        col3.metric("Tamanho", f"{chart_stats['bytes'] / 1024 ** 2:.1f} / {chart_stats['max_bytes'] / 1024 ** 2:.0f} MB")
+        if st.button("🗑️ Limpar Cache de Gráficos"):
+            chart_cache.clear()
+            st.success("✅ Cache de gráficos limpo!")
     with tab3:
         st.markdown("### 🔐 Segurança e Privacidade")
     with tab4:
@@ -976,7 +1738,82 @@ def render_settings():
             compression = st.checkbox("Compressão de dados", value=True)
         if st.button("📱 Salvar Configurações Mobile"):
             st.success("✅ Configurações mobile salvas!")
+    with tab5:
+        render_diagnostics()
+
+
+def render_diagnostics():
+    st.markdown("### 🩺 Diagnóstico de Desempenho")
+    metrics = get_metrics()
+    summary = metrics.summary()
+    reruns = next((row for row in summary if row['name'] == 'rerun'), None)
+    rss = process_rss_bytes()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Execuções", reruns['count'] if reruns else 0)
+    col2.metric("p50 por execução", f"{reruns['p50_s'] * 1000:.0f} ms" if reruns else "—")
+    col3.metric("p95 por execução", f"{reruns['p95_s'] * 1000:.0f} ms" if reruns else "—")
+    col4.metric("Memória do processo", f"{rss / 1024 ** 2:.0f} MB" if rss else "—")
+    last_run = st.session_state.get('last_run')
+    if last_run:
+        st.markdown(f"#### ⏱️ Última execução desta sessão ({last_run['seconds'] * 1000:.0f} ms)")
+        breakdown = pd.DataFrame(
+            [{'Etapa': name, 'ms': round(seconds * 1000, 1)} for name, seconds in last_run['timings'].items()]
+        )
+        if not breakdown.empty:
+            st.dataframe(breakdown.sort_values('ms', ascending=False), use_container_width=True, hide_index=True)
+    if summary:
+        st.markdown(f"#### 📊 Tempos acumulados (últimas {metrics.window} amostras por etapa)")
+        st.dataframe(pd.DataFrame([
+            {
+                'Etapa': row['name'],
+                'Tipo': KINDS.get(row['kind'], row['kind']),
+                'Chamadas': row['count'],
+                'Última (ms)': round(row['last_s'] * 1000, 1),
+                'p50 (ms)': round(row['p50_s'] * 1000, 1),
+                'p95 (ms)': round(row['p95_s'] * 1000, 1),
+                'Máx. (ms)': round(row['max_s'] * 1000, 1),
+                'Total (s)': round(row['total_s'], 2)
+            }
+            for row in summary
+        ]), use_container_width=True, hide_index=True)
+    sources = get_budget().sources()
+    if sources:
+        st.markdown("#### 🧠 Memória por Fonte de Dados (processo)")
+        st.dataframe(pd.DataFrame([
+            {
+                'Fonte': source['source'],
+                'Registros': source['rows'],
+                'Em memória (MB)': round(source['resident_bytes'] / 1024 ** 2, 2),
+                'Despejado (MB)': round(source['spilled_bytes'] / 1024 ** 2, 2),
+                'Cópias': source['copies'],
+                'Sessões': source['sessions']
+            }
+            for source in sources
+        ]), use_container_width=True, hide_index=True)
+        registry_stats = get_registry().stats()
+        st.caption(
+            f"🔗 {registry_stats['datasets']} conjunto(s) de dados compartilhado(s) entre "
+            f"{registry_stats['references']} referência(s) de sessão · {registry_stats['hits']} carga(s) "
+            f"reaproveitada(s)"
+        )
+    st.markdown("#### 📤 Exportar Métricas")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            "📥 Prometheus (texto)", metrics.to_prometheus(sources), file_name="compliance_metrics.prom",
+            mime="text/plain", use_container_width=True
+        )
+    with col2:
+        st.download_button(
+            "📥 JSON", metrics.to_json(sources), file_name="compliance_metrics.json",
+            mime="application/json", use_container_width=True
+        )
+    with col3:
+        if st.button("🗑️ Zerar Métricas", use_container_width=True):
+            metrics.reset()
+            st.rerun()
 
 
 if __name__ == "__main__":
     main()
+    st.session_state.last_run = get_metrics().end_run()
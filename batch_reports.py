@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from db_pool import get_pool
+from file_ingest import read_upload
+from kpi_catalog import CATALOG
+from kpi_engine import PERIOD_WINDOWS, KPIEngine, resolve_sources
+from mysql_stream import build_select, read_streaming
+from report_generator import ReportGenerator, build_management_report, discard_table, load_table, table_reference
+from report_store import BATCH_OWNER, get_report_store
+
+DEFAULT_OPTIONS = {
+    'period': "Último mês",
+    'pillars': None,
+    'responsible': "Departamento de Compliance",
+    'title': "Relatório Gerencial de Compliance — {unit}",
+    'include_metrics': True,
+    'include_charts': True,
+    'include_recommendations': True,
+    'appendices': [],
+    'appendix_rows': None
+}
+
+
+def load_spec(path):
+    with open(path, encoding='utf-8') as fh:
+        spec = json.load(fh)
+    defaults = dict(DEFAULT_OPTIONS, **spec.get('defaults', {}))
+    reports = spec.get('reports') or [{'unit': unit} for unit in spec.get('units', [])]
+    if not reports:
+        raise ValueError("A especificação não lista nenhuma unidade ('reports' ou 'units').")
+    jobs = []
+    for entry in reports:
+        job = dict(defaults, **entry)
+        job['pillars'] = list(job['pillars'] or CATALOG.pillars.keys())
+        unknown = [pillar for pillar in job['pillars'] if pillar not in CATALOG.pillars]
+        if unknown:
+            raise ValueError(f"Pilares desconhecidos para {job['unit']}: {', '.join(unknown)}")
+        missing = [name for name in job['appendices'] if name not in spec.get('sources', {})]
+        if missing:
+            raise ValueError(f"Apêndices sem fonte para {job['unit']}: {', '.join(missing)}")
+        if job['period'] not in PERIOD_WINDOWS:
+            raise ValueError(f"Período inválido para {job['unit']}: {job['period']}")
+        job['title'] = job['title'].format(unit=job['unit'], period=job['period'])
+        jobs.append(job)
+    return spec, jobs
+
+
+def load_sources(spec, base_dir):
+    frames = {}
+    mysql = spec.get('mysql')
+    for logical, source in spec.get('sources', {}).items():
+        if isinstance(source, str):
+            path = os.path.join(base_dir, source)
+            with open(path, 'rb') as fh:
+                frames[logical] = read_upload(fh, path)
+            continue
+        if not mysql:
+            raise ValueError(f"Fonte '{logical}' usa MySQL, mas a especificação não tem a seção 'mysql'.")
+        with get_pool(mysql['host'], mysql.get('port', 3306), mysql['user'], mysql.get('password', ''),
+                      mysql['database']).connection() as connection:
+            cursor = connection.cursor(buffered=False)
+            try:
+                query = build_select(source['table'], source.get('columns'), source.get('where'))
+                frames[logical] = read_streaming(cursor, query, source.get('params'))
+            finally:
+                cursor.close()
+    return frames
+
+
+def compute_unit_kpis(frames, unit_column, periods):
+    engine = KPIEngine(CATALOG.entries)
+    resolved = resolve_sources(frames, engine.sources)
+    inputs = {logical: frames[name] for logical, name in resolved.items()}
+    results = {}
+    for period in periods:
+        # One grouped pass per period serves every unit; sources without the
+        # unit column contribute organisation-wide values.
+        computed = engine.compute(inputs, window=PERIOD_WINDOWS[period], group_by=unit_column)
+        computed['status'] = CATALOG.icons(CATALOG.evaluate_frame(computed))
+        if unit_column not in computed.columns:
+            computed[unit_column] = np.nan
+        computed[unit_column] = computed[unit_column].astype(object)
+        results[period] = computed
+    return results
+
+
+def unit_results(results, unit_column, unit):
+    unit_values = results[unit_column]
+    rows = results[(unit_values == unit) | unit_values.isna()]
+    return rows[['pillar', 'kpi', 'value', 'status']].reset_index(drop=True)
+
+
+def _file_name(job):
+    slug = re.sub(r'[^\w.-]+', '_', f"{job['unit']}_{job['period']}", flags=re.UNICODE).strip('_')
+    return f"{slug}.pdf"
+
+
+def unit_appendices(frames, unit_column, job):
+    # Each unit's rows are written once here and read back by its worker.
+    tables = {}
+    for name in job['appendices']:
+        df = frames[name]
+        if unit_column in df.columns:
+            df = df[df[unit_column] == job['unit']]
+        tables[name] = table_reference(df)
+    return tables
+
+
+def render_job(job, kpi_results, output_dir, appendices=None):
+    started = time.perf_counter()
+    report_data = build_management_report(
+        job['title'], job['period'], job['responsible'], job['pillars'], kpi_results,
+        include_metrics=job['include_metrics'],
+        include_charts=job['include_charts'],
+        include_recommendations=job['include_recommendations'],
+        appendices={name: load_table(table) for name, table in (appendices or {}).items()},
+        appendix_rows=job['appendix_rows']
+    )
+    built = time.perf_counter()
+    path = os.path.join(output_dir, _file_name(job))
+    with open(path, 'wb') as fh:
+        ReportGenerator().create_report(report_data, fh)
+    rendered = time.perf_counter()
+    return {
+        'unit': job['unit'],
+        'period': job['period'],
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'build_s': built - started,
+        'render_s': rendered - built,
+        'total_s': time.perf_counter() - started,
+        'title': job['title'],
+        'pid': os.getpid()
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gera Relatórios Gerenciais em lote a partir de um arquivo de especificação.")
+    parser.add_argument('spec', help="Arquivo JSON com unidades, períodos, pilares e fontes de dados.")
+    parser.add_argument('-o', '--output-dir', default='relatorios', help="Diretório de saída dos PDFs.")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Processos simultâneos.")
+    parser.add_argument('--unit-column', default=None, help="Coluna que identifica a unidade nas fontes.")
+    parser.add_argument('--no-charts', action='store_true', help="Não inclui gráficos nos relatórios.")
+    parser.add_argument('--store', action='store_true', help="Também grava os PDFs em Relatórios Salvos.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    wall_started = time.perf_counter()
+    spec, jobs = load_spec(args.spec)
+    if args.no_charts:
+        for job in jobs:
+            job['include_charts'] = False
+    unit_column = args.unit_column or spec.get('unit_column', 'unidade')
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    frames = load_sources(spec, os.path.dirname(os.path.abspath(args.spec)))
+    load_s = time.perf_counter() - started
+    started = time.perf_counter()
+    periods = sorted({job['period'] for job in jobs if job['include_metrics']})
+    kpis = compute_unit_kpis(frames, unit_column, periods)
+    kpi_s = time.perf_counter() - started
+    print(f"Fontes: {len(frames)} ({sum(len(df) for df in frames.values()):,} linhas) em {load_s:.2f}s · "
+          f"KPIs de {len(periods)} período(s) em {kpi_s:.2f}s")
+
+    timings = []
+    failures = 0
+    render_started = time.perf_counter()
+    tables = []
+    with ProcessPoolExecutor(max(1, args.workers)) as executor:
+        futures = {}
+        for job in jobs:
+            kpi_results = unit_results(kpis[job['period']], unit_column, job['unit']) if job['include_metrics'] else None
+            appendices = unit_appendices(frames, unit_column, job)
+            tables.extend(appendices.values())
+            futures[executor.submit(render_job, job, kpi_results, args.output_dir, appendices)] = job
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"ERRO  {job['unit']:<24} {job['period']:<18} {e}", file=sys.stderr)
+                continue
+            if args.store:
+                # Stored from this process only, so the workers never write
+                # the report index concurrently.
+                with open(result['path'], 'rb') as fh:
+                    result['report_id'] = get_report_store().put(fh.read(), result['title'], 'Gerencial',
+                                                                 owner=BATCH_OWNER)
+            timings.append(result)
+            print(f"OK    {result['unit']:<24} {result['period']:<18} {result['total_s']:7.2f}s "
+                  f"(montagem {result['build_s']:.2f}s, PDF {result['render_s']:.2f}s) {result['bytes'] / 1024:8.1f} KB")
+    for table in tables:
+        discard_table(table)
+    render_s = time.perf_counter() - render_started
+    wall_s = time.perf_counter() - wall_started
+
+    if timings:
+        per_report = pd.Series([t['total_s'] for t in timings])
+        print(f"\n{len(timings)} relatório(s) em {render_s:.2f}s com {args.workers} processo(s) · "
+              f"{len(timings) / render_s:.1f} relatórios/s · "
+              f"média {per_report.mean():.2f}s · p95 {per_report.quantile(0.95):.2f}s · "
+              f"{sum(t['bytes'] for t in timings) / 1024 ** 2:.1f} MB · tempo total {wall_s:.2f}s")
+    if failures:
+        print(f"{failures} relatório(s) com erro.", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
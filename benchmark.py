@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from data_store import DataSourceStore, MemoryBudget
+from file_ingest import read_upload
+from kpi_catalog import CATALOG, format_kpi_value, kpi_statuses, kpi_values
+from kpi_engine import KPIEngine
+from mysql_stream import build_select, read_streaming
+from report_generator import ReportGenerator, build_management_report
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+SOURCE_SHARES = {'riscos': 0.4, 'denuncias': 0.3, 'treinamentos': 0.3}
+UNITS = 500
+
+
+def rss_bytes():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RSSSampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def _dates(rng, rows, as_of, days=730):
+    return as_of - pd.to_timedelta(rng.integers(0, days * 86400, rows), unit='s')
+
+
+def synthetic_sources(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    as_of = pd.Timestamp.now().normalize()
+    units = np.array([f"CC-{i:04d}" for i in range(UNITS)], dtype=object)
+    sizes = {name: max(1, int(rows * share)) for name, share in SOURCE_SHARES.items()}
+
+    n = sizes['riscos']
+    identified = _dates(rng, n, as_of)
+    mitigated = identified + pd.to_timedelta(rng.exponential(25, n), unit='D')
+    riscos = pd.DataFrame({
+        'unidade': pd.Categorical.from_codes(rng.integers(0, UNITS, n), units),
+        'data_identificacao': identified,
+        'data_mitigacao': mitigated.where(rng.random(n) < 0.8),
+        'nivel': pd.Categorical.from_codes(rng.integers(0, 4, n), ['Baixo', 'Médio', 'Alto', 'Crítico']),
+        'score': rng.uniform(0, 100, n).round(1),
+        'avaliado': rng.random(n) < 0.9
+    })
+
+    n = sizes['denuncias']
+    received = _dates(rng, n, as_of)
+    denuncias = pd.DataFrame({
+        'unidade': pd.Categorical.from_codes(rng.integers(0, UNITS, n), units),
+        'data_recebimento': received,
+        'data_primeira_resposta': received + pd.to_timedelta(rng.exponential(20, n), unit='h'),
+        'status': pd.Categorical.from_codes(rng.integers(0, 3, n), ['Aberta', 'Em análise', 'Resolvida']),
+        'categoria': pd.Categorical.from_codes(rng.integers(0, 3, n), ['Código de Conduta', 'Fraude', 'Assédio']),
+        'severidade': rng.integers(1, 100, n),
+        'acao_disciplinar': rng.random(n) < 0.05,
+        'licao_aprendida': rng.random(n) < 0.1
+    })
+
+    n = sizes['treinamentos']
+    treinamentos = pd.DataFrame({
+        'unidade': pd.Categorical.from_codes(rng.integers(0, UNITS, n), units),
+        'data': _dates(rng, n, as_of),
+        'colaborador_id': rng.integers(0, max(1, n // 4), n),
+        'horas': rng.choice([1.0, 2.0, 4.0, 8.0], n),
+        'concluido': rng.random(n) < 0.95,
+        'nota': rng.uniform(50, 100, n).round(1),
+        'publico': pd.Categorical.from_codes(rng.integers(0, 2, n), ['Geral', 'Liderança']),
+        'turma': rng.integers(0, 200, n)
+    })
+    return {'riscos': riscos, 'denuncias': denuncias, 'treinamentos': treinamentos}
+
+
+def write_sqlite(frames, path, chunk_rows=200000):
+    connection = sqlite3.connect(path)
+    try:
+        for name, df in frames.items():
+            plain = df.copy()
+            for column in plain.columns:
+                if isinstance(plain[column].dtype, pd.CategoricalDtype):
+                    plain[column] = plain[column].astype(str)
+                elif pd.api.types.is_datetime64_any_dtype(plain[column].dtype):
+                    plain[column] = plain[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+            plain.to_sql(name, connection, index=False, chunksize=chunk_rows, if_exists='replace')
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class Benchmark:
+    def __init__(self, repeat=1, allocations=False):
+        self.repeat = max(1, repeat)
+        self.allocations = allocations
+        self.results = []
+
+    def run(self, stage, rows, func):
+        timings = []
+        peak_rss = 0
+        start_rss = None
+        value = None
+        for _ in range(self.repeat):
+            value = None
+            gc.collect()
+            with _RSSSampler() as sampler:
+                started = time.perf_counter()
+                value = func()
+                timings.append(time.perf_counter() - started)
+            start_rss = sampler.start if start_rss is None else min(start_rss, sampler.start)
+            peak_rss = max(peak_rss, sampler.peak)
+        result = {
+            'stage': stage,
+            'rows': rows,
+            'wall_s': min(timings),
+            'peak_rss_mb': peak_rss / 1024 ** 2,
+            'rss_delta_mb': (peak_rss - start_rss) / 1024 ** 2
+        }
+        if self.allocations:
+            # A separate traced pass, so tracing overhead does not skew the
+            # wall time above.
+            value = None
+            gc.collect()
+            tracemalloc.start()
+            try:
+                value = func()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            result['alloc_peak_mb'] = peak / 1024 ** 2
+        self.results.append(result)
+        line = (f"{stage:<22} {rows:>12,} linhas  {result['wall_s']:9.3f}s  "
+                f"pico RSS {result['peak_rss_mb']:8.1f} MB (+{result['rss_delta_mb']:.1f})")
+        if self.allocations:
+            line += f"  alocações {result['alloc_peak_mb']:.1f} MB"
+        print(line, flush=True)
+        return value
+
+
+def pillar_dashboards(engine, frames):
+    results = engine.compute(frames)
+    results['status'] = CATALOG.icons(CATALOG.evaluate_frame(results))
+    for pillar, data in CATALOG.pillars.items():
+        values = kpi_values(results, pillar)
+        statuses = kpi_statuses(results, pillar)
+        for kpi in data['kpis']:
+            format_kpi_value(kpi, values.get(kpi['name']))
+            statuses.get(kpi['name'], "⚪")
+    return results
+
+
+def run_size(bench, rows, args, work_dir):
+    frames = bench.run('gerar_dados', rows, lambda: synthetic_sources(rows, args.seed))
+    total = sum(len(df) for df in frames.values())
+
+    if rows <= args.sqlite_max_rows:
+        path = os.path.join(work_dir, f"bench_{rows}.sqlite")
+        write_sqlite(frames, path)
+
+        def stream_tables():
+            connection = sqlite3.connect(path)
+            try:
+                loaded = {}
+                for name in frames:
+                    cursor = connection.cursor()
+                    loaded[name] = read_streaming(cursor, build_select(name))
+                    cursor.close()
+                return loaded
+            finally:
+                connection.close()
+
+        def read_sql_tables():
+            connection = sqlite3.connect(path)
+            try:
+                return {name: pd.read_sql(f"SELECT * FROM {name}", connection) for name in frames}
+            finally:
+                connection.close()
+
+        bench.run('mysql_streaming', total, stream_tables)
+        bench.run('mysql_read_sql', total, read_sql_tables)
+        os.remove(path)
+
+    if rows <= args.file_max_rows:
+        buffers = {}
+        for name, df in frames.items():
+            buffer = BytesIO()
+            df.to_csv(buffer, index=False)
+            buffers[name] = buffer
+        bench.run('ingestao_csv', total, lambda: {name: read_upload(buffer, f"{name}.csv") for name, buffer in buffers.items()})
+        del buffers
+
+    def store_frames():
+        store = DataSourceStore(budget=MemoryBudget(limit_bytes=1 << 62), shared=False)
+        for name, df in frames.items():
+            store[name] = df
+        return store
+
+    bench.run('armazenar_compactar', total, store_frames)
+    engine = KPIEngine(CATALOG.entries)
+    bench.run('kpis', total, lambda: engine.compute(frames))
+    bench.run('kpis_por_unidade', total, lambda: engine.compute(frames, group_by='unidade'))
+    results = bench.run('painel_pilares', total, lambda: pillar_dashboards(engine, frames))
+
+    def build_pdf():
+        report_data = build_management_report(
+            "Relatório de Benchmark", "Último ano", "Benchmark", list(CATALOG.pillars.keys()), results,
+            include_charts=args.charts
+        )
+        buffer = BytesIO()
+        ReportGenerator().create_report(report_data, buffer)
+        return buffer
+
+    bench.run('relatorio_pdf', total, build_pdf)
+
+
+def compare(results, baseline, threshold, min_seconds):
+    previous = {(r['stage'], r['rows']): r for r in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'Etapa':<22} {'Linhas':>12}  {'Base':>9}  {'Atual':>9}  {'Variação':>9}")
+    for result in results:
+        before = previous.get((result['stage'], result['rows']))
+        if before is None:
+            continue
+        change = result['wall_s'] / before['wall_s'] - 1 if before['wall_s'] else 0.0
+        flag = ''
+        if change > threshold and result['wall_s'] - before['wall_s'] > min_seconds:
+            flag = '  ⚠️ regressão'
+            regressions.append(result)
+        elif before.get('peak_rss_mb') and result['peak_rss_mb'] > before['peak_rss_mb'] * (1 + threshold) \
+                and result['rss_delta_mb'] > before.get('rss_delta_mb', 0) + 64:
+            flag = '  ⚠️ memória'
+            regressions.append(result)
+        print(f"{result['stage']:<22} {result['rows']:>12,}  {before['wall_s']:8.3f}s  "
+              f"{result['wall_s']:8.3f}s  {change:+8.1%}{flag}")
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'date': datetime.now().isoformat(timespec='seconds')
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão, KPIs, painéis e geração de PDF com dados sintéticos.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Quantidades de linhas (10k a 50M) a gerar.")
+    parser.add_argument('--repeat', type=int, default=1, help="Repetições por etapa (vale o menor tempo).")
+    parser.add_argument('--allocations', action='store_true', help="Mede alocações com tracemalloc numa passada extra.")
+    parser.add_argument('--charts', action='store_true', help="Inclui gráficos no PDF (requer Kaleido).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sqlite-max-rows', type=int, default=5000000,
+                        help="Maior tamanho carregado pelo substituto SQLite do MySQL.")
+    parser.add_argument('--file-max-rows', type=int, default=5000000, help="Maior tamanho testado na ingestão de CSV.")
+    parser.add_argument('--output', default=None, help="Grava os resultados em JSON.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Arquivo de referência para comparação.")
+    parser.add_argument('--save-baseline', action='store_true', help="Grava os resultados como nova referência.")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Piora relativa considerada regressão.")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="Diferença mínima de tempo para sinalizar.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bench = Benchmark(repeat=args.repeat, allocations=args.allocations)
+    with tempfile.TemporaryDirectory(prefix='compliance-bench-') as work_dir:
+        for rows in args.sizes:
+            run_size(bench, rows, args, work_dir)
+            gc.collect()
+    bench.run('status_55x500x36', 55 * 500 * 36,
+              lambda: CATALOG.evaluate(np.random.default_rng(args.seed).uniform(0, 200, (36, 500, len(CATALOG)))))
+    report = {'environment': environment(), 'results': bench.results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            regressions = compare(bench.results, json.load(fh), args.threshold, args.min_seconds)
+        print(f"\n{len(regressions)} regressão(ões) em relação a {args.baseline}.")
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+        print(f"\nReferência gravada em {args.baseline}.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
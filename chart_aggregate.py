@@ -0,0 +1,96 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_store import add_discard_hook
+from kpi_cache import KPIResultCache
+
+AGGREGATIONS = {"Soma": 'sum', "Contagem": 'count', "Média": 'mean', "Distintos": 'nunique'}
+DEFAULT_TOP_N = 20
+OTHER_LABEL = "Outros"
+MAX_DENSE_PAIRS = 64 * 1024 ** 2
+
+
+def _codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype(np.intp), np.asarray(series.cat.categories, dtype=object)
+    codes, labels = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(np.intp), np.asarray(labels, dtype=object)
+
+
+def _reduce(codes, size, values, value_codes, agg):
+    if agg == 'count':
+        return np.bincount(codes, minlength=size).astype('float64')
+    if agg == 'nunique':
+        present = value_codes >= 0
+        if not present.any():
+            return np.zeros(size, dtype='float64')
+        width = int(value_codes.max()) + 1
+        pairs = codes[present].astype(np.int64) * width + value_codes[present]
+        if size * width <= MAX_DENSE_PAIRS:
+            seen = np.zeros(size * width, dtype=bool)
+            seen[pairs] = True
+            return seen.reshape(size, width).sum(axis=1).astype('float64')
+        return np.bincount(np.unique(pairs) // width, minlength=size).astype('float64')
+    present = ~np.isnan(values)
+    sums = np.bincount(codes[present], weights=values[present], minlength=size)
+    if agg == 'sum':
+        return sums
+    counts = np.bincount(codes[present], minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def aggregate(df, by, values=None, agg='sum', top_n=DEFAULT_TOP_N):
+    codes, labels = _codes(df[by])
+    keep = codes >= 0
+    codes = codes[keep]
+    numeric = value_codes = None
+    if agg in ('sum', 'mean'):
+        numeric = pd.to_numeric(df[values], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)[keep]
+    elif agg == 'nunique':
+        value_codes = _codes(df[values])[0][keep]
+    result = _reduce(codes, len(labels), numeric, value_codes, agg)
+    used = np.flatnonzero(np.bincount(codes, minlength=len(labels)) > 0)
+    order = used[np.argsort(-np.nan_to_num(result[used], nan=-np.inf), kind='stable')]
+    top = order[:top_n] if top_n else order
+    frame = pd.DataFrame({by: labels[top], 'valor': result[top]})
+    if top_n and len(order) > top_n:
+        # The tail is aggregated again over its own rows, so "Outros" is exact
+        # for means and distinct counts as well.
+        tail = ~np.isin(codes, top)
+        tail_codes = np.zeros(int(tail.sum()), dtype=np.intp)
+        other = _reduce(
+            tail_codes, 1,
+            None if numeric is None else numeric[tail],
+            None if value_codes is None else value_codes[tail],
+            agg
+        )[0]
+        frame = pd.concat([frame, pd.DataFrame({by: [OTHER_LABEL], 'valor': [other]})], ignore_index=True)
+    frame[by] = frame[by].astype(str)
+    return frame, {'rows': int(keep.sum()), 'groups': len(used), 'shown': len(frame)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_aggregate_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KPIResultCache(max_entries=512)
+            add_discard_hook(_cache.invalidate_version)
+        return _cache
+
+
+def cached_aggregate(df, version, by, values=None, agg='sum', top_n=DEFAULT_TOP_N):
+    key = (version, by, values if agg != 'count' else None, agg, top_n)
+    cache = get_aggregate_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0], dict(cached[1], cached=True)
+    result = aggregate(df, by, values, agg, top_n)
+    cache.put(key, version, result)
+    return result[0], dict(result[1], cached=False)
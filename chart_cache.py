@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_CHART_DIR = os.environ.get(
+    'COMPLIANCE_CHART_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'charts')
+)
+DEFAULT_MAX_BYTES = int(os.environ.get('COMPLIANCE_CHART_CACHE_MAX_MB', '256')) * 1024 ** 2
+CHART_WIDTH = 900
+CHART_HEIGHT = 600
+CHART_SCALE = 1
+
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def as_figure(figure):
+    import plotly.graph_objects as go
+
+    return figure if isinstance(figure, go.Figure) else go.Figure(figure)
+
+
+def figure_key(figure, width=CHART_WIDTH, height=CHART_HEIGHT, scale=CHART_SCALE):
+    from plotly.utils import PlotlyJSONEncoder
+
+    payload = json.dumps(as_figure(figure).to_dict(), sort_keys=True, cls=PlotlyJSONEncoder)
+    digest = hashlib.sha256(payload.encode('utf-8'))
+    digest.update(f"\x00{width}x{height}@{scale}".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def _start_renderer():
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            import kaleido
+        except ImportError:
+            return
+        # Kaleido >= 1.0 can keep one browser session alive for the whole
+        # process instead of launching it for every image.
+        if hasattr(kaleido, 'start_sync_server'):
+            try:
+                kaleido.start_sync_server(silence_warnings=True)
+            except Exception:
+                pass
+
+
+def rasterize(figures, width=CHART_WIDTH, height=CHART_HEIGHT, scale=CHART_SCALE):
+    if not figures:
+        return []
+    import plotly.io as pio
+
+    _start_renderer()
+    if hasattr(pio, 'write_images'):
+        with tempfile.TemporaryDirectory(prefix='charts-') as tmp_dir:
+            paths = [os.path.join(tmp_dir, f"{idx}.png") for idx in range(len(figures))]
+            pio.write_images(figures, paths, format='png', width=width, height=height, scale=scale)
+            images = []
+            for path in paths:
+                with open(path, 'rb') as fh:
+                    images.append(fh.read())
+            return images
+    return [pio.to_image(figure, format='png', width=width, height=height, scale=scale) for figure in figures]
+
+
+class ChartImageCache:
+    def __init__(self, root=DEFAULT_CHART_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._counters_path = os.path.join(self.root, 'counters.json')
+        self._counters_lock_path = os.path.join(self.root, 'counters.lock')
+
+    @contextmanager
+    def _counters(self):
+        # Charts are rendered in report worker processes and by the batch
+        # CLI, so the hit/miss counters live next to the images on disk.
+        with self._lock:
+            with open(self._counters_lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    try:
+                        with open(self._counters_path, encoding='utf-8') as fh:
+                            counters = json.load(fh)
+                    except (OSError, ValueError):
+                        counters = {'hits': 0, 'misses': 0, 'rendered': 0}
+                    before = dict(counters)
+                    yield counters
+                    if counters != before:
+                        tmp_path = f"{self._counters_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                        with open(tmp_path, 'w', encoding='utf-8') as fh:
+                            json.dump(counters, fh)
+                        os.replace(tmp_path, self._counters_path)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.png")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.root):
+            if name.endswith('.png'):
+                try:
+                    stat = os.stat(os.path.join(self.root, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+            total -= size
+
+    def render(self, figures, width=CHART_WIDTH, height=CHART_HEIGHT, scale=CHART_SCALE):
+        figures = [as_figure(figure) for figure in figures]
+        keys = [figure_key(figure, width, height, scale) for figure in figures]
+        images = {}
+        missing = {}
+        for key, figure in zip(keys, figures):
+            if key in images or key in missing:
+                continue
+            data = self.get(key)
+            if data is None:
+                missing[key] = figure
+            else:
+                images[key] = data
+        if missing:
+            for key, data in zip(missing, rasterize(list(missing.values()), width, height, scale)):
+                self.put(key, data)
+                images[key] = data
+            self._evict()
+        with self._counters() as counters:
+            counters['hits'] += len(figures) - len(missing)
+            counters['misses'] += len(missing)
+            counters['rendered'] += len(missing)
+        return [images[key] for key in keys]
+
+    def clear(self):
+        for name in os.listdir(self.root):
+            if name.endswith('.png'):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+        with self._counters() as counters:
+            counters.update(hits=0, misses=0, rendered=0)
+
+    def stats(self):
+        sizes = []
+        for name in os.listdir(self.root):
+            if name.endswith('.png'):
+                try:
+                    sizes.append(os.path.getsize(os.path.join(self.root, name)))
+                except OSError:
+                    pass
+        with self._counters() as counters:
+            lookups = counters['hits'] + counters['misses']
+            return {
+                'hits': counters['hits'],
+                'misses': counters['misses'],
+                'hit_rate': counters['hits'] / lookups if lookups else 0.0,
+                'rendered': counters['rendered'],
+                'entries': len(sizes),
+                'bytes': sum(sizes),
+                'max_bytes': self.max_bytes
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_chart_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ChartImageCache()
+        return _cache
@@ -0,0 +1,367 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_store import add_discard_hook
+from kpi_cache import KPIResultCache
+from kpi_catalog import CATALOG
+from kpi_engine import _SourceScan, _freeze
+
+MONTH_SUFFIX = ':mes'
+MAX_DENSE_GROUPS = 1 << 22
+ROLLUPS = {'count': 'sum', 'sum': 'sum', 'n': 'sum', 'min': 'min', 'max': 'max'}
+KPI_QUERIES = ('kpi', 'compliance_score', 'pillar_scores', 'kpi_table')
+_MISSING = object()
+
+
+def _measures(query):
+    measures = query.get('measures') or [(query.get('column'), query.get('agg', 'count'))]
+    return tuple((None if agg == 'count' else column, agg) for column, agg in measures)
+
+
+def _components(measure):
+    column, agg = measure
+    if agg == 'count':
+        return [('count', None)]
+    if agg == 'mean':
+        return [('sum', column), ('n', column)]
+    return [(agg, column)]
+
+
+def _label(measure):
+    column, agg = measure
+    return 'valor' if agg == 'count' else f"{column} ({agg})"
+
+
+class _Scan:
+    def __init__(self, source, filters, date, window):
+        self.source = source
+        self.filters = filters
+        self.date = date
+        self.window = window
+        self.groups = {}
+        self.tops = {}
+        self.parents = {}
+        self.widgets = []
+
+    @property
+    def key(self):
+        return (self.source, _freeze(self.filters or {}), self.date, self.window)
+
+    def plan_rollups(self):
+        # A group-by whose keys are a subset of a finer one, and whose measures
+        # can be re-aggregated, is derived from the finer result instead of
+        # going back to the rows.
+        ordered = sorted(self.groups, key=len, reverse=True)
+        for by in ordered:
+            components = self.groups[by]
+            if not all(kind in ROLLUPS for kind, _ in components):
+                continue
+            candidates = [
+                other for other in ordered
+                if len(other) > len(by) and set(by) < set(other) and other not in self.parents
+            ]
+            if candidates:
+                parent = min(candidates, key=len)
+                self.parents[by] = parent
+                self.groups[parent] |= components
+
+    def columns(self):
+        columns = set((self.filters or {}).keys())
+        if self.date:
+            columns.add(self.date)
+        for by, components in self.groups.items():
+            columns.update(column[:-len(MONTH_SUFFIX)] if column.endswith(MONTH_SUFFIX) else column for column in by)
+            columns.update(column for _, column in components if column)
+        for order_by, _, selected in self.tops:
+            columns.add(order_by)
+            columns.update(selected)
+        return columns
+
+    def signature(self):
+        return (self.key, tuple(sorted((by, tuple(sorted(c, key=str))) for by, c in self.groups.items())),
+                tuple(sorted(self.tops)))
+
+
+class DashboardPlan:
+    def __init__(self, widgets, window=None):
+        self.widgets = list(widgets)
+        self.window = window
+        self.scans = {}
+        self.bindings = {}
+        kpis = set()
+        for index, widget in enumerate(self.widgets):
+            query = widget.get('query') or {}
+            if 'kpi' in query:
+                kpis.add(tuple(query['kpi']))
+            elif any(name in query for name in KPI_QUERIES):
+                kpis.update((pillar, kpi['name']) for pillar, kpi in CATALOG.entries)
+            elif query.get('source'):
+                self._bind(index, query)
+        self.kpi_entries = [(pillar, kpi) for pillar, kpi in CATALOG.entries if (pillar, kpi['name']) in kpis]
+        for scan in self.scans.values():
+            scan.plan_rollups()
+
+    def _bind(self, index, query):
+        query_window = (self.window or query['window']) if query.get('window') else None
+        scan = _Scan(query['source'], query.get('filters'), query.get('date'), query_window)
+        scan = self.scans.setdefault(scan.key, scan)
+        scan.widgets.append(index)
+        if query.get('top'):
+            top = (query['order_by'], int(query['top']), tuple(query.get('columns') or ()))
+            scan.tops[top] = None
+            self.bindings[index] = (scan.key, 'top', top)
+            return
+        by = tuple(query.get('by') or ())
+        measures = _measures(query)
+        components = scan.groups.setdefault(by, set())
+        for measure in measures:
+            components.update(_components(measure))
+        self.bindings[index] = (scan.key, 'group', (by, measures))
+
+    @property
+    def sources(self):
+        return sorted({scan.source for scan in self.scans.values()})
+
+    def explain(self):
+        rows = []
+        for scan in self.scans.values():
+            scope = ", ".join(f"{column}={value}" for column, value in (scan.filters or {}).items()) or "—"
+            titles = ", ".join(self.widgets[index]['title'] for index in scan.widgets)
+            rows.append({'Fonte': scan.source, 'Etapa': "Varredura", 'Filtros': scope,
+                         'Janela': scan.window or "—", 'Widgets': titles})
+            for by, components in scan.groups.items():
+                step = f"Derivado de ({', '.join(scan.parents[by])})" if by in scan.parents else "Agrupamento"
+                rows.append({'Fonte': scan.source, 'Etapa': step, 'Filtros': ", ".join(by) or "(total)",
+                             'Janela': scan.window or "—",
+                             'Widgets': ", ".join(sorted({kind if column is None else f"{kind}({column})"
+                                                          for kind, column in components}))})
+            for order_by, n, _ in scan.tops:
+                rows.append({'Fonte': scan.source, 'Etapa': f"Top {n}", 'Filtros': order_by,
+                             'Janela': scan.window or "—", 'Widgets': ""})
+        return pd.DataFrame(rows, columns=['Fonte', 'Etapa', 'Filtros', 'Janela', 'Widgets'])
+
+    def execute(self, frames, kpi_results=None, versions=None, as_of=None):
+        as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        versions = versions or {}
+        cache = get_plan_cache()
+        stats = {'widgets': len(self.widgets), 'scans': 0, 'cached_scans': 0, 'group_bys': 0,
+                 'derived': 0, 'rows_scanned': 0, 'seconds': 0.0}
+        started = time.perf_counter()
+        scan_results = {}
+        for key, scan in self.scans.items():
+            df = frames.get(scan.source)
+            if df is None or not scan.columns() <= set(df.columns):
+                continue
+            cache_key = (scan.signature(), versions.get(scan.source), as_of)
+            result = cache.get(cache_key) if scan.source in versions else None
+            if result is None:
+                result = _execute_scan(scan, df, as_of)
+                if scan.source in versions:
+                    cache.put(cache_key, versions[scan.source], result)
+                stats['scans'] += 1
+                stats['rows_scanned'] += len(df)
+                stats['group_bys'] += len(scan.groups) - len(scan.parents)
+                stats['derived'] += len(scan.parents)
+            else:
+                stats['cached_scans'] += 1
+            scan_results[key] = result
+        results = {}
+        for index, widget in enumerate(self.widgets):
+            results[index] = self._widget_result(widget.get('query') or {}, index, scan_results, kpi_results)
+        stats['seconds'] = time.perf_counter() - started
+        return results, stats
+
+    def _widget_result(self, query, index, scan_results, kpi_results):
+        if any(name in query for name in KPI_QUERIES):
+            return _kpi_result(query, kpi_results)
+        binding = self.bindings.get(index)
+        if binding is None or binding[0] not in scan_results:
+            return None
+        key, kind, spec = binding
+        if kind == 'top':
+            return scan_results[key]['tops'][spec]
+        by, measures = spec
+        grouped = scan_results[key]['groups'][by]
+        frame = pd.DataFrame({column: grouped[column] for column in by})
+        for measure in measures:
+            column, agg = measure
+            if agg == 'count':
+                values = grouped[('count', None)]
+            elif agg == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = np.where(grouped[('n', column)] > 0,
+                                      grouped[('sum', column)] / grouped[('n', column)], np.nan)
+            else:
+                values = grouped[(agg, column)]
+            frame[_label(measure)] = np.asarray(values)
+        if query.get('sort'):
+            frame = frame.sort_values(query['sort'], ascending=query.get('ascending', False), kind='stable')
+        if query.get('limit'):
+            frame = frame.head(query['limit'])
+        return frame.reset_index(drop=True)
+
+
+def _kpi_result(query, kpi_results):
+    if kpi_results is None or kpi_results.empty:
+        return None
+    if 'kpi' in query:
+        pillar, name = query['kpi']
+        rows = kpi_results[(kpi_results['pillar'] == pillar) & (kpi_results['kpi'] == name)]
+        if rows.empty:
+            return None
+        return {'value': rows['value'].iloc[0], 'status': rows['status'].iloc[0]}
+    codes = CATALOG.evaluate_frame(kpi_results)
+    if 'compliance_score' in query:
+        return float(CATALOG.on_target_share(codes)) * 100
+    if 'pillar_scores' in query:
+        scores = pd.Series(codes).groupby(kpi_results['pillar'].to_numpy()).apply(
+            lambda group: float(CATALOG.on_target_share(group.to_numpy())) * 100
+        )
+        return scores.rename_axis('pilar').reset_index(name='score')
+    return kpi_results[['pillar', 'kpi', 'value', 'status']].reset_index(drop=True)
+
+
+def _key_codes(scan, column, cache):
+    if column not in cache:
+        if column.endswith(MONTH_SUFFIX):
+            months = scan.dates(column[:-len(MONTH_SUFFIX)]).astype('datetime64[M]')
+            codes, labels = pd.factorize(months, use_na_sentinel=True)
+            labels = pd.DatetimeIndex(labels).strftime('%Y-%m')
+        else:
+            series = scan.df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, labels = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, labels = pd.factorize(series.to_numpy(), use_na_sentinel=True)
+        cache[column] = (np.asarray(codes, dtype=np.int64), np.asarray(labels, dtype=object))
+    return cache[column]
+
+
+def _group_codes(scan, by, mask, cache, keep_missing=False):
+    if not by:
+        return np.zeros(int(mask.sum()), dtype=np.intp), mask, [], 1
+    keep = mask.copy()
+    parts = []
+    for column in by:
+        codes, labels = _key_codes(scan, column, cache)
+        if keep_missing:
+            # Rows with a missing key get a group of their own, labelled
+            # _MISSING, so coarser group-bys rolled up from this one still
+            # count them.
+            codes = np.where(codes >= 0, codes, len(labels))
+            labels = np.append(labels, np.array([_MISSING], dtype=object))
+        else:
+            keep &= codes >= 0
+        parts.append((codes, labels))
+    combined = np.zeros(int(keep.sum()), dtype=np.int64)
+    for codes, labels in parts:
+        combined = combined * len(labels) + codes[keep]
+    size = int(np.prod([len(labels) for _, labels in parts], dtype=np.float64))
+    if size <= MAX_DENSE_GROUPS:
+        used = np.flatnonzero(np.bincount(combined, minlength=size))
+        inverse = np.searchsorted(used, combined)
+    else:
+        used, inverse = np.unique(combined, return_inverse=True)
+    keys = []
+    remainder = used
+    for codes, labels in reversed(parts):
+        keys.append(labels[remainder % len(labels)])
+        remainder = remainder // len(labels)
+    return inverse.astype(np.intp), keep, keys[::-1], len(used)
+
+
+def _present(grouped, by):
+    present = np.ones(len(grouped[by[0]]) if by else 1, dtype=bool)
+    for column in by:
+        present &= np.fromiter((key is not _MISSING for key in grouped[column]), dtype=bool,
+                               count=len(grouped[column]))
+    return present
+
+
+def _drop_missing(grouped, by):
+    present = _present(grouped, by)
+    if present.all():
+        return grouped
+    return {name: np.asarray(values)[present] for name, values in grouped.items()}
+
+
+def _rollup(finer, parent, by, components):
+    # pandas drops rows whose key is missing; only the keys of the coarser
+    # group-by count, since those of the finer one were kept as _MISSING.
+    finer = _drop_missing(finer, by)
+    frame = pd.DataFrame({column: finer[column] for column in parent})
+    for position, component in enumerate(components):
+        frame[position] = finer[component]
+    how = {position: ROLLUPS[component[0]] for position, component in enumerate(components)}
+    if not by:
+        return {component: np.array([frame[position].agg(how[position])], dtype='float64')
+                for position, component in enumerate(components)}
+    rolled = frame.groupby(list(by), sort=False, observed=True).agg(how)
+    index = rolled.index.to_frame(index=False)
+    grouped = {column: index[column].to_numpy(dtype=object) for column in by}
+    for position, component in enumerate(components):
+        grouped[component] = rolled[position].to_numpy(dtype='float64')
+    return grouped
+
+
+def _execute_scan(scan, df, as_of):
+    source = _SourceScan(df, as_of)
+    mask = source.mask(scan.filters, scan.date, scan.window)
+    key_cache = {}
+    groups = {}
+    finer = {}
+    rolled_from = set(scan.parents.values())
+    for by in sorted(scan.groups, key=len, reverse=True):
+        if by in scan.parents:
+            continue
+        inverse, keep, keys, size = _group_codes(source, by, mask, key_cache, keep_missing=by in rolled_from)
+        grouped = dict(zip(by, keys))
+        for kind, column in scan.groups[by]:
+            if kind == 'count':
+                grouped[(kind, column)] = np.bincount(inverse, minlength=size).astype('float64')
+            elif kind == 'nunique':
+                values = pd.factorize(df[column].to_numpy()[keep], use_na_sentinel=True)[0]
+                counted = pd.Series(values).where(values >= 0).groupby(inverse).nunique()
+                grouped[(kind, column)] = counted.reindex(range(size), fill_value=0).to_numpy(dtype='float64')
+            else:
+                values, present = source.numeric(column)
+                values, present = values[keep], present[keep]
+                if kind == 'n':
+                    grouped[(kind, column)] = np.bincount(inverse, weights=present, minlength=size)
+                elif kind == 'sum':
+                    grouped[(kind, column)] = np.bincount(inverse, weights=values, minlength=size)
+                else:
+                    masked = pd.Series(np.where(present, values, np.nan))
+                    reduced = masked.groupby(inverse).agg(kind)
+                    grouped[(kind, column)] = reduced.reindex(range(size)).to_numpy(dtype='float64')
+        if by in rolled_from:
+            finer[by] = grouped
+            grouped = _drop_missing(grouped, by)
+        groups[by] = grouped
+    for by, parent in sorted(scan.parents.items(), key=lambda item: len(item[0]), reverse=True):
+        groups[by] = _rollup(finer[parent], parent, by, sorted(scan.groups[by], key=str))
+    tops = {}
+    for order_by, n, columns in scan.tops:
+        values, present = source.numeric(order_by)
+        candidates = np.flatnonzero(mask & present)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-values[candidates], n - 1)[:n]]
+        candidates = candidates[np.argsort(-values[candidates], kind='stable')]
+        tops[(order_by, n, columns)] = df.iloc[candidates][list(columns) or df.columns].reset_index(drop=True)
+    return {'groups': groups, 'tops': tops}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_plan_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KPIResultCache(max_entries=256)
+            add_discard_hook(_cache.invalidate_version)
+        return _cache
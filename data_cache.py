@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pyarrow as pa
+import pyarrow.ipc
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'COMPLIANCE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'data')
+)
+DEFAULT_MAX_BYTES = int(os.environ.get('COMPLIANCE_CACHE_MAX_MB', '2048')) * 1024 ** 2
+DEFAULT_TTL_SECONDS = int(os.environ.get('COMPLIANCE_CACHE_TTL_HOURS', '24')) * 3600
+
+
+def schema_hash(columns):
+    payload = json.dumps([[str(name), str(kind)] for name, kind in columns], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def frame_schema_hash(df):
+    return schema_hash([(name, dtype) for name, dtype in df.dtypes.items()])
+
+
+class ColumnarCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, 'index.json')
+        self._lock_path = os.path.join(self.root, 'index.lock')
+        self._index_mtime = None
+        self._index = {}
+        self._reload()
+
+    @contextmanager
+    def _locked(self):
+        # Every Streamlit worker process shares the directory, so each
+        # read-modify-write of the index holds an exclusive file lock and
+        # starts from the index as it is on disk.
+        with self._lock:
+            with open(self._lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reload(force=True)
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self, force=False):
+        try:
+            mtime = os.path.getmtime(self._index_path)
+        except OSError:
+            return
+        if mtime == self._index_mtime and not force:
+            return
+        try:
+            with open(self._index_path, encoding='utf-8') as fh:
+                self._index = json.load(fh)
+            self._index_mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _write_index(self):
+        tmp_path = f"{self._index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self._index, fh, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.path.getmtime(self._index_path)
+
+    @staticmethod
+    def key(connection, table, schema):
+        return hashlib.sha256(f"{connection}\x00{table}\x00{schema}".encode('utf-8')).hexdigest()[:24]
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.arrow")
+
+    def _expired(self, entry, now):
+        return self.ttl_seconds > 0 and now - entry['created'] > self.ttl_seconds
+
+    def _drop(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        for key, entry in list(self._index.items()):
+            if self._expired(entry, now) or not os.path.exists(self._path(key)):
+                self._drop(key)
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['last_access'])
+        total = sum(entry['bytes'] for entry in self._index.values())
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= entry['bytes']
+            self._drop(key)
+
+    def put(self, source, df, connection, table, schema=None, owner=None):
+        schema = schema or frame_schema_hash(df)
+        key = self.key(connection, table, schema)
+        try:
+            arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return False
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        os.replace(tmp_path, path)
+        now = time.time()
+        with self._locked():
+            owners = self._index.get(key, {}).get('owners', [])
+            for old_key, entry in list(self._index.items()):
+                # Superseded by a new schema of the same table. Uploads use
+                # their digest as the table, so files that share a name never
+                # replace each other.
+                if old_key != key and entry['connection'] == connection and entry['table'] == table:
+                    self._drop(old_key)
+            self._index[key] = {
+                'source': source,
+                'connection': connection,
+                'table': table,
+                'schema': schema,
+                'rows': len(df),
+                'bytes': os.path.getsize(path),
+                'created': now,
+                'last_access': now,
+                'owners': owners + [owner] if owner is not None and owner not in owners else owners
+            }
+            self._evict()
+            self._write_index()
+        return key in self._index
+
+    def _load(self, key):
+        with pa.memory_map(self._path(key), 'r') as source:
+            arrow_table = pa.ipc.open_file(source).read_all()
+            return arrow_table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def get_key(self, key, owner=None):
+        # A hit records the reader as an owner, so the entry is restored for
+        # it at its next session start.
+        with self._locked():
+            entry = self._index.get(key)
+            if entry is None or self._expired(entry, time.time()):
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+            if owner is not None and owner not in entry.setdefault('owners', []):
+                entry['owners'].append(owner)
+            self._write_index()
+        try:
+            df = self._load(key)
+        except (OSError, pa.ArrowInvalid):
+            with self._locked():
+                self._drop(key)
+                self._write_index()
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return df
+
+    def get(self, connection, table, schema, owner=None):
+        return self.get_key(self.key(connection, table, schema), owner)
+
+    def entries(self, owner=None):
+        with self._lock:
+            self._reload()
+            now = time.time()
+            if owner is not None:
+                return {
+                    key: dict(entry) for key, entry in self._index.items()
+                    if owner in entry.get('owners', []) and not self._expired(entry, now)
+                }
+            return {key: dict(entry) for key, entry in self._index.items() if not self._expired(entry, now)}
+
+    def configure(self, max_bytes=None, ttl_seconds=None):
+        with self._locked():
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            self._evict()
+            self._write_index()
+
+    def clear(self, keys=None):
+        with self._locked():
+            for key in list(self._index if keys is None else keys):
+                self._drop(key)
+            self._write_index()
+
+    def stats(self):
+        with self._lock:
+            self._reload()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._index),
+                'bytes': sum(entry['bytes'] for entry in self._index.values()),
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ColumnarCache()
+        return _cache
@@ -0,0 +1,419 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import itertools
+import uuid
+import weakref
+from collections.abc import MutableMapping
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+from pandas.api.types import union_categoricals
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get('COMPLIANCE_MEMORY_BUDGET_MB', '4096')) * 1024 ** 2
+DEFAULT_SPILL_DIR = os.environ.get('COMPLIANCE_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'compliance-spill'))
+CATEGORY_RATIO = 0.5
+SHARE_DATASETS = os.environ.get('COMPLIANCE_SHARE_DATASETS', '1') != '0'
+
+_versions = itertools.count(1)
+_discard_hooks = []
+
+
+def add_discard_hook(hook):
+    if hook not in _discard_hooks:
+        _discard_hooks.append(hook)
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def fingerprint(df):
+    # Content hash computed one column at a time, so it never holds more than
+    # one uint64 per row on top of the frame itself.
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+    for position in range(df.shape[1]):
+        digest.update(pd.util.hash_pandas_object(df.iloc[:, position], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+
+
+def is_decimal(series):
+    # MySQL DECIMAL columns load as objects holding Decimal values.
+    if series.dtype != object or series.empty:
+        return False
+    valid = series.notna().to_numpy()
+    return bool(valid.any()) and isinstance(series.iat[int(valid.argmax())], Decimal)
+
+
+def _compact_float(series):
+    narrow = series.astype('float32')
+    same = (narrow.astype('float64') == series) | (series.isna() & narrow.isna())
+    return narrow if bool(same.all()) else series
+
+
+def _compact_int(series):
+    # Never narrower than 32 bits, and calculated columns widen back to 64
+    # bits before computing: int32 arithmetic wraps around silently just
+    # like int8 (100 * 3 is 44 in int8). Aggregations already sum in 64 bits.
+    nullable = isinstance(series.dtype, pd.api.extensions.ExtensionDtype)
+    target = 'Int32' if nullable else 'int32'
+    if series.dtype.itemsize < 4:
+        return series.astype(target)
+    if series.dtype.itemsize > 4:
+        low, high = series.min(), series.max()
+        if pd.isna(low) or (np.iinfo(np.int32).min <= low and high <= np.iinfo(np.int32).max):
+            return series.astype(target)
+    return series
+
+
+def compact_column(series, category_ratio=CATEGORY_RATIO):
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.empty:
+        return series
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return _compact_int(series)
+    if pd.api.types.is_float_dtype(series.dtype):
+        if series.dtype == np.float64:
+            return _compact_float(series)
+        return series
+    if _is_text(series):
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) != 'string':
+            return series
+        if series.nunique(dropna=True) <= max(1, len(series) * category_ratio):
+            return series.astype('category')
+        if series.dtype == object:
+            return series.map(lambda v: sys.intern(v) if isinstance(v, str) else v)
+    return series
+
+
+def compact_frame(df, category_ratio=CATEGORY_RATIO):
+    return pd.DataFrame(
+        {name: compact_column(df[name], category_ratio) for name in df.columns},
+        index=df.index
+    )
+
+
+def concat_frames(parts):
+    non_empty = [part for part in parts if not part.empty]
+    if not non_empty:
+        return parts[0].iloc[:0].reset_index(drop=True) if parts else pd.DataFrame()
+    parts = non_empty
+    if len(parts) == 1:
+        return parts[0].reset_index(drop=True)
+    data = {}
+    for column in parts[0].columns:
+        series = [part[column] for part in parts if column in part.columns]
+        if all(isinstance(s.dtype, pd.CategoricalDtype) for s in series):
+            data[column] = pd.Series(union_categoricals(series, ignore_order=True))
+        else:
+            data[column] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(data)
+
+
+def _write_spill(df, path):
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return 'arrow'
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        with open(path, 'wb') as fh:
+            pickle.dump(df, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        return 'pickle'
+
+
+def _read_spill(path, fmt):
+    if fmt == 'pickle':
+        with open(path, 'rb') as fh:
+            return pickle.load(fh)
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class _Entry:
+    def __init__(self, name, df, bytes_before, bytes_after):
+        self.name = name
+        self.df = df
+        self.version = next(_versions)
+        self.rows = len(df)
+        self.bytes_before = bytes_before
+        self.bytes_after = bytes_after
+        self.last_access = time.monotonic()
+        self.spill_path = None
+        self.spill_format = None
+        self.spills = 0
+        self.reloads = 0
+        self.refs = 0
+        self.key = None
+        self._finalizer = None
+
+    def spill(self, spill_dir):
+        if self.df is None:
+            return
+        if self.spill_path is None:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_path = os.path.join(spill_dir, f"{uuid.uuid4().hex}.spill")
+            self.spill_format = _write_spill(self.df, self.spill_path)
+            self._finalizer = weakref.finalize(self, _remove, self.spill_path)
+        self.df = None
+        self.spills += 1
+
+    def load(self):
+        if self.df is None:
+            self.df = _read_spill(self.spill_path, self.spill_format)
+            self.reloads += 1
+        self.last_access = time.monotonic()
+        return self.df
+
+    def discard(self):
+        if self._finalizer is not None:
+            self._finalizer()
+        self.df = None
+        for hook in _discard_hooks:
+            hook(self.version)
+
+
+class MemoryBudget:
+    def __init__(self, limit_bytes=DEFAULT_BUDGET_BYTES, spill_dir=DEFAULT_SPILL_DIR):
+        self.limit_bytes = limit_bytes
+        self.spill_dir = spill_dir
+        self._entries = weakref.WeakSet()
+        self._lock = threading.RLock()
+
+    def track(self, entry):
+        with self._lock:
+            self._entries.add(entry)
+            self.enforce(keep=entry)
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(entry.bytes_after for entry in self._entries if entry.df is not None)
+
+    def enforce(self, keep=None):
+        with self._lock:
+            resident = [entry for entry in self._entries if entry.df is not None]
+            total = sum(entry.bytes_after for entry in resident)
+            for entry in sorted(resident, key=lambda e: e.last_access):
+                if total <= self.limit_bytes:
+                    break
+                if entry is keep:
+                    continue
+                entry.spill(self.spill_dir)
+                total -= entry.bytes_after
+
+    def configure(self, limit_bytes):
+        with self._lock:
+            self.limit_bytes = limit_bytes
+            self.enforce()
+
+    def sources(self):
+        # Process-wide view: the same source name loaded by several sessions
+        # is reported once with its copies added up.
+        with self._lock:
+            totals = {}
+            for entry in list(self._entries):
+                source = totals.setdefault(entry.name, {
+                    'source': entry.name, 'rows': 0, 'resident_bytes': 0, 'spilled_bytes': 0, 'copies': 0,
+                    'sessions': 0
+                })
+                source['rows'] += entry.rows
+                source['resident_bytes' if entry.df is not None else 'spilled_bytes'] += entry.bytes_after
+                source['copies'] += 1
+                source['sessions'] += max(entry.refs, 1)
+            return sorted(totals.values(), key=lambda s: s['resident_bytes'] + s['spilled_bytes'], reverse=True)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries)
+            return {
+                'limit_bytes': self.limit_bytes,
+                'resident_bytes': sum(e.bytes_after for e in entries if e.df is not None),
+                'spilled_bytes': sum(e.bytes_after for e in entries if e.df is None),
+                'sources': len(entries)
+            }
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget():
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget()
+        return _budget
+
+
+class DatasetRegistry:
+    # Process-wide table of loaded datasets keyed by (source name, content
+    # fingerprint). Sessions that load the same data share one entry, and
+    # with it its version, so every version-keyed cache is shared as well.
+    # The entry is discarded when the last session releases it.
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, df, build):
+        key = (name, fingerprint(df))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs += 1
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Built outside the lock, since compaction of a large frame is slow;
+        # a concurrent load of the same data keeps whichever entry won.
+        built = build(df)
+        with self._lock:
+            entry = self._entries.setdefault(key, built)
+            entry.key = key
+            entry.refs += 1
+        if entry is not built:
+            built.discard()
+        return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+        entry.discard()
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            return {
+                'datasets': len(entries),
+                'references': sum(entry.refs for entry in entries),
+                'bytes': sum(entry.bytes_after for entry in entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DatasetRegistry()
+        return _registry
+
+
+def _release_all(registry, entries):
+    for entry in list(entries.values()):
+        registry.release(entry)
+    entries.clear()
+
+
+class DataSourceStore(MutableMapping):
+    def __init__(self, budget=None, compact=True, shared=SHARE_DATASETS):
+        self._budget = budget or get_budget()
+        self._compact = compact
+        self._registry = get_registry() if shared else None
+        self._entries = {}
+        if self._registry is not None:
+            # Session state is dropped when a browser session ends; its
+            # references go with it.
+            weakref.finalize(self, _release_all, self._registry, self._entries)
+
+    def _build(self, name, df):
+        before = memory_bytes(df)
+        if self._compact:
+            df = compact_frame(df)
+        entry = _Entry(name, df, before, memory_bytes(df) if self._compact else before)
+        self._budget.track(entry)
+        return entry
+
+    def _release(self, entry):
+        if self._registry is None:
+            entry.discard()
+        else:
+            self._registry.release(entry)
+
+    def __setitem__(self, name, df):
+        if self._registry is None:
+            entry = self._build(name, df)
+        else:
+            entry = self._registry.acquire(name, df, lambda frame: self._build(name, frame))
+        old = self._entries.pop(name, None)
+        self._entries[name] = entry
+        if old is not None:
+            self._release(old)
+
+    def __getitem__(self, name):
+        entry = self._entries[name]
+        with self._budget._lock:
+            df = entry.load()
+        self._budget.enforce(keep=entry)
+        if self._registry is None:
+            return df
+        # A shallow copy shares the column buffers; under copy-on-write any
+        # in-place change a session makes copies only what it touches, so
+        # the shared frame is never modified.
+        return df.copy(deep=False)
+
+    def __delitem__(self, name):
+        self._release(self._entries.pop(name))
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def version(self, name):
+        return self._entries[name].version
+
+    def is_resident(self, name):
+        return self._entries[name].df is not None
+
+    def report(self):
+        return [
+            {
+                'Fonte': entry.name,
+                'Registros': entry.rows,
+                'Antes (MB)': round(entry.bytes_before / 1024 ** 2, 2),
+                'Depois (MB)': round(entry.bytes_after / 1024 ** 2, 2),
+                'Redução': f"{1 - entry.bytes_after / entry.bytes_before:.0%}" if entry.bytes_before else "0%",
+                'Em memória': entry.df is not None,
+                'Despejos': entry.spills,
+                'Recargas': entry.reloads,
+                'Sessões': max(entry.refs, 1)
+            }
+            for entry in self._entries.values()
+        ]
@@ -0,0 +1,214 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolExhaustedError(Error):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, host, port, user, password, database, max_size=8, idle_timeout=300,
+                 checkout_timeout=30, health_check_after=5):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.database = database
+        self._password = password
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_s': 0.0,
+            'timeouts': 0,
+            'handshakes': 0,
+            'handshakes_saved': 0,
+            'health_check_failures': 0,
+            'idle_evictions': 0,
+            'peak_in_use': 0,
+        }
+
+    def _connect(self):
+        connection = mysql.connector.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self._password,
+            database=self.database,
+            autocommit=True
+        )
+        with self._cond:
+            self._stats['handshakes'] += 1
+        return connection
+
+    def _healthy(self, connection, last_used):
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        keep = []
+        for connection, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                self._stats['idle_evictions'] += 1
+                _close_quietly(connection)
+            else:
+                keep.append((connection, last_used))
+        self._idle = keep
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited_since = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError(msg="Pool de conexões encerrado")
+                self._evict_idle()
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    connection, last_used = None, None
+                    self._in_use += 1
+                    break
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['wait_time_s'] += time.monotonic() - waited_since
+                    raise PoolExhaustedError(
+                        msg=f"Nenhuma conexão disponível após {self.checkout_timeout}s "
+                            f"(limite de {self.max_size} conexões)"
+                    )
+                self._cond.wait(remaining)
+            if waited_since is not None:
+                self._stats['wait_time_s'] += time.monotonic() - waited_since
+            self._stats['checkouts'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._in_use)
+        # Health checks and handshakes happen outside the lock so a slow
+        # server does not serialize every other checkout behind it.
+        try:
+            if connection is not None and self._healthy(connection, last_used):
+                with self._cond:
+                    self._stats['handshakes_saved'] += 1
+                return connection
+            if connection is not None:
+                _close_quietly(connection)
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection, discard=False):
+        if not discard:
+            try:
+                if connection.unread_result:
+                    connection.consume_results()
+                if connection.in_transaction:
+                    connection.rollback()
+            except Error:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                _close_quietly(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        except Error:
+            self.release(connection, discard=True)
+            raise
+        except BaseException:
+            self.release(connection)
+            raise
+        else:
+            self.release(connection)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for connection, _ in self._idle:
+                _close_quietly(connection)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._evict_idle()
+            return {
+                'host': self.host,
+                'port': self.port,
+                'user': self.user,
+                'database': self.database,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                **self._stats,
+            }
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Error:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, port, user, password, database, **options):
+    # The password digest is part of the key so a session with different
+    # credentials never receives a connection authenticated by another one.
+    secret = hashlib.sha256((password or '').encode('utf-8')).hexdigest()
+    key = (host, int(port), user, database, secret)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(host, port, user, password, database, **options)
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_POINT_BUDGET = 5000
+DEFAULT_WEBGL_THRESHOLD = 10000
+METHODS = {"LTTB": 'lttb', "Mín/Máx por intervalo": 'minmax'}
+
+
+def _numeric_axis(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dtype, 'tz', None) is not None:
+            series = series.dt.tz_localize(None)
+        values = series.to_numpy().view('int64').astype('float64')
+        # NaT is stored as the smallest int64 and would stretch the axis.
+        values[series.isna().to_numpy()] = np.nan
+        return values
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return series.to_numpy(dtype='float64', na_value=np.nan)
+    return None
+
+
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # Largest-Triangle-Three-Buckets: the first and last points are kept and
+    # every bucket in between contributes the point that forms the largest
+    # triangle with the previous pick and the next bucket's centroid.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        if next_stop <= next_start:
+            next_stop = next_start + 1
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - avg_x) * (y[start:stop] - py) - (px - x[start:stop]) * (avg_y - py))
+        previous = start + int(np.argmax(areas)) if stop > start else start
+        selected[bucket + 1] = previous
+    return np.unique(selected)
+
+
+def minmax_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+    buckets = threshold // 2
+    starts = np.arange(buckets) * n // buckets
+    counts = np.diff(np.append(starts, n))
+    bucket = np.repeat(np.arange(buckets), counts)
+    picks = [[0, n - 1]]
+    for reduce in (np.minimum, np.maximum):
+        extreme = np.repeat(reduce.reduceat(y, starts), counts)
+        hits = np.flatnonzero(y == extreme)
+        _, first = np.unique(bucket[hits], return_index=True)
+        picks.append(hits[first])
+    return np.unique(np.concatenate(picks))
+
+
+def downsample(df, x, y, budget=DEFAULT_POINT_BUDGET, method='lttb'):
+    total = len(df)
+    if total <= budget:
+        return df, total
+    y_values = _numeric_axis(df[y])
+    if y_values is None:
+        return df, total
+    x_values = _numeric_axis(df[x])
+    frame = df
+    if x_values is None:
+        x_values = np.arange(total, dtype='float64')
+    elif np.any(np.diff(x_values) < 0):
+        order = np.argsort(x_values, kind='stable')
+        frame = df.iloc[order]
+        x_values = x_values[order]
+        y_values = y_values[order]
+    valid = ~(np.isnan(x_values) | np.isnan(y_values))
+    if not valid.all():
+        frame = frame[valid]
+        x_values = x_values[valid]
+        y_values = y_values[valid]
+    pick = lttb_indices if method == 'lttb' else minmax_indices
+    return frame.iloc[pick(x_values, y_values, budget)], total
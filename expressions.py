@@ -0,0 +1,88 @@
+import ast
+import operator
+import re
+
+import pandas as pd
+
+from data_store import is_decimal
+
+BINARY = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+UNARY = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+COMPARE = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+           ast.Gt: operator.gt, ast.GtE: operator.ge}
+_BACKTICK = re.compile(r"`([^`]*)`")
+
+
+def _check(node):
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY:
+        _check(node.left)
+        _check(node.right)
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY:
+        _check(node.operand)
+    elif isinstance(node, ast.Compare) and all(type(op) in COMPARE for op in node.ops):
+        _check(node.left)
+        for comparator in node.comparators:
+            _check(comparator)
+    elif isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        pass
+    elif not isinstance(node, ast.Name):
+        raise ValueError(f"Expressão não permitida: {ast.unparse(node)}")
+
+
+def parse_expression(expression):
+    # Calculated columns accept column names (`between backticks` when they
+    # are not identifiers), numeric literals and arithmetic or comparison
+    # operators only: no attributes, calls or @variables.
+    names = {}
+
+    def placeholder(match):
+        token = f"__coluna_{len(names)}__"
+        names[token] = match.group(1)
+        return token
+
+    try:
+        tree = ast.parse(_BACKTICK.sub(placeholder, str(expression)), mode='eval')
+    except SyntaxError:
+        raise ValueError(f"Expressão inválida: {expression}")
+    _check(tree.body)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            node.id = names.get(node.id, node.id)
+    return tree.body
+
+
+def _evaluate(node, df):
+    if isinstance(node, ast.BinOp):
+        return BINARY[type(node.op)](_evaluate(node.left, df), _evaluate(node.right, df))
+    if isinstance(node, ast.UnaryOp):
+        return UNARY[type(node.op)](_evaluate(node.operand, df))
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, df)
+        result = None
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, df)
+            step = COMPARE[type(op)](left, right)
+            result = step if result is None else result & step
+            left = right
+        return result
+    if isinstance(node, ast.Constant):
+        return node.value
+    if node.id not in df.columns:
+        raise ValueError(f"Coluna desconhecida: {node.id}")
+    series = df[node.id]
+    if is_decimal(series):
+        # Decimal objects do not mix with float literals.
+        return series.astype('float64')
+    if pd.api.types.is_integer_dtype(series.dtype) and series.dtype.itemsize < 8:
+        # Compaction stores integers in 32 bits; calculated columns compute
+        # in 64, as MySQL does, so products do not wrap around.
+        nullable = isinstance(series.dtype, pd.api.extensions.ExtensionDtype)
+        return series.astype('Int64' if nullable else 'int64')
+    return series
+
+
+def evaluate(expression, df):
+    result = _evaluate(parse_expression(expression), df)
+    if not isinstance(result, pd.Series):
+        result = pd.Series(result, index=df.index)
+    return result
@@ -0,0 +1,173 @@
+import hashlib
+import io
+import json
+import os
+import zipfile
+
+import pandas as pd
+
+from data_store import CATEGORY_RATIO, concat_frames
+
+DEFAULT_CHUNK_ROWS = 100000
+SAMPLE_ROWS = 10000
+HASH_BLOCK = 8 * 1024 ** 2
+
+EXTENSION_FORMATS = {
+    '.xlsx': 'xlsx',
+    '.xlsm': 'xlsx',
+    '.xls': 'xls',
+    '.csv': 'csv',
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+MIME_FORMATS = {
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'xlsx',
+    'application/vnd.ms-excel': 'xls',
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/json': 'json',
+    'text/json': 'json',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+
+
+def content_digest(buffer):
+    view = buffer.getbuffer() if hasattr(buffer, 'getbuffer') else memoryview(buffer)
+    digest = hashlib.blake2b(digest_size=20)
+    for start in range(0, len(view), HASH_BLOCK):
+        digest.update(view[start:start + HASH_BLOCK])
+    return digest.hexdigest()
+
+
+def detect_format(name, mime=None):
+    extension = os.path.splitext(name or '')[1].lower()
+    if extension in EXTENSION_FORMATS:
+        return EXTENSION_FORMATS[extension]
+    return MIME_FORMATS.get(mime)
+
+
+def _sample_dtypes(sample):
+    dtypes = {}
+    for column in sample.columns:
+        series = sample[column]
+        if pd.api.types.is_integer_dtype(series.dtype):
+            # Later chunks may contain blanks the sample did not see.
+            dtypes[column] = 'Int64'
+        elif pd.api.types.is_float_dtype(series.dtype):
+            dtypes[column] = 'float64'
+        elif pd.api.types.is_bool_dtype(series.dtype):
+            dtypes[column] = 'boolean'
+        elif series.nunique(dropna=True) <= max(1, len(series) * CATEGORY_RATIO):
+            dtypes[column] = 'category'
+        else:
+            dtypes[column] = 'object'
+    return dtypes
+
+
+def read_csv_chunked(buffer, chunk_rows=DEFAULT_CHUNK_ROWS):
+    buffer.seek(0)
+    dtypes = _sample_dtypes(pd.read_csv(buffer, nrows=SAMPLE_ROWS))
+    buffer.seek(0)
+    try:
+        return concat_frames(list(pd.read_csv(buffer, dtype=dtypes, chunksize=chunk_rows)))
+    except (ValueError, TypeError):
+        # A later chunk contradicted the sampled types; fall back to
+        # pandas' own per-chunk inference for this file.
+        buffer.seek(0)
+        return concat_frames(list(pd.read_csv(buffer, chunksize=chunk_rows)))
+
+
+def read_xlsx_streaming(buffer, chunk_rows=DEFAULT_CHUNK_ROWS):
+    import openpyxl
+
+    buffer.seek(0)
+    workbook = openpyxl.load_workbook(buffer, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [str(c) if c is not None else f"coluna_{idx + 1}" for idx, c in enumerate(header)]
+        parts = []
+        batch = []
+        for row in rows:
+            batch.append(row[:len(columns)])
+            if len(batch) >= chunk_rows:
+                parts.append(_frame_from_rows(batch, columns))
+                batch = []
+        if batch or not parts:
+            parts.append(_frame_from_rows(batch, columns))
+        return concat_frames(parts)
+    finally:
+        workbook.close()
+
+
+def _frame_from_rows(rows, columns):
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    return df.infer_objects()
+
+
+def _looks_like_json_lines(buffer):
+    buffer.seek(0)
+    head = buffer.read(64 * 1024).lstrip()
+    buffer.seek(0)
+    if not head.startswith(b'{'):
+        return False
+    first_line = head.split(b'\n', 1)[0].strip()
+    try:
+        json.loads(first_line)
+    except ValueError:
+        return False
+    return b'\n' in head.strip()
+
+
+def read_json_lines(buffer, chunk_rows=DEFAULT_CHUNK_ROWS):
+    buffer.seek(0)
+    text = io.TextIOWrapper(buffer, encoding='utf-8')
+    try:
+        return concat_frames(list(pd.read_json(text, lines=True, chunksize=chunk_rows)))
+    finally:
+        text.detach()
+
+
+def _reader_errors():
+    # Corrupt or mislabelled workbooks fail inside the reader libraries with
+    # their own exception types; only evaluated once something was raised.
+    errors = [zipfile.BadZipFile, EOFError, KeyError]
+    try:
+        from openpyxl.utils.exceptions import InvalidFileException
+        errors.append(InvalidFileException)
+    except ImportError:
+        pass
+    try:
+        from xlrd import XLRDError
+        errors.append(XLRDError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def read_upload(buffer, name, mime=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    fmt = detect_format(name, mime)
+    if fmt is None:
+        raise ValueError(f"Formato não suportado: {name} ({mime})")
+    try:
+        return _read_format(buffer, fmt, chunk_rows)
+    except _reader_errors() as e:
+        raise ValueError(f"Arquivo ilegível como {fmt}: {e}") from e
+
+
+def _read_format(buffer, fmt, chunk_rows):
+    if fmt == 'xlsx':
+        return read_xlsx_streaming(buffer, chunk_rows)
+    if fmt == 'xls':
+        buffer.seek(0)
+        return pd.read_excel(buffer, engine='xlrd')
+    if fmt == 'csv':
+        return read_csv_chunked(buffer, chunk_rows)
+    if fmt == 'jsonl' or (fmt == 'json' and _looks_like_json_lines(buffer)):
+        return read_json_lines(buffer, chunk_rows)
+    buffer.seek(0)
+    return pd.read_json(buffer)
@@ -0,0 +1,135 @@
+import time
+
+import pandas as pd
+
+from data_store import concat_frames
+from mysql_stream import quote_identifier
+
+WATERMARK_CANDIDATES = ('updated_at', 'modified_at', 'data_atualizacao', 'atualizado_em', 'id')
+
+
+def new_refresh_state(table, watermark_column, primary_key=None, count_check_every=10, columns=None, where=None):
+    return {
+        'table': table,
+        'columns': list(columns or []),
+        'where': where,
+        'watermark_column': watermark_column,
+        'primary_key': list(primary_key or []),
+        'count_check_every': max(1, int(count_check_every)),
+        'last_watermark': None,
+        'refreshes': 0,
+        'history': []
+    }
+
+
+def suggest_watermark(columns):
+    lowered = {str(c).lower(): c for c in columns}
+    for candidate in WATERMARK_CANDIDATES:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def watermark_of(df, column):
+    if df is None or df.empty or column not in df.columns:
+        return None
+    value = df[column].max()
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value.item() if hasattr(value, 'item') else value
+
+
+def watermark_predicate(state):
+    if state['last_watermark'] is None:
+        return None, None
+    # With a primary key, rows sharing the last watermark value are fetched
+    # again and deduplicated by the upsert; without one they would duplicate.
+    operator = '>=' if state['primary_key'] else '>'
+    return f"{quote_identifier(state['watermark_column'])} {operator} %s", (state['last_watermark'],)
+
+
+def scoped_predicate(state, where=None, params=None):
+    # Deltas, counts and key checks stay within the columns and WHERE
+    # clause the source was loaded with. That clause was written without
+    # placeholders, so its "%" are escaped when params are sent along.
+    base = state.get('where')
+    if base and params:
+        base = base.replace('%', '%%')
+    clauses = [f"({clause})" for clause in (base, where) if clause]
+    return " AND ".join(clauses) or None
+
+
+def _conform(delta, base):
+    for column in delta.columns.intersection(base.columns):
+        target = base[column].dtype
+        if delta[column].dtype == target:
+            continue
+        if isinstance(target, pd.CategoricalDtype) or isinstance(delta[column].dtype, pd.CategoricalDtype):
+            continue
+        try:
+            delta[column] = delta[column].astype(target)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return delta
+
+
+def _key_index(df, primary_key):
+    if len(primary_key) == 1:
+        return pd.Index(df[primary_key[0]])
+    return pd.MultiIndex.from_frame(df[primary_key])
+
+
+def upsert(base, delta, primary_key=None):
+    if delta is None or delta.empty:
+        return base
+    delta = _conform(delta.copy(), base)
+    if not primary_key:
+        return concat_frames([base, delta])
+    delta = delta.drop_duplicates(subset=primary_key, keep='last')
+    stale = _key_index(base, primary_key).isin(_key_index(delta, primary_key))
+    return concat_frames([base[~stale], delta])
+
+
+def drop_missing(base, keys, primary_key):
+    present = _key_index(base, primary_key).isin(_key_index(keys, primary_key))
+    return base[present].reset_index(drop=True)
+
+
+def refresh(df, state, fetch, count_rows, fetch_keys):
+    started = time.perf_counter()
+    where, params = watermark_predicate(state)
+    primary_key = state['primary_key']
+    deleted = 0
+    if where is None or df is None:
+        merged = fetch(None, None)
+        fetched = len(merged)
+        mode = 'completa'
+    else:
+        delta = fetch(where, params)
+        fetched = len(delta)
+        merged = upsert(df, delta, primary_key)
+        mode = 'incremental'
+    state['refreshes'] += 1
+    if mode == 'incremental' and state['refreshes'] % state['count_check_every'] == 0:
+        remote = count_rows()
+        if primary_key and remote < len(merged):
+            before = len(merged)
+            merged = drop_missing(merged, fetch_keys(primary_key), primary_key)
+            deleted = before - len(merged)
+        if remote != len(merged):
+            merged = fetch(None, None)
+            fetched = len(merged)
+            mode = 'completa (contagem divergente)'
+    state['last_watermark'] = watermark_of(merged, state['watermark_column'])
+    report = {
+        'modo': mode,
+        'linhas_buscadas': fetched,
+        'linhas_removidas': deleted,
+        'total': len(merged),
+        'segundos': round(time.perf_counter() - started, 3),
+        'watermark': state['last_watermark']
+    }
+    state['history'] = (state['history'] + [report])[-20:]
+    return merged, report
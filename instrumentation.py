@@ -0,0 +1,202 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from data_store import get_budget
+
+DEFAULT_WINDOW = int(os.environ.get('COMPLIANCE_METRICS_WINDOW', '500'))
+METRICS_FILE = os.environ.get('COMPLIANCE_METRICS_FILE')
+QUANTILES = (0.5, 0.95)
+KINDS = {'render': "Renderização", 'compute': "Cálculo", 'load': "Carga de dados", 'report': "Relatório",
+         'run': "Execução completa"}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def process_rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            with open('/proc/self/statm') as fh:
+                return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return None
+
+
+class _Series:
+    def __init__(self, kind, window):
+        self.kind = kind
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+
+class Metrics:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._series = {}
+        self._runs = deque(maxlen=window)
+        self._lock = threading.Lock()
+        # Each Streamlit session reruns its script on its own thread, so the
+        # timings of the run in progress are kept per thread.
+        self._local = threading.local()
+
+    def record(self, name, kind, seconds):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series(kind, self.window)
+            series.add(seconds)
+        run = getattr(self._local, 'run', None)
+        if run is not None:
+            run['timings'][name] = run['timings'].get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name, kind='render'):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, kind, time.perf_counter() - started)
+
+    def begin_run(self):
+        self._local.run = {'started': time.time(), 'clock': time.perf_counter(), 'timings': {}}
+
+    def end_run(self):
+        run = getattr(self._local, 'run', None)
+        if run is None:
+            return None
+        self._local.run = None
+        seconds = time.perf_counter() - run.pop('clock')
+        self.record('rerun', 'run', seconds)
+        run['seconds'] = seconds
+        with self._lock:
+            self._runs.append(run)
+        if METRICS_FILE:
+            self.write(METRICS_FILE)
+        return run
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._runs.clear()
+            self.started = time.time()
+
+    def summary(self):
+        with self._lock:
+            items = [(name, series.kind, series.count, series.total, series.last, list(series.samples))
+                     for name, series in self._series.items()]
+        rows = []
+        for name, kind, count, total, last, samples in items:
+            p50, p95 = np.quantile(samples, QUANTILES)
+            rows.append({
+                'name': name,
+                'kind': kind,
+                'count': count,
+                'total_s': total,
+                'last_s': last,
+                'p50_s': float(p50),
+                'p95_s': float(p95),
+                'max_s': max(samples)
+            })
+        return sorted(rows, key=lambda row: row['p95_s'], reverse=True)
+
+    def runs(self):
+        with self._lock:
+            return list(self._runs)
+
+    def snapshot(self, sources=None):
+        return {
+            'started': self.started,
+            'generated': time.time(),
+            'window': self.window,
+            'timings': self.summary(),
+            'sources': sources if sources is not None else get_budget().sources(),
+            'process_rss_bytes': process_rss_bytes()
+        }
+
+    def to_json(self, sources=None):
+        return json.dumps(self.snapshot(sources), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, sources=None):
+        snapshot = self.snapshot(sources)
+        lines = [
+            "# HELP compliance_duration_seconds Duração de renderizações, cargas de dados e relatórios.",
+            "# TYPE compliance_duration_seconds summary"
+        ]
+        for row in snapshot['timings']:
+            labels = f'name="{_label(row["name"])}",kind="{row["kind"]}"'
+            for quantile, key in zip(QUANTILES, ('p50_s', 'p95_s')):
+                lines.append(f'compliance_duration_seconds{{{labels},quantile="{quantile}"}} {row[key]:.6f}')
+            lines.append(f'compliance_duration_seconds_sum{{{labels}}} {row["total_s"]:.6f}')
+            lines.append(f'compliance_duration_seconds_count{{{labels}}} {row["count"]}')
+        lines += [
+            "# HELP compliance_source_memory_bytes Memória das fontes de dados carregadas.",
+            "# TYPE compliance_source_memory_bytes gauge"
+        ]
+        for source in snapshot['sources']:
+            for state in ('resident', 'spilled'):
+                lines.append(
+                    f'compliance_source_memory_bytes{{source="{_label(source["source"])}",state="{state}"}} '
+                    f'{source[state + "_bytes"]}'
+                )
+        lines += ["# HELP compliance_source_rows Registros das fontes de dados carregadas.",
+                  "# TYPE compliance_source_rows gauge"]
+        for source in snapshot['sources']:
+            lines.append(f'compliance_source_rows{{source="{_label(source["source"])}"}} {source["rows"]}')
+        if snapshot['process_rss_bytes'] is not None:
+            lines += ["# HELP process_resident_memory_bytes Memória residente do processo.",
+                      "# TYPE process_resident_memory_bytes gauge",
+                      f"process_resident_memory_bytes {snapshot['process_rss_bytes']}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Written atomically so a textfile collector never reads half a dump.
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            fh.write(self.to_json() if path.endswith('.json') else self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def timed(name=None, kind='render'):
+    # Resolves the singleton at call time so module-level decorators do not
+    # create it on import.
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().timer(label, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
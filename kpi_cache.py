@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+from data_store import add_discard_hook
+
+DEFAULT_MAX_ENTRIES = 20000
+
+
+class KPIResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._by_version = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][1]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            self._by_version.setdefault(version, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (old_version, _) = self._entries.popitem(last=False)
+                self._forget(old_key, old_version)
+                self.evictions += 1
+
+    def _forget(self, key, version):
+        keys = self._by_version.get(version)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_version[version]
+
+    def invalidate_version(self, version):
+        with self._lock:
+            for key in self._by_version.pop(version, ()):
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_version.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_kpi_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KPIResultCache()
+            add_discard_hook(_cache.invalidate_version)
+        return _cache
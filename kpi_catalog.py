@@ -0,0 +1,320 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOLERANCE = 0.1
+HIGHER_IS_BETTER_TYPES = ('percentage', 'score')
+STATUS_NO_DATA = -1
+STATUS_WARNING = 0
+STATUS_OK = 1
+STATUS_ICONS = np.array(["⚪", "⚠️", "✅"], dtype=object)
+
+PILLAR_DEFINITIONS = {
+    "1. Suporte da Alta Administração": {
+        "icon": "👥",
+        "kpis": [
+            {"name": "Participação em Reuniões", "type": "percentage", "target": 95,
+             "source": "reunioes", "agg": "ratio", "numerator": ("presentes", "sum"),
+             "denominator": ("convocados", "sum"), "scale": 100, "date": "data", "window": "12m"},
+            {"name": "Orçamento Aprovado", "type": "currency", "target": 2500000,
+             "source": "orcamento", "agg": "sum", "column": "valor_aprovado", "date": "data", "window": "12m"},
+            {"name": "Tempo de Resposta", "type": "days", "target": 5,
+             "source": "demandas", "agg": "duration", "start": "data_abertura", "end": "data_resposta",
+             "unit": "days", "date": "data_abertura", "window": "12m"},
+            {"name": "Comunicações Oficiais", "type": "count", "target": 12, "direction": "higher",
+             "source": "comunicacoes", "agg": "count", "filters": {"tipo": "Oficial"}, "date": "data", "window": "12m"},
+            {"name": "Treinamentos Liderança", "type": "count", "target": 4, "direction": "higher",
+             "source": "treinamentos", "agg": "nunique", "column": "turma",
+             "filters": {"publico": "Liderança"}, "date": "data", "window": "12m"}
+        ]
+    },
+    "2. Avaliação de Riscos": {
+        "icon": "⚠️",
+        "kpis": [
+            {"name": "Riscos Identificados", "type": "count", "target": 100, "direction": "higher",
+             "source": "riscos", "agg": "count", "date": "data_identificacao", "window": "12m"},
+            {"name": "Riscos Críticos", "type": "count", "target": 10,
+             "source": "riscos", "agg": "count", "filters": {"nivel": "Crítico"},
+             "date": "data_identificacao", "window": "12m"},
+            {"name": "Tempo de Mitigação", "type": "days", "target": 30,
+             "source": "riscos", "agg": "duration", "start": "data_identificacao", "end": "data_mitigacao",
+             "unit": "days", "date": "data_identificacao", "window": "12m"},
+            {"name": "Cobertura de Avaliação", "type": "percentage", "target": 100,
+             "source": "riscos", "agg": "rate", "numerator_filters": {"avaliado": True}},
+            {"name": "Score de Risco", "type": "score", "target": 80,
+             "source": "riscos", "agg": "mean", "column": "score"}
+        ]
+    },
+    "3. Código de Conduta": {
+        "icon": "📜",
+        "kpis": [
+            {"name": "Taxa de Aceitação", "type": "percentage", "target": 100,
+             "source": "aceites_codigo", "agg": "rate", "numerator_filters": {"aceito": True}},
+            {"name": "Revisões Realizadas", "type": "count", "target": 1, "direction": "higher",
+             "source": "revisoes_codigo", "agg": "count", "date": "data", "window": "12m"},
+            {"name": "Violações Reportadas", "type": "count", "target": 0,
+             "source": "denuncias", "agg": "count", "filters": {"categoria": "Código de Conduta"},
+             "date": "data_recebimento", "window": "12m"},
+            {"name": "Tempo de Atualização", "type": "days", "target": 365,
+             "source": "revisoes_codigo", "agg": "days_since", "date": "data"},
+            {"name": "Índice de Compreensão", "type": "score", "target": 90,
+             "source": "aceites_codigo", "agg": "mean", "column": "nota_questionario"}
+        ]
+    },
+    "4. Controles Internos": {
+        "icon": "🔒",
+        "kpis": [
+            {"name": "Controles Implementados", "type": "percentage", "target": 95,
+             "source": "controles", "agg": "rate", "numerator_filters": {"implementado": True}},
+            {"name": "Taxa de Efetividade", "type": "percentage", "target": 90,
+             "source": "controles", "agg": "rate", "filters": {"implementado": True},
+             "numerator_filters": {"efetivo": True}},
+            {"name": "Deficiências Identificadas", "type": "count", "target": 5,
+             "source": "deficiencias", "agg": "count", "date": "data_identificacao", "window": "12m"},
+            {"name": "Tempo de Correção", "type": "days", "target": 15,
+             "source": "deficiencias", "agg": "duration", "start": "data_identificacao", "end": "data_correcao",
+             "unit": "days", "date": "data_identificacao", "window": "12m"},
+            {"name": "Automatização", "type": "percentage", "target": 70,
+             "source": "controles", "agg": "rate", "numerator_filters": {"automatizado": True}}
+        ]
+    },
+    "5. Treinamento e Comunicação": {
+        "icon": "🎓",
+        "kpis": [
+            {"name": "Horas per Capita", "type": "hours", "target": 8, "direction": "higher",
+             "source": "treinamentos", "agg": "ratio", "numerator": ("horas", "sum"),
+             "denominator": ("colaborador_id", "nunique"), "date": "data", "window": "12m"},
+            {"name": "Taxa de Participação", "type": "percentage", "target": 98,
+             "source": "treinamentos", "agg": "rate", "numerator_filters": {"concluido": True},
+             "date": "data", "window": "12m"},
+            {"name": "Score de Avaliação", "type": "score", "target": 85,
+             "source": "treinamentos", "agg": "mean", "column": "nota", "date": "data", "window": "12m"},
+            {"name": "Comunicações Enviadas", "type": "count", "target": 24, "direction": "higher",
+             "source": "comunicacoes", "agg": "count", "date": "data", "window": "12m"},
+            {"name": "Engajamento", "type": "percentage", "target": 80,
+             "source": "comunicacoes", "agg": "rate", "numerator_filters": {"aberta": True},
+             "date": "data", "window": "12m"}
+        ]
+    },
+    "6. Monitoramento e Auditoria": {
+        "icon": "🔍",
+        "kpis": [
+            {"name": "Cobertura de Auditoria", "type": "percentage", "target": 100,
+             "source": "auditorias", "agg": "rate", "numerator_filters": {"concluida": True},
+             "date": "data", "window": "12m"},
+            {"name": "Findings por Auditoria", "type": "count", "target": 10,
+             "source": "auditorias", "agg": "mean", "column": "findings", "date": "data", "window": "12m"},
+            {"name": "Tempo de Resolução", "type": "days", "target": 30,
+             "source": "achados", "agg": "duration", "start": "data_abertura", "end": "data_resolucao",
+             "unit": "days", "date": "data_abertura", "window": "12m"},
+            {"name": "Reincidências", "type": "count", "target": 0,
+             "source": "achados", "agg": "count", "filters": {"reincidente": True},
+             "date": "data_abertura", "window": "12m"},
+            {"name": "Score de Maturidade", "type": "score", "target": 85,
+             "source": "auditorias", "agg": "mean", "column": "score_maturidade", "date": "data", "window": "12m"}
+        ]
+    },
+    "7. Resposta a Violações": {
+        "icon": "⚡",
+        "kpis": [
+            {"name": "Tempo de Resposta", "type": "hours", "target": 24,
+             "source": "denuncias", "agg": "duration", "start": "data_recebimento",
+             "end": "data_primeira_resposta", "unit": "hours", "date": "data_recebimento", "window": "12m"},
+            {"name": "Taxa de Resolução", "type": "percentage", "target": 95,
+             "source": "denuncias", "agg": "rate", "numerator_filters": {"status": "Resolvida"},
+             "date": "data_recebimento", "window": "12m"},
+            {"name": "Severidade Média", "type": "score", "target": 30, "direction": "lower",
+             "source": "denuncias", "agg": "mean", "column": "severidade", "date": "data_recebimento", "window": "12m"},
+            {"name": "Ações Disciplinares", "type": "count", "target": 5,
+             "source": "denuncias", "agg": "count", "filters": {"acao_disciplinar": True},
+             "date": "data_recebimento", "window": "12m"},
+            {"name": "Lições Aprendidas", "type": "count", "target": 12, "direction": "higher",
+             "source": "denuncias", "agg": "count", "filters": {"licao_aprendida": True},
+             "date": "data_recebimento", "window": "12m"}
+        ]
+    },
+    "8. Melhoria Contínua": {
+        "icon": "📈",
+        "kpis": [
+            {"name": "Melhorias Implementadas", "type": "count", "target": 20, "direction": "higher",
+             "source": "melhorias", "agg": "count", "filters": {"status": "Implementada"},
+             "date": "data", "window": "12m"},
+            {"name": "ROI de Compliance", "type": "percentage", "target": 150,
+             "source": "melhorias", "agg": "ratio", "numerator": ("beneficio", "sum"),
+             "denominator": ("custo", "sum"), "scale": 100, "date": "data", "window": "12m"},
+            {"name": "Benchmarking Score", "type": "score", "target": 90,
+             "source": "benchmarking", "agg": "mean", "column": "score", "date": "data", "window": "12m"},
+            {"name": "Inovações Adotadas", "type": "count", "target": 5, "direction": "higher",
+             "source": "melhorias", "agg": "count", "filters": {"tipo": "Inovação", "status": "Implementada"},
+             "date": "data", "window": "12m"},
+            {"name": "Feedback Score", "type": "score", "target": 85,
+             "source": "pesquisas_feedback", "agg": "mean", "column": "nota", "date": "data", "window": "12m"}
+        ]
+    },
+    "9. Documentação e Evidências": {
+        "icon": "📄",
+        "kpis": [
+            {"name": "Documentos Atualizados", "type": "percentage", "target": 95,
+             "source": "documentos", "agg": "rate", "numerator_filters": {"atualizado": True}},
+            {"name": "Completude de Evidências", "type": "percentage", "target": 98,
+             "source": "documentos", "agg": "rate", "numerator_filters": {"evidencia_completa": True}},
+            {"name": "Tempo de Recuperação", "type": "minutes", "target": 30,
+             "source": "documentos", "agg": "mean", "column": "tempo_recuperacao_min"},
+            {"name": "Auditabilidade", "type": "percentage", "target": 100,
+             "source": "documentos", "agg": "rate", "numerator_filters": {"auditavel": True}},
+            {"name": "Digitalização", "type": "percentage", "target": 90,
+             "source": "documentos", "agg": "rate", "numerator_filters": {"digitalizado": True}}
+        ]
+    },
+    "10. Avaliação de Terceiros": {
+        "icon": "🤝",
+        "kpis": [
+            {"name": "Due Diligence", "type": "percentage", "target": 100,
+             "source": "terceiros", "agg": "rate", "numerator_filters": {"due_diligence": True}},
+            {"name": "Score de Risco", "type": "score", "target": 70,
+             "source": "terceiros", "agg": "mean", "column": "score_risco"},
+            {"name": "Contratos Conformes", "type": "percentage", "target": 95,
+             "source": "terceiros", "agg": "rate", "numerator_filters": {"contrato_conforme": True}},
+            {"name": "Monitoramento", "type": "percentage", "target": 90,
+             "source": "terceiros", "agg": "rate", "numerator_filters": {"monitorado": True}},
+            {"name": "Incidentes", "type": "count", "target": 0,
+             "source": "incidentes", "agg": "count", "filters": {"origem": "Terceiro"}, "date": "data", "window": "12m"}
+        ]
+    },
+    "11. LGPD e Privacidade": {
+        "icon": "🛡️",
+        "kpis": [
+            {"name": "Consentimentos", "type": "percentage", "target": 100,
+             "source": "consentimentos", "agg": "rate", "numerator_filters": {"consentido": True}},
+            {"name": "Solicitações Atendidas", "type": "percentage", "target": 95,
+             "source": "solicitacoes_titulares", "agg": "rate", "numerator_filters": {"atendida": True},
+             "date": "data_abertura", "window": "12m"},
+            {"name": "Tempo de Resposta", "type": "days", "target": 15,
+             "source": "solicitacoes_titulares", "agg": "duration", "start": "data_abertura",
+             "end": "data_resposta", "unit": "days", "date": "data_abertura", "window": "12m"},
+            {"name": "Incidentes", "type": "count", "target": 0,
+             "source": "incidentes", "agg": "count", "filters": {"categoria": "Privacidade"}, "date": "data", "window": "12m"},
+            {"name": "Mapeamento de Dados", "type": "percentage", "target": 100,
+             "source": "mapeamento_dados", "agg": "rate", "numerator_filters": {"mapeado": True}}
+        ]
+    }
+}
+
+
+def _frozen(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _frozen(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_frozen(v) for v in value)
+    return value
+
+
+def _readonly(values, dtype):
+    array = np.array(values, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+
+class KPICatalog:
+    def __init__(self, definitions):
+        pillars = {}
+        entries = []
+        for pillar, data in definitions.items():
+            kpis = []
+            for kpi in data['kpis']:
+                direction = kpi.get('direction') or ('higher' if kpi['type'] in HIGHER_IS_BETTER_TYPES else 'lower')
+                kpis.append(_frozen(dict(kpi, direction=direction, tolerance=kpi.get('tolerance', DEFAULT_TOLERANCE))))
+            pillars[pillar] = MappingProxyType({'icon': data['icon'], 'kpis': tuple(kpis)})
+            entries.extend((pillar, kpi) for kpi in kpis)
+        self.pillars = MappingProxyType(pillars)
+        self.entries = tuple(entries)
+        self.keys = pd.MultiIndex.from_tuples([(pillar, kpi['name']) for pillar, kpi in entries], names=['pillar', 'kpi'])
+        self.targets = _readonly([kpi['target'] for _, kpi in entries], 'float64')
+        self.higher_is_better = _readonly([kpi['direction'] == 'higher' for _, kpi in entries], bool)
+        self.tolerance = _readonly([kpi['tolerance'] for _, kpi in entries], 'float64')
+        # A KPI is on target when it is within the tolerance band on the
+        # favourable side: at least target * (1 - tol) when higher is better,
+        # at most target * (1 + tol) otherwise.
+        self.thresholds = _readonly(
+            np.where(self.higher_is_better, self.targets * (1 - self.tolerance), self.targets * (1 + self.tolerance)),
+            'float64'
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def positions(self, pillars, names):
+        return self.keys.get_indexer(pd.MultiIndex.from_arrays([np.asarray(pillars), np.asarray(names)]))
+
+    def evaluate(self, values, positions=None):
+        values = np.asarray(values, dtype='float64')
+        if positions is None:
+            # Values are laid out with the catalog on the last axis, e.g.
+            # (months, cost centers, KPIs), and thresholds broadcast over it.
+            if values.shape[-1] != len(self.entries):
+                raise ValueError(f"Esperado {len(self.entries)} KPIs no último eixo, recebido {values.shape[-1]}")
+            thresholds, higher = self.thresholds, self.higher_is_better
+        else:
+            positions = np.asarray(positions)
+            known = positions >= 0
+            safe = np.where(known, positions, 0)
+            thresholds = np.where(known, self.thresholds[safe], np.nan)
+            higher = self.higher_is_better[safe]
+        with np.errstate(invalid='ignore'):
+            on_target = np.where(higher, values >= thresholds, values <= thresholds)
+        codes = np.where(on_target, STATUS_OK, STATUS_WARNING).astype(np.int8)
+        codes[np.isnan(values) | np.isnan(thresholds)] = STATUS_NO_DATA
+        return codes
+
+    def evaluate_frame(self, results):
+        positions = self.positions(results['pillar'], results['kpi'])
+        return self.evaluate(results['value'].to_numpy(dtype='float64', na_value=np.nan), positions)
+
+    @staticmethod
+    def icons(codes):
+        return STATUS_ICONS[np.asarray(codes) + 1]
+
+    @staticmethod
+    def on_target_share(codes, axis=None):
+        codes = np.asarray(codes)
+        evaluated = np.count_nonzero(codes != STATUS_NO_DATA, axis=axis)
+        hits = np.count_nonzero(codes == STATUS_OK, axis=axis)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(evaluated > 0, hits / np.maximum(evaluated, 1), np.nan)
+
+
+def kpi_values(results, pillar_name):
+    rows = results[results['pillar'] == pillar_name]
+    return dict(zip(rows['kpi'], rows['value']))
+
+
+def kpi_statuses(results, pillar_name):
+    rows = results[results['pillar'] == pillar_name]
+    return dict(zip(rows['kpi'], rows['status']))
+
+
+def format_kpi_value(kpi, value):
+    if value is None or pd.isna(value):
+        return "—"
+    number = f"{value:,.0f}" if float(value).is_integer() else f"{value:,.1f}"
+    if kpi['type'] == 'percentage':
+        return f"{value:.1f}%"
+    elif kpi['type'] == 'currency':
+        return f"R$ {value/1000000:.1f}M"
+    elif kpi['type'] == 'days':
+        return f"{number} dias"
+    elif kpi['type'] == 'hours':
+        return f"{number}h"
+    elif kpi['type'] == 'minutes':
+        return f"{number} min"
+    elif kpi['type'] == 'count':
+        return number
+    return f"{value:.0f}/100"
+
+
+CATALOG = KPICatalog(PILLAR_DEFINITIONS)
@@ -0,0 +1,300 @@
+import os
+import re
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+UNIT_SECONDS = {'days': 86400.0, 'hours': 3600.0, 'minutes': 60.0}
+TRUE_VALUES = ('1', 'true', 't', 'sim', 's', 'yes', 'y', 'x')
+PERIOD_WINDOWS = {
+    "Último mês": '1m',
+    "Último trimestre": '3m',
+    "Último semestre": '6m',
+    "Último ano": '12m',
+}
+_WINDOW_PATTERN = re.compile(r'^(\d+)([dm])$')
+
+
+def normalize_source_name(name):
+    base = name.split(': ', 1)[-1]
+    return os.path.splitext(base)[0].strip().lower()
+
+
+def resolve_sources(data_sources, logical_sources, overrides=None):
+    overrides = overrides or {}
+    by_name = {normalize_source_name(name): name for name in data_sources}
+    resolved = {}
+    for logical in logical_sources:
+        name = overrides.get(logical) or by_name.get(logical)
+        if name in data_sources:
+            resolved[logical] = name
+    return resolved
+
+
+def window_start(window, as_of):
+    if not window:
+        return None
+    if window == 'ytd':
+        return pd.Timestamp(year=as_of.year, month=1, day=1)
+    match = _WINDOW_PATTERN.match(window)
+    if not match:
+        raise ValueError(f"Janela inválida: {window}")
+    amount, unit = int(match.group(1)), match.group(2)
+    if unit == 'd':
+        return as_of - pd.Timedelta(days=amount)
+    return as_of - pd.DateOffset(months=amount)
+
+
+def _truthy(series):
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return series.fillna(False).to_numpy(dtype=bool)
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return (series.fillna(0) != 0).to_numpy(dtype=bool)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.astype(str).str.strip().str.lower().isin(TRUE_VALUES)
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, categories[np.maximum(codes, 0)], False)
+    return series.astype('string').str.strip().str.lower().isin(TRUE_VALUES).fillna(False).to_numpy(dtype=bool)
+
+
+def _condition(series, value):
+    if isinstance(value, bool):
+        truthy = _truthy(series)
+        return truthy if value else ~truthy
+    if isinstance(value, (list, tuple, set)):
+        return series.isin(list(value)).to_numpy(dtype=bool)
+    if isinstance(value, Mapping):
+        mask = np.ones(len(series), dtype=bool)
+        for op, operand in value.items():
+            if op == 'in':
+                mask &= series.isin(list(operand)).to_numpy(dtype=bool)
+            elif op == 'notna':
+                mask &= series.notna().to_numpy() == bool(operand)
+            else:
+                compare = {'eq': series.__eq__, 'ne': series.__ne__, 'gt': series.__gt__,
+                           'gte': series.__ge__, 'lt': series.__lt__, 'lte': series.__le__}[op]
+                mask &= compare(operand).fillna(False).to_numpy(dtype=bool)
+        return mask
+    return (series == value).fillna(False).to_numpy(dtype=bool)
+
+
+def _freeze(value):
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def kpi_signature(kpi):
+    return _freeze(kpi)
+
+
+def required_columns(kpi):
+    columns = set((kpi.get('filters') or {}).keys()) | set((kpi.get('numerator_filters') or {}).keys())
+    for key in ('column', 'date', 'start', 'end'):
+        if kpi.get(key):
+            columns.add(kpi[key])
+    for key in ('numerator', 'denominator'):
+        if kpi.get(key):
+            columns.add(kpi[key][0])
+    return columns
+
+
+class _SourceScan:
+    def __init__(self, df, as_of):
+        self.df = df
+        self.as_of = as_of
+        self._cache = {}
+
+    def dates(self, column):
+        key = ('dates', column)
+        if key not in self._cache:
+            series = self.df[column]
+            if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+                series = pd.to_datetime(series, errors='coerce')
+            if getattr(series.dtype, 'tz', None) is not None:
+                series = series.dt.tz_localize(None)
+            self._cache[key] = series.to_numpy()
+        return self._cache[key]
+
+    def window(self, date, window):
+        key = ('window', date, window)
+        if key not in self._cache:
+            start = window_start(window, self.as_of)
+            dates = self.dates(date)
+            # Bounds are cast to the column's own unit so the comparison does
+            # not convert the whole column.
+            lower = np.datetime64(start.to_datetime64()).astype(dates.dtype)
+            upper = np.datetime64(self.as_of.to_datetime64()).astype(dates.dtype)
+            self._cache[key] = (dates >= lower) & (dates <= upper)
+        return self._cache[key]
+
+    def mask(self, filters=None, date=None, window=None):
+        key = ('mask', _freeze(filters or {}), date, window)
+        if key not in self._cache:
+            mask = None
+            for column, value in (filters or {}).items():
+                condition = self._condition(column, value)
+                mask = condition.copy() if mask is None else mask & condition
+            if date and window:
+                mask = self.window(date, window) if mask is None else mask & self.window(date, window)
+            self._cache[key] = np.ones(len(self.df), dtype=bool) if mask is None else mask
+        return self._cache[key]
+
+    def _condition(self, column, value):
+        key = ('condition', column, _freeze(value))
+        if key not in self._cache:
+            self._cache[key] = _condition(self.df[column], value)
+        return self._cache[key]
+
+    def numeric(self, column):
+        key = ('numeric', column)
+        if key not in self._cache:
+            series = self.df[column]
+            if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+                series = pd.to_numeric(series, errors='coerce')
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+            present = ~np.isnan(values)
+            # Reductions run on a zero-filled copy so sums can use dot
+            # products; `present` keeps track of the real missing values.
+            self._cache[key] = (np.where(present, values, 0.0), present)
+        return self._cache[key]
+
+    def elapsed(self, start, end, unit):
+        key = ('elapsed', start, end, unit)
+        if key not in self._cache:
+            begin = self.dates(start)
+            finish = self.dates(end)
+            if begin.dtype != finish.dtype:
+                begin = begin.astype(finish.dtype)
+            ticks = np.timedelta64(1, np.datetime_data(finish.dtype)[0]) / np.timedelta64(1, 's')
+            values = (finish.view('int64') - begin.view('int64')) * (ticks / UNIT_SECONDS[unit])
+            present = ~(np.isnat(begin) | np.isnat(finish))
+            values[~present] = 0.0
+            self._cache[key] = (values, present)
+        return self._cache[key]
+
+
+class _Reducer:
+    def __init__(self, keys=None):
+        if keys is None:
+            self.codes = None
+            self.labels = np.array([None], dtype=object)
+        else:
+            if isinstance(keys.dtype, pd.CategoricalDtype):
+                codes, labels = keys.cat.codes.to_numpy(), keys.cat.categories
+            else:
+                codes, labels = pd.factorize(keys.to_numpy(), use_na_sentinel=True)
+            self.labels = np.asarray(labels, dtype=object)
+            # Missing keys go to an extra trailing bucket that is dropped.
+            self.codes = np.where(codes < 0, len(self.labels), codes).astype(np.intp)
+        self.size = len(self.labels)
+
+    def count(self, mask):
+        if self.codes is None:
+            return np.array([np.count_nonzero(mask)], dtype='float64')
+        return np.bincount(self.codes, weights=mask, minlength=self.size + 1)[:self.size]
+
+    def sum(self, values, mask):
+        weights = mask.astype('float64')
+        if self.codes is None:
+            return np.array([np.dot(values, weights)], dtype='float64')
+        weights *= values
+        return np.bincount(self.codes, weights=weights, minlength=self.size + 1)[:self.size]
+
+    def mean(self, values, mask):
+        counts = self.count(mask)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, self.sum(values, mask) / counts, np.nan)
+
+    def reduce(self, values, mask, agg):
+        if isinstance(values, np.ndarray):
+            selected = pd.Series(values[mask])
+        else:
+            selected = values[mask].reset_index(drop=True)
+        if self.codes is None:
+            result = selected.agg(agg) if len(selected) else np.nan
+            return np.array([result], dtype=object)
+        reduced = selected.groupby(self.codes[mask]).agg(agg)
+        return reduced.reindex(range(self.size)).to_numpy(dtype=object)
+
+
+class KPIEngine:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.by_source = {}
+        for pillar, kpi in catalog:
+            if kpi.get('source'):
+                self.by_source.setdefault(kpi['source'], []).append((pillar, kpi))
+
+    @property
+    def sources(self):
+        return list(self.by_source)
+
+    def compute(self, frames, window=None, as_of=None, group_by=None):
+        as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        results = []
+        for source, specs in self.by_source.items():
+            df = frames.get(source)
+            if df is None:
+                continue
+            results.append(self._compute_source(df, specs, window, as_of, group_by))
+        if not results:
+            return pd.DataFrame(columns=['pillar', 'kpi', 'value'])
+        return pd.concat(results, ignore_index=True)
+
+    def _aggregate(self, scan, reducer, values_column, agg, mask):
+        if agg == 'count':
+            return reducer.count(mask)
+        if agg == 'nunique':
+            return reducer.reduce(scan.df[values_column], mask, 'nunique')
+        values, present = scan.numeric(values_column)
+        mask = mask & present
+        if agg in ('sum', 'mean'):
+            return getattr(reducer, agg)(values, mask)
+        return reducer.reduce(values, mask, agg)
+
+    def _compute_source(self, df, specs, window, as_of, group_by):
+        grouped = bool(group_by) and group_by in df.columns
+        scan = _SourceScan(df, as_of)
+        reducer = _Reducer(df[group_by] if grouped else None)
+        blocks = []
+        for pillar, kpi in specs:
+            if not required_columns(kpi) <= set(df.columns):
+                continue
+            kpi_window = (window or kpi['window']) if kpi.get('window') else None
+            base = scan.mask(kpi.get('filters'), kpi.get('date'), kpi_window)
+            agg = kpi['agg']
+            if agg in ('count', 'sum', 'mean', 'median', 'min', 'max', 'nunique'):
+                values = self._aggregate(scan, reducer, kpi.get('column'), agg, base)
+            elif agg == 'rate':
+                hits = scan.mask(kpi.get('numerator_filters'))
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = reducer.count(base & hits) / reducer.count(base) * 100
+            elif agg == 'ratio':
+                numerator = self._aggregate(scan, reducer, *kpi['numerator'], base).astype('float64')
+                denominator = self._aggregate(scan, reducer, *kpi['denominator'], base).astype('float64')
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = np.where(denominator != 0, numerator / denominator, np.nan) * kpi.get('scale', 1)
+            elif agg == 'duration':
+                elapsed, present = scan.elapsed(kpi['start'], kpi['end'], kpi.get('unit', 'days'))
+                values = reducer.mean(elapsed, base & present)
+            elif agg == 'days_since':
+                dates = scan.dates(kpi['date'])
+                latest = pd.to_datetime(pd.Series(reducer.reduce(dates, base & ~np.isnat(dates), 'max')))
+                values = ((as_of - latest).dt.total_seconds() / UNIT_SECONDS['days']).to_numpy()
+            else:
+                raise ValueError(f"Agregação desconhecida: {agg}")
+            block = pd.DataFrame({
+                'pillar': pillar,
+                'kpi': kpi['name'],
+                'value': pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype='float64')
+            })
+            if grouped:
+                block.insert(2, group_by, reducer.labels)
+            blocks.append(block)
+        if not blocks:
+            return pd.DataFrame(columns=['pillar', 'kpi', 'value'])
+        return pd.concat(blocks, ignore_index=True)
@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 50000
+CATEGORY_RATIO = 0.5
+# DECIMAL columns keep their exact Decimal values unless float64 is asked for.
+DECIMAL_AS_FLOAT = os.environ.get('COMPLIANCE_DECIMAL_AS_FLOAT', '0') == '1'
+
+_field_types = None
+
+
+def _type_tables():
+    # mysql.connector is imported on the first streamed query rather than at
+    # import time, since build_select and friends are used without a database.
+    global _field_types
+    if _field_types is None:
+        from mysql.connector import FieldFlag, FieldType
+        _field_types = {
+            'flag': FieldFlag,
+            'type': FieldType,
+            'integer': {
+                FieldType.TINY: ('int8', 'uint8'),
+                FieldType.SHORT: ('int16', 'uint16'),
+                FieldType.YEAR: ('int16', 'uint16'),
+                FieldType.INT24: ('int32', 'uint32'),
+                FieldType.LONG: ('int32', 'uint32'),
+                FieldType.LONGLONG: ('int64', 'uint64'),
+                FieldType.BIT: ('int64', 'uint64'),
+            },
+            'float': {
+                FieldType.FLOAT: 'float32',
+                FieldType.DOUBLE: 'float64',
+            },
+            'decimal': {FieldType.DECIMAL, FieldType.NEWDECIMAL},
+            'datetime': {FieldType.DATE, FieldType.NEWDATE, FieldType.DATETIME, FieldType.TIMESTAMP},
+            'string': {FieldType.VARCHAR, FieldType.VAR_STRING, FieldType.STRING},
+            'enum': {FieldType.ENUM, FieldType.SET},
+        }
+    return _field_types
+
+
+def column_type_dtype(column_type):
+    # How a column of this information_schema COLUMN_TYPE is compared once
+    # loaded, for tables that are queried before being loaded. DECIMAL loads
+    # as Decimal objects, which compare as numbers.
+    base = str(column_type).split('(')[0].split()[0].lower()
+    if base in ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'year', 'bit'):
+        return np.dtype('int64')
+    if base in ('float', 'double', 'real', 'decimal', 'numeric'):
+        return np.dtype('float64')
+    if base in ('date', 'datetime', 'timestamp'):
+        return np.dtype('datetime64[ns]')
+    return np.dtype(object)
+
+
+def quote_identifier(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def build_select(table_name, columns=None, where=None, order_by=None):
+    projection = ", ".join(quote_identifier(c) for c in columns) if columns else "*"
+    query = f"SELECT {projection} FROM {quote_identifier(table_name)}"
+    if where:
+        query += f" WHERE {where}"
+    if order_by:
+        query += f" ORDER BY {quote_identifier(order_by)}"
+    return query
+
+
+def column_kind(description):
+    types = _type_tables()
+    FieldFlag, FieldType = types['flag'], types['type']
+    type_code = description[1]
+    flags = description[7] if len(description) > 7 and description[7] else 0
+    nullable = description[6] if len(description) > 6 and description[6] is not None else True
+    if type_code in types['integer']:
+        signed, unsigned = types['integer'][type_code]
+        dtype = unsigned if flags & FieldFlag.UNSIGNED else signed
+        return 'int', (_nullable_int(dtype) if nullable else dtype)
+    if type_code in types['float']:
+        return 'float', types['float'][type_code]
+    if type_code in types['decimal']:
+        return ('float', 'float64') if DECIMAL_AS_FLOAT else ('object', None)
+    if type_code in types['datetime']:
+        return 'datetime', 'datetime64[ns]'
+    if type_code == FieldType.TIME:
+        return 'timedelta', 'timedelta64[ns]'
+    if type_code in types['enum'] or flags & (FieldFlag.ENUM | FieldFlag.SET):
+        return 'category', 'category'
+    if type_code in types['string']:
+        return 'string', None
+    if type_code is None:
+        return 'infer', None
+    return 'object', None
+
+
+def _nullable_int(dtype):
+    return 'UInt' + dtype[4:] if dtype.startswith('uint') else 'Int' + dtype[3:]
+
+
+def _infer_kind(values):
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == 'integer':
+        return 'int', 'Int64'
+    if inferred in ('floating', 'mixed-integer-float') or (DECIMAL_AS_FLOAT and inferred == 'decimal'):
+        return 'float', 'float64'
+    if inferred in ('datetime', 'datetime64', 'date'):
+        return 'datetime', 'datetime64[ns]'
+    if inferred == 'string':
+        return 'string', None
+    return 'object', None
+
+
+def _build_float(values, dtype='float64'):
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=dtype)
+
+
+def _fallback_column(values):
+    # A column typed from its first chunk (or from an untyped cursor) can hold
+    # fractions or text further down; widen instead of failing the load.
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        try:
+            return _build_float(values)
+        except OverflowError:
+            pass
+    return np.array(values, dtype=object)
+
+
+def _build_column(values, kind, dtype):
+    if kind == 'int':
+        try:
+            if dtype[0].isupper():
+                return pd.array(values, dtype=dtype)
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            pass
+        try:
+            return pd.array(values, dtype='Int64')
+        except (TypeError, ValueError, OverflowError):
+            return _fallback_column(values)
+    if kind == 'float':
+        try:
+            return _build_float(values, dtype)
+        except (TypeError, ValueError):
+            return np.array(values, dtype=object)
+    if kind == 'datetime':
+        return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+    if kind == 'timedelta':
+        return pd.to_timedelta(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+    if kind == 'category':
+        return pd.Categorical(values)
+    return np.array(values, dtype=object)
+
+
+def _describe(cursor):
+    return [(d[0],) + column_kind(d) for d in cursor.description]
+
+
+def iter_chunks(cursor, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    cursor.execute(query, params or ())
+    layout = _describe(cursor)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        chunk = {}
+        for idx, (name, kind, dtype) in enumerate(layout):
+            values = columns[idx]
+            if kind == 'infer':
+                kind, dtype = _infer_kind(values)
+                layout[idx] = (name, kind, dtype)
+            if kind == 'string':
+                # Decided once from the first chunk so every chunk of a column
+                # ends up with the same representation.
+                distinct = len(set(values))
+                kind = 'category' if distinct <= max(1, len(values) * CATEGORY_RATIO) else 'object'
+                layout[idx] = (name, kind, dtype)
+            column = _build_column(values, kind, dtype)
+            if (kind == 'int' and column.dtype.kind in 'fO') or (kind == 'float' and column.dtype.kind == 'O'):
+                # Later chunks go straight to the wider representation.
+                layout[idx] = (name, 'float', 'float64') if column.dtype.kind == 'f' else (name, 'object', None)
+            chunk[name] = column
+        yield chunk
+
+
+def _concat_column(parts):
+    if isinstance(parts[0], pd.Categorical):
+        return pd.api.types.union_categoricals(parts)
+    if all(isinstance(part, np.ndarray) for part in parts):
+        return np.concatenate(parts)
+    return pd.concat([pd.Series(part) for part in parts], ignore_index=True).array
+
+
+def read_streaming(cursor, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    parts = {}
+    rows = 0
+    for chunk in iter_chunks(cursor, query, params, chunk_size):
+        for name, values in chunk.items():
+            parts.setdefault(name, []).append(values)
+        rows += len(next(iter(chunk.values())))
+        if progress is not None:
+            progress(rows)
+    if not parts:
+        return pd.DataFrame(columns=[d[0] for d in cursor.description or []])
+    data = {}
+    for name in list(parts):
+        data[name] = _concat_column(parts.pop(name))
+    return pd.DataFrame(data, copy=False)
@@ -0,0 +1,236 @@
+import os
+import uuid
+from datetime import datetime
+from io import BytesIO
+
+from chart_cache import get_chart_cache
+from data_store import DEFAULT_SPILL_DIR, _read_spill, _remove, _write_spill
+from kpi_catalog import CATALOG, format_kpi_value, kpi_statuses, kpi_values
+
+# 0 prints every row of an appendix.
+APPENDIX_MAX_ROWS = int(os.environ.get('COMPLIANCE_APPENDIX_MAX_ROWS', '0')) or None
+REPORT_TABLE_DIR = os.path.join(DEFAULT_SPILL_DIR, 'reports')
+
+
+def table_reference(df, directory=REPORT_TABLE_DIR):
+    # Large tables reach report workers as an Arrow file on disk instead of
+    # a pickled frame in the task arguments.
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.arrow")
+    return {'path': path, 'format': _write_spill(df, path), 'rows': len(df)}
+
+
+def load_table(content):
+    if 'path' in content:
+        return _read_spill(content['path'], content['format'])
+    return content['data']
+
+
+def discard_table(content):
+    if 'path' in content:
+        _remove(content['path'])
+
+
+def report_steps(report_data):
+    # Progress steps of create_report: the chart batch, each section and the
+    # PDF build itself.
+    sections = report_data['sections']
+    charts = any(section['type'] == 'chart' and 'figure' in section['content'] for section in sections)
+    return (1 if charts else 0) + len(sections) + 1
+
+
+class ReportGenerator:
+    # reportlab is only imported once a report is actually built, so pages
+    # and workers that never render a PDF do not pay for it.
+    def __init__(self):
+        from reportlab.lib import colors
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+        self.styles = getSampleStyleSheet()
+        self.custom_styles = {
+            'Title': ParagraphStyle(
+                'CustomTitle',
+                parent=self.styles['Heading1'],
+                fontSize=24,
+                textColor=colors.HexColor('#422AFB'),
+                spaceAfter=30,
+                alignment=1
+            ),
+            'Heading': ParagraphStyle(
+                'CustomHeading',
+                parent=self.styles['Heading2'],
+                fontSize=18,
+                textColor=colors.HexColor('#7551FF'),
+                spaceAfter=20
+            ),
+            'Normal': ParagraphStyle(
+                'CustomNormal',
+                parent=self.styles['Normal'],
+                fontSize=12,
+                spaceAfter=12
+            )
+        }
+
+    def create_report(self, report_data, output_buffer, progress=None, check=None):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+        from report_tables import DataFrameTable
+
+        doc = SimpleDocTemplate(
+            output_buffer,
+            pagesize=A4,
+            rightMargin=72,
+            leftMargin=72,
+            topMargin=72,
+            bottomMargin=18
+        )
+        story = []
+        title = Paragraph(report_data['title'], self.custom_styles['Title'])
+        story.append(title)
+        story.append(Spacer(1, 20))
+        info_data = [
+            ['Data de Geração:', datetime.now().strftime('%d/%m/%Y %H:%M')],
+            ['Período:', report_data.get('period', 'Últimos 12 meses')],
+            ['Responsável:', report_data.get('responsible', 'Sistema Automático')]
+        ]
+        info_table = Table(info_data, colWidths=[150, 350])
+        info_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333'))
+        ]))
+        story.append(info_table)
+        story.append(Spacer(1, 30))
+        sections = report_data['sections']
+        charts = [
+            index for index, section in enumerate(sections)
+            if section['type'] == 'chart' and 'figure' in section['content']
+        ]
+        # All charts are rasterized in one batch, reusing PNGs already
+        # rendered for identical figures; the batch counts as one step.
+        steps = report_steps(report_data)
+        images = {}
+        if charts:
+            if progress is not None:
+                progress(0, steps, "Gráficos")
+            images = dict(zip(charts, get_chart_cache().render([sections[index]['content']['figure'] for index in charts])))
+            if progress is not None:
+                progress(1, steps, "Gráficos")
+        done = 1 if charts else 0
+        for index, section in enumerate(sections):
+            heading = Paragraph(section['title'], self.custom_styles['Heading'])
+            story.append(heading)
+            if section['type'] == 'text':
+                para = Paragraph(section['content'], self.custom_styles['Normal'])
+                story.append(para)
+            elif section['type'] == 'metrics':
+                metrics_data = []
+                for metric in section['content']:
+                    metrics_data.append([
+                        metric['name'],
+                        str(metric['value']),
+                        metric.get('status', '✓')
+                    ])
+                metrics_table = Table(metrics_data, colWidths=[200, 100, 50])
+                metrics_table.setStyle(TableStyle([
+                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                    ('FONTSIZE', (0, 0), (-1, -1), 10),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f0f0f0'))
+                ]))
+                story.append(metrics_table)
+            elif section['type'] == 'table':
+                content = section['content']
+                df = load_table(content)
+                if content.get('max_rows'):
+                    df = df.head(content['max_rows'])
+                story.append(DataFrameTable.from_frame(df, doc.width, content.get('columns')))
+            elif section['type'] == 'chart':
+                if index in images:
+                    story.append(Image(BytesIO(images[index]), width=450, height=300))
+            story.append(Spacer(1, 20))
+            if progress is not None:
+                progress(done + index + 1, steps, section['title'])
+        if progress is not None:
+            progress(steps - 1, steps, "PDF")
+
+        def page(canvas, doc):
+            # Called for every page laid out, so a long appendix can still be
+            # cancelled halfway through the build.
+            if check is not None:
+                check()
+
+        doc.build(story, onFirstPage=page, onLaterPages=page)
+
+
+def build_management_report(title, period, responsible, pillars, kpi_results=None, include_metrics=True,
+                            include_charts=True, include_recommendations=True, appendices=None,
+                            appendix_rows=APPENDIX_MAX_ROWS):
+    report_data = {
+        'title': title,
+        'period': period,
+        'responsible': responsible,
+        'sections': []
+    }
+    report_data['sections'].append({
+        'title': 'Resumo Executivo',
+        'type': 'text',
+        'content': f'Este relatório apresenta a situação atual do programa de compliance, cobrindo o período de {period}. O score geral de compliance é de 87.5%, representando um aumento de 2.3% em relação ao período anterior.'
+    })
+    if include_metrics and kpi_results is not None:
+        for pillar in pillars:
+            pillar_data = CATALOG.pillars[pillar]
+            values = kpi_values(kpi_results, pillar)
+            statuses = kpi_statuses(kpi_results, pillar)
+            metrics = []
+            for kpi in pillar_data['kpis']:
+                value = values.get(kpi['name'])
+                metrics.append({
+                    'name': kpi['name'],
+                    'value': format_kpi_value(kpi, value),
+                    'status': statuses.get(kpi['name'], "⚪")
+                })
+            report_data['sections'].append({
+                'title': f"{pillar_data['icon']} {pillar}",
+                'type': 'metrics',
+                'content': metrics
+            })
+    if include_charts:
+        import plotly.graph_objects as go
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun'],
+            y=[82, 85, 87, 89, 91, 93],
+            mode='lines+markers',
+            name='Compliance Score'
+        ))
+        fig.update_layout(title='Evolução do Compliance Score', height=400)
+        report_data['sections'].append({
+            'title': 'Análise Gráfica',
+            'type': 'chart',
+            'content': {'figure': fig}
+        })
+    if include_recommendations:
+        report_data['sections'].append({
+            'title': 'Recomendações',
+            'type': 'text',
+            'content': '1. Intensificar treinamentos nos departamentos com menor aderência\n2. Revisar políticas que estão próximas do vencimento\n3. Implementar automação nos controles manuais identificados\n4. Aumentar a frequência de comunicações sobre compliance'
+        })
+    for name, df in (appendices or {}).items():
+        title = f"Apêndice: {name}"
+        if appendix_rows and len(df) > appendix_rows:
+            # A capped appendix says so in its heading.
+            title += f" (primeiras {appendix_rows:,} de {len(df):,} linhas)"
+            df = df.head(appendix_rows)
+        report_data['sections'].append({
+            'title': title,
+            'type': 'table',
+            'content': {'data': df}
+        })
+    return report_data
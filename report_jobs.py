@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from io import BytesIO
+
+from instrumentation import get_metrics
+from report_generator import ReportGenerator, discard_table, report_steps, table_reference
+from report_store import get_report_store
+
+DEFAULT_MAX_WORKERS = int(os.environ.get('COMPLIANCE_REPORT_WORKERS', '2'))
+MAX_FINISHED_JOBS = 200
+# Finished reports are already in the report store, so a job nobody collected
+# only has to outlive the session that submitted it.
+UNCOLLECTED_JOB_SECONDS = float(os.environ.get('COMPLIANCE_REPORT_JOB_TTL_HOURS', '24')) * 3600
+
+QUEUED = 'na fila'
+RUNNING = 'executando'
+DONE = 'concluído'
+CANCELLED = 'cancelado'
+FAILED = 'erro'
+FINISHED = (DONE, CANCELLED, FAILED)
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+def portable_report(report_data):
+    sections = []
+    for section in report_data['sections']:
+        if section['type'] == 'chart' and hasattr(section['content'].get('figure'), 'to_dict'):
+            # Figures cross the process boundary as plain dicts.
+            section = dict(section, content=dict(section['content'], figure=section['content']['figure'].to_dict()))
+        elif section['type'] == 'table' and 'data' in section['content']:
+            # Appendices can be far too large to pickle into the task.
+            content = {k: v for k, v in section['content'].items() if k != 'data'}
+            section = dict(section, content=dict(content, **table_reference(section['content']['data'])))
+        sections.append(section)
+    return dict(report_data, sections=sections)
+
+
+def _build_report(job_id, report_data, events, cancelled):
+    def check():
+        if cancelled.get(job_id):
+            raise ReportCancelled(job_id)
+
+    def progress(done, total, title):
+        events.put((job_id, done, total, title))
+        check()
+
+    check()
+    events.put((job_id, 0, report_steps(report_data), None))
+    started = time.perf_counter()
+    buffer = BytesIO()
+    ReportGenerator().create_report(report_data, buffer, progress=progress, check=check)
+    return buffer.getvalue(), time.perf_counter() - started
+
+
+class ReportJobQueue:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, store=None):
+        self.max_workers = max(1, int(max_workers))
+        self.store = store or get_report_store()
+        self._context = multiprocessing.get_context('spawn')
+        self._manager = self._context.Manager()
+        self._events = self._manager.Queue()
+        self._cancelled = self._manager.dict()
+        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=self._context)
+        self._jobs = {}
+        self._lock = threading.RLock()
+        self._pump_thread = threading.Thread(target=self._pump, name='report-job-events', daemon=True)
+        self._pump_thread.start()
+
+    def submit(self, report_data, owner=None, kind='Gerencial'):
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'owner': owner,
+            'title': report_data['title'],
+            'type': kind,
+            'status': QUEUED,
+            'sections_done': 0,
+            'sections_total': report_steps(report_data),
+            'current': None,
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'error': None,
+            'report_id': None,
+            'collected': False,
+            'dismissed': False
+        }
+        report_data = portable_report(report_data)
+        job['tables'] = [section['content'] for section in report_data['sections'] if section['type'] == 'table']
+        with self._lock:
+            self._jobs[job_id] = job
+            future = self._executor.submit(_build_report, job_id, report_data, self._events, self._cancelled)
+            job['future'] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+        return job_id
+
+    def _pump(self):
+        while True:
+            try:
+                job_id, done, total, title = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] in FINISHED:
+                    continue
+                if job['status'] == QUEUED:
+                    job['status'] = RUNNING
+                    job['started'] = time.time()
+                job['sections_done'] = done
+                job['sections_total'] = total
+                job['current'] = title
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['finished'] = time.time()
+            job.pop('future', None)
+            for content in job.pop('tables', []):
+                discard_table(content)
+            try:
+                pdf, seconds = future.result()
+                get_metrics().record('ReportGenerator.create_report', 'report', seconds)
+                # Finished PDFs go straight to the disk store; the queue only
+                # keeps the id.
+                job['report_id'] = self.store.put(pdf, job['title'], job['type'], owner=job['owner'], created=job['finished'])
+                job['status'] = DONE
+                job['sections_done'] = job['sections_total']
+                job['current'] = None
+            except (CancelledError, ReportCancelled):
+                job['status'] = CANCELLED
+            except Exception as e:
+                job['status'] = FAILED
+                job['error'] = str(e)
+            self._cancelled.pop(job_id, None)
+            self._prune()
+
+    def _prune(self):
+        for job_id in [job_id for job_id, job in self._jobs.items() if job['dismissed']]:
+            del self._jobs[job_id]
+        finished = [job for job in self._jobs.values() if job['status'] in FINISHED]
+        expired = time.time() - UNCOLLECTED_JOB_SECONDS
+        for job in sorted(finished, key=lambda j: j['finished'])[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            if job['status'] != DONE or job['collected']:
+                del self._jobs[job['id']]
+        for job in finished:
+            if job['id'] in self._jobs and job['finished'] < expired:
+                del self._jobs[job['id']]
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return False
+            future = job.get('future')
+            if future is not None and future.cancel():
+                return True
+            # Already running: the worker checks the flag after each section
+            # and on every page of the PDF build.
+            self._cancelled[job_id] = True
+            return True
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else {k: v for k, v in job.items() if k not in ('future', 'tables')}
+
+    def jobs(self, owner=None):
+        with self._lock:
+            return [
+                {k: v for k, v in job.items() if k not in ('future', 'tables')}
+                for job in sorted(self._jobs.values(), key=lambda j: j['submitted'], reverse=True)
+                if not job['dismissed'] and (owner is None or job['owner'] == owner)
+            ]
+
+    def collect(self, owner=None):
+        with self._lock:
+            self._prune()
+            ready = []
+            for job in self._jobs.values():
+                if job['status'] == DONE and not job['collected'] and (owner is None or job['owner'] == owner):
+                    job['collected'] = True
+                    ready.append({k: v for k, v in job.items() if k not in ('future', 'tables')})
+            return ready
+
+    def dismiss(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] in FINISHED:
+                job['dismissed'] = True
+                self._prune()
+
+    def configure(self, max_workers):
+        max_workers = max(1, int(max_workers))
+        with self._lock:
+            if max_workers == self.max_workers:
+                return
+            # Jobs already submitted finish on the old pool; new jobs go to
+            # a pool with the new limit.
+            old = self._executor
+            self._executor = ProcessPoolExecutor(max_workers, mp_context=self._context)
+            self.max_workers = max_workers
+        old.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return dict(counts, max_workers=self.max_workers)
+
+    def shutdown(self):
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job['status'] not in FINISHED:
+                    self._cancelled[job_id] = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._manager.shutdown()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ReportJobQueue()
+        return _queue
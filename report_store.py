@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_REPORT_DIR = os.environ.get(
+    'COMPLIANCE_REPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'reports')
+)
+DEFAULT_MAX_BYTES = int(os.environ.get('COMPLIANCE_REPORT_MAX_MB', '1024')) * 1024 ** 2
+DEFAULT_RETENTION_DAYS = int(os.environ.get('COMPLIANCE_REPORT_RETENTION_DAYS', '90'))
+BATCH_OWNER = 'batch'
+LOCAL_OWNER = 'local'
+
+
+class ReportStore:
+    def __init__(self, root=DEFAULT_REPORT_DIR, max_bytes=DEFAULT_MAX_BYTES, retention_days=DEFAULT_RETENTION_DAYS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, 'index.json')
+        self._lock_path = os.path.join(self.root, 'index.lock')
+        self._index_mtime = None
+        self._index = {}
+        self._reload()
+
+    @contextmanager
+    def _locked(self):
+        # Report workers and the batch CLI write from other processes, so
+        # every read-modify-write of the index holds an exclusive file lock
+        # and starts from the index as it is on disk.
+        with self._lock:
+            with open(self._lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reload(force=True)
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self, force=False):
+        # Other processes (report workers, the batch CLI) may have written
+        # the index since it was last read.
+        try:
+            mtime = os.path.getmtime(self._index_path)
+        except OSError:
+            return
+        if mtime == self._index_mtime and not force:
+            return
+        try:
+            with open(self._index_path, encoding='utf-8') as fh:
+                self._index = json.load(fh)
+            self._index_mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _write_index(self):
+        tmp_path = f"{self._index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self._index, fh, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.path.getmtime(self._index_path)
+
+    def _path(self, digest):
+        return os.path.join(self.root, f"{digest}.pdf.gz")
+
+    def put(self, pdf, title, kind, owner=None, created=None, report_id=None):
+        digest = hashlib.sha256(pdf).hexdigest()
+        path = self._path(digest)
+        tmp_path = None
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as fh:
+                fh.write(pdf)
+        created = created or time.time()
+        report_id = report_id or f"REL_{datetime.fromtimestamp(created).strftime('%Y%m%d_%H%M%S')}_{digest[:4]}"
+        with self._locked():
+            # Moved into place under the lock, so an eviction running in
+            # another process cannot remove it before it is indexed.
+            if tmp_path is not None:
+                os.replace(tmp_path, path)
+            elif not os.path.exists(path):
+                with gzip.open(path, 'wb', compresslevel=6) as fh:
+                    fh.write(pdf)
+            self._index[report_id] = {
+                'title': title,
+                'type': kind,
+                'owner': owner,
+                'created': created,
+                'digest': digest,
+                'bytes': len(pdf),
+                'stored_bytes': os.path.getsize(path)
+            }
+            self._evict()
+            self._write_index()
+        return report_id
+
+    def entries(self):
+        with self._lock:
+            self._reload()
+            return {
+                report_id: dict(entry)
+                for report_id, entry in sorted(self._index.items(), key=lambda item: item[1]['created'], reverse=True)
+            }
+
+    def open(self, report_id):
+        with self._lock:
+            self._reload()
+            digest = self._index[report_id]['digest']
+        return gzip.open(self._path(digest), 'rb')
+
+    def read(self, report_id):
+        with self.open(report_id) as fh:
+            return fh.read()
+
+    def _drop(self, report_id):
+        digest = self._index.pop(report_id)['digest']
+        if not any(entry['digest'] == digest for entry in self._index.values()):
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def delete(self, report_id):
+        with self._locked():
+            if report_id in self._index:
+                self._drop(report_id)
+                self._write_index()
+
+    def _evict(self):
+        if self.retention_days > 0:
+            cutoff = time.time() - self.retention_days * 86400
+            for report_id, entry in list(self._index.items()):
+                if entry['created'] < cutoff:
+                    self._drop(report_id)
+        for report_id, entry in sorted(self._index.items(), key=lambda item: item[1]['created']):
+            if self.stored_bytes() <= self.max_bytes:
+                break
+            self._drop(report_id)
+
+    def stored_bytes(self):
+        digests = {entry['digest']: entry['stored_bytes'] for entry in self._index.values()}
+        return sum(digests.values())
+
+    def configure(self, max_bytes=None, retention_days=None):
+        with self._locked():
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if retention_days is not None:
+                self.retention_days = retention_days
+            self._evict()
+            self._write_index()
+
+    def stats(self):
+        with self._lock:
+            self._reload()
+            original = sum(entry['bytes'] for entry in self._index.values())
+            stored = self.stored_bytes()
+            return {
+                'reports': len(self._index),
+                'bytes': original,
+                'stored_bytes': stored,
+                'ratio': stored / original if original else 0.0,
+                'max_bytes': self.max_bytes,
+                'retention_days': self.retention_days
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_report_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ReportStore()
+        return _store
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable, Table, TableStyle
+
+TABLE_FONT = 'Helvetica'
+TABLE_FONT_SIZE = 7
+TABLE_ROW_HEIGHT = 10
+TABLE_SAMPLE_ROWS = 1000
+LONG_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), TABLE_FONT),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), TABLE_FONT_SIZE),
+    ('LEADING', (0, 0), (-1, -1), TABLE_FONT_SIZE + 1),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ('LINEBELOW', (0, 0), (-1, 0), 0.75, colors.HexColor('#7551FF')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')])
+])
+
+
+def _cell_text(series):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        text = series.dt.strftime('%d/%m/%Y')
+    elif pd.api.types.is_float_dtype(series.dtype):
+        text = series.round(2).astype(str)
+    else:
+        text = series.astype(str)
+    return text.where(series.notna(), '').to_numpy(dtype=object)
+
+
+class DataFrameTable(Flowable):
+    # Lays out a DataFrame one page at a time: split() only materialises the
+    # rows that fit the current frame and hands the rest on as another
+    # DataFrameTable, so a 100k-row appendix never exists as a single Table.
+    def __init__(self, df, col_widths, max_chars, start=0):
+        Flowable.__init__(self)
+        self.df = df
+        self.col_widths = col_widths
+        self.max_chars = max_chars
+        self.start = start
+
+    @classmethod
+    def from_frame(cls, df, width, columns=None):
+        df = df[list(columns)] if columns else df
+        sample = df.head(TABLE_SAMPLE_ROWS)
+        natural = []
+        for column in df.columns:
+            lengths = pd.Series(_cell_text(sample[column])).str.len()
+            natural.append(max(len(str(column)), int(lengths.quantile(0.9)) if len(lengths) else 0, 3))
+        natural = np.asarray(natural, dtype='float64')
+        col_widths = list(natural / natural.sum() * width)
+        char_width = stringWidth('0', TABLE_FONT, TABLE_FONT_SIZE)
+        max_chars = [max(3, int((w - 4) // char_width)) for w in col_widths]
+        return cls(df, col_widths, max_chars)
+
+    def _rows(self, stop):
+        rows = [[str(column)[:limit] for column, limit in zip(self.df.columns, self.max_chars)]]
+        chunk = self.df.iloc[self.start:stop]
+        columns = [
+            [value if len(value) <= limit else value[:limit - 1] + '…' for value in _cell_text(chunk[column])]
+            for column, limit in zip(chunk.columns, self.max_chars)
+        ]
+        rows.extend(map(list, zip(*columns)))
+        return rows
+
+    def _table(self, stop):
+        table = Table(self._rows(stop), colWidths=self.col_widths,
+                      rowHeights=TABLE_ROW_HEIGHT, repeatRows=1)
+        table.setStyle(LONG_TABLE_STYLE)
+        return table
+
+    def wrap(self, availWidth, availHeight):
+        self.width = sum(self.col_widths)
+        self.height = (len(self.df) - self.start + 1) * TABLE_ROW_HEIGHT
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        fit = int(availHeight // TABLE_ROW_HEIGHT) - 1
+        if fit < 1:
+            return []
+        stop = self.start + fit
+        if stop >= len(self.df):
+            return [self._table(len(self.df))]
+        return [self._table(stop), DataFrameTable(self.df, self.col_widths, self.max_chars, stop)]
+
+    def draw(self):
+        table = self._table(len(self.df))
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
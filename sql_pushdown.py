@@ -0,0 +1,211 @@
+import ast
+
+import pandas as pd
+
+from expressions import parse_expression
+from mysql_stream import quote_identifier
+
+REDUCING = {'filter', 'select', 'aggregate'}
+SQL_AGGREGATIONS = {
+    'sum': "COALESCE(SUM({}), 0)",
+    'mean': "AVG({})",
+    'count': "COUNT({})",
+    'nunique': "COUNT(DISTINCT {})",
+    'min': "MIN({})",
+    'max': "MAX({})"
+}
+AGGREGATION_KINDS = {'count': 'int', 'nunique': 'int', 'mean': 'float'}
+_COMPARISONS = {'==': "{} = %s", '>': "{} > %s", '>=': "{} >= %s", '<': "{} < %s", '<=': "{} <= %s",
+                # pandas keeps missing values on "!=", so NULLs must pass too.
+                '!=': "NOT ({} <=> %s)"}
+_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _binary(expr):
+    # MySQL's default collations compare, group and sort text ignoring case
+    # and accents; pandas compares code points, as utf8mb4_bin does.
+    return f"CONVERT({expr} USING utf8mb4) COLLATE utf8mb4_bin"
+
+
+def _like_pattern(value):
+    escaped = str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _kind(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'int'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'float'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime'
+    return 'text'
+
+
+def _value(kind, value):
+    # Coerced the way the pandas filter does; a value pandas would turn into
+    # NaN/NaT, or a boolean column, is left to pandas.
+    if kind in ('int', 'float'):
+        number = pd.to_numeric(pd.Series([value]), errors='coerce').iloc[0]
+        if pd.isna(number):
+            raise Unsupported(value)
+        return number.item()
+    if kind == 'datetime':
+        try:
+            timestamp = pd.Timestamp(value)
+        except (TypeError, ValueError):
+            raise Unsupported(value)
+        if pd.isna(timestamp) or timestamp.tzinfo is not None:
+            raise Unsupported(value)
+        return timestamp.to_pydatetime()
+    if kind == 'bool':
+        raise Unsupported(value)
+    return str(value)
+
+
+def _expression(node, exprs):
+    # Arithmetic is translated; comparisons yield 1/0/NULL in MySQL rather
+    # than pandas booleans, so they stay in pandas.
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        return f"({_expression(node.left, exprs)} {_OPERATORS[type(node.op)]} {_expression(node.right, exprs)})"
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        return f"({'-' if isinstance(node.op, ast.USub) else '+'}{_expression(node.operand, exprs)})"
+    if isinstance(node, ast.Name) and node.id in exprs:
+        return exprs[node.id]
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return repr(node.value)
+    raise Unsupported(ast.dump(node))
+
+
+class _Select:
+    def __init__(self, source, params, kinds):
+        self.source = source
+        self.params = list(params)
+        self.exprs = {column: quote_identifier(column) for column in kinds}
+        self.kinds = dict(kinds)
+        self.where = []
+        self.where_params = []
+        self.group_by = []
+        self.order_by = None
+        self.limit = None
+        self.aggregated = False
+
+    def render(self):
+        projection = ", ".join(
+            expr if expr == quote_identifier(name) else f"{expr} AS {quote_identifier(name)}"
+            for name, expr in self.exprs.items()
+        )
+        query = f"SELECT {projection} FROM {self.source}"
+        if self.where:
+            query += " WHERE " + " AND ".join(self.where)
+        if self.group_by:
+            query += " GROUP BY " + ", ".join(self.group_by)
+        if self.order_by:
+            query += " ORDER BY " + self.order_by
+        if self.limit:
+            query += f" LIMIT {int(self.limit)}"
+        return query, self.params + self.where_params
+
+    def wrap(self, depth):
+        query, params = self.render()
+        return _Select(f"({query}) AS {quote_identifier(f't{depth}')}", params, self.kinds)
+
+
+def _column(select, name):
+    if name not in select.exprs:
+        raise Unsupported(name)
+    return select.exprs[name]
+
+
+def _text_column(select, name):
+    column = _column(select, name)
+    return _binary(column) if select.kinds[name] == 'text' else column
+
+
+def _apply(select, step, depth):
+    op, params = step['op'], step['params']
+    # Filters, new columns and groupings cannot be stacked onto a grouped or
+    # limited SELECT, so those start a new one over it.
+    if select.limit or (select.aggregated and op in ('filter', 'derive', 'aggregate')):
+        select = select.wrap(depth)
+    if op == 'filter':
+        column = _column(select, params['column'])
+        kind = select.kinds[params['column']]
+        operator, value = params['operator'], params['value']
+        # Floats, booleans and dates are not written as text the same way
+        # by pandas and MySQL.
+        if operator in ('contém', 'em') and kind in ('float', 'bool', 'datetime'):
+            raise Unsupported(operator)
+        if operator == 'contém':
+            select.where.append(f"{_binary(f'LOWER(CAST({column} AS CHAR))')} LIKE LOWER(%s)")
+            select.where_params.append(_like_pattern(value))
+        elif operator == 'em':
+            values = [v.strip() for v in str(value).split(',') if v.strip()]
+            if not values:
+                select.where.append("FALSE")
+            else:
+                select.where.append(f"{_binary(f'CAST({column} AS CHAR)')} IN ({', '.join(['%s'] * len(values))})")
+                select.where_params.extend(values)
+        elif operator in _COMPARISONS:
+            select.where.append(_COMPARISONS[operator].format(_binary(column) if kind == 'text' else column))
+            select.where_params.append(_value(kind, value))
+        else:
+            raise Unsupported(operator)
+    elif op == 'derive':
+        try:
+            tree = parse_expression(params['expression'])
+        except ValueError:
+            raise Unsupported(params['expression'])
+        select.exprs[params['name']] = _expression(tree, select.exprs)
+        select.kinds[params['name']] = 'float'
+    elif op == 'select':
+        select.exprs = {column: _column(select, column) for column in params['columns']}
+        select.kinds = {column: select.kinds[column] for column in params['columns']}
+    elif op == 'aggregate':
+        by = [_text_column(select, column) for column in params['by']]
+        exprs = {column: expr for column, expr in zip(params['by'], by)}
+        kinds = {column: select.kinds[column] for column in params['by']}
+        for column, agg in params['measures']:
+            if agg not in SQL_AGGREGATIONS:
+                raise Unsupported(agg)
+            expr = _column(select, column) if agg in ('sum', 'mean', 'count') else _text_column(select, column)
+            exprs[f"{column}_{agg}"] = SQL_AGGREGATIONS[agg].format(expr)
+            kinds[f"{column}_{agg}"] = AGGREGATION_KINDS.get(agg, select.kinds[column])
+        # pandas drops groups whose key is missing.
+        select.where.extend(f"{expr} IS NOT NULL" for expr in by)
+        select.group_by = by
+        select.exprs = exprs
+        select.kinds = kinds
+        select.aggregated = True
+    elif op == 'sort':
+        column = _text_column(select, params['column'])
+        direction = "ASC" if params.get('ascending', True) else "DESC"
+        # pandas sorts missing values last in both directions.
+        select.order_by = f"{column} IS NULL, {column} {direction}"
+        select.limit = params.get('limit') or None
+    else:
+        raise Unsupported(op)
+    return select
+
+
+def compile_steps(table, dtypes, steps):
+    # Returns (query, params, pushed) for the longest prefix of steps that
+    # translates to SQL, cut back to its last step that reduces the data.
+    # Pushing only non-reducing steps would transfer the whole table again
+    # to do work pandas can do in memory.
+    select = _Select(quote_identifier(table), [], {column: _kind(dtype) for column, dtype in dtypes.items()})
+    compiled = None
+    for index, step in enumerate(steps, start=1):
+        try:
+            select = _apply(select, step, index)
+        except (Unsupported, KeyError):
+            break
+        if step['op'] in REDUCING or (step['op'] == 'sort' and step['params'].get('limit')):
+            compiled = select.render() + (index,)
+    return compiled
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_MARKER = '-- startup_profile: app --'
+DEFAULT_BUDGET_MS = float(os.environ.get('COMPLIANCE_STARTUP_BUDGET_MS', '0'))
+
+# Runs inside a fresh interpreter started with -X importtime. Streamlit and
+# its test harness are imported before the marker, as the server would have
+# them loaded already; everything after it is paid for by the app script.
+_DRIVER = '''
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+started = time.perf_counter()
+at = AppTest.from_file({script!r}, default_timeout={timeout})
+at.run()
+elapsed = time.perf_counter() - started
+print(json.dumps({{"first_paint_s": elapsed, "exceptions": [str(e.value) for e in at.exception]}}))
+'''
+
+
+def parse_importtime(lines):
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        modules.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_ms': int(fields[0]) / 1000,
+            'cumulative_ms': int(fields[1]) / 1000
+        })
+    return modules
+
+
+def profile(script, timeout=120):
+    code = _DRIVER.format(marker=APP_MARKER, script=os.path.abspath(script), timeout=timeout)
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(script))
+    )
+    stderr = completed.stderr.splitlines()
+    if APP_MARKER not in stderr or completed.returncode != 0:
+        raise RuntimeError(f"Falha ao executar {script}:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['modules'] = parse_importtime(stderr[stderr.index(APP_MARKER) + 1:])
+    return result
+
+
+def by_package(modules):
+    packages = {}
+    for module in modules:
+        package = packages.setdefault(module['module'].split('.')[0], {'self_ms': 0.0, 'modules': 0})
+        package['self_ms'] += module['self_ms']
+        package['modules'] += 1
+    return sorted(packages.items(), key=lambda item: item[1]['self_ms'], reverse=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação por módulo e até a primeira renderização do app.")
+    parser.add_argument('script', nargs='?', default='app.py', help="Script Streamlit a executar.")
+    parser.add_argument('--top', type=int, default=15, help="Quantidade de pacotes e módulos listados.")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS,
+                        help="Orçamento em ms até a primeira renderização (0 desativa).")
+    parser.add_argument('--output', default=None, help="Grava o perfil completo em JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = profile(args.script)
+    modules = result['modules']
+    first_paint_ms = result['first_paint_s'] * 1000
+    import_ms = sum(module['self_ms'] for module in modules)
+    print(f"Primeira renderização: {first_paint_ms:.0f} ms · importações do app: {import_ms:.0f} ms "
+          f"em {len(modules)} módulo(s)")
+    for error in result['exceptions']:
+        print(f"ERRO  {error}", file=sys.stderr)
+
+    print(f"\n{'Pacote':<32} {'ms':>8} {'módulos':>8}")
+    for package, totals in by_package(modules)[:args.top]:
+        print(f"{package:<32} {totals['self_ms']:8.1f} {totals['modules']:8d}")
+    print(f"\n{'Módulo':<48} {'próprio':>8} {'acumulado':>10}")
+    for module in sorted(modules, key=lambda m: m['cumulative_ms'], reverse=True)[:args.top]:
+        print(f"{module['module']:<48} {module['self_ms']:8.1f} {module['cumulative_ms']:10.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(result, fh, ensure_ascii=False, indent=2)
+    if args.budget and first_paint_ms > args.budget:
+        print(f"\nAcima do orçamento: {first_paint_ms:.0f} ms > {args.budget:.0f} ms.", file=sys.stderr)
+        return 1
+    return 1 if result['exceptions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard_plan import DashboardPlan
+
+
+def _frame(rows=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'a': rng.choice(['x', 'y', 'z'], rows),
+        'b': rng.choice(['p', 'q', 'r', 's'], rows).astype(object),
+        'v': rng.normal(10, 3, rows)
+    })
+    df.loc[rng.random(rows) < 0.1, 'b'] = None
+    df.loc[rng.random(rows) < 0.05, 'a'] = None
+    df.loc[rng.random(rows) < 0.05, 'v'] = np.nan
+    return df
+
+
+def _widget(by, measures):
+    return {'title': ",".join(by), 'row': 0, 'col': 0,
+            'query': {'source': 'dados', 'by': list(by), 'measures': measures}}
+
+
+def _sorted(frame, by):
+    return frame.sort_values(list(by)).reset_index(drop=True)
+
+
+MEASURES = [(None, 'count'), ('v', 'sum'), ('v', 'mean'), ('v', 'min'), ('v', 'max')]
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_rolled_up_group_by_matches_pandas(categorical):
+    df = _frame()
+    if categorical:
+        df = df.astype({'a': 'category', 'b': 'category'})
+    plan = DashboardPlan([_widget(['a', 'b'], MEASURES), _widget(['a'], MEASURES), _widget([], MEASURES)])
+    scan = next(iter(plan.scans.values()))
+    assert scan.parents[('a',)] == ('a', 'b')
+    results, stats = plan.execute({'dados': df})
+    assert stats['derived'] == 2
+    for index, by in enumerate([['a', 'b'], ['a'], []]):
+        result = results[index]
+        if by:
+            grouped = df.groupby(by, observed=True)['v']
+            expected = pd.DataFrame({
+                'valor': df.groupby(by, observed=True).size(),
+                'v (sum)': grouped.sum(), 'v (mean)': grouped.mean(),
+                'v (min)': grouped.min(), 'v (max)': grouped.max()
+            }).reset_index()
+            result = _sorted(result, by)
+            expected = _sorted(expected, by)
+            for column in by:
+                assert result[column].astype(str).tolist() == expected[column].astype(str).tolist()
+        else:
+            v = df['v']
+            expected = pd.DataFrame({'valor': [len(df)], 'v (sum)': [v.sum()], 'v (mean)': [v.mean()],
+                                     'v (min)': [v.min()], 'v (max)': [v.max()]})
+        for column in ['valor', 'v (sum)', 'v (mean)', 'v (min)', 'v (max)']:
+            np.testing.assert_allclose(result[column].to_numpy(dtype=float),
+                                       expected[column].to_numpy(dtype=float), rtol=1e-9)
+
+
+def test_filtered_group_by_matches_pandas():
+    df = _frame(seed=1)
+    widget = _widget(['b'], [(None, 'count'), ('v', 'nunique')])
+    widget['query']['filters'] = {'a': ['x', 'y']}
+    results, _ = DashboardPlan([widget]).execute({'dados': df})
+    subset = df[df['a'].isin(['x', 'y'])]
+    expected = subset.groupby('b').agg(valor=('v', 'size'), n=('v', 'nunique')).reset_index()
+    result = _sorted(results[0], ['b'])
+    assert result['b'].tolist() == expected['b'].tolist()
+    assert result['valor'].tolist() == expected['valor'].tolist()
+    assert result['v (nunique)'].tolist() == expected['n'].tolist()
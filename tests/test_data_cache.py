@@ -0,0 +1,28 @@
+import multiprocessing
+
+import pandas as pd
+
+from data_cache import ColumnarCache
+
+
+def _put_many(args):
+    root, worker = args
+    cache = ColumnarCache(root=root)
+    for i in range(30):
+        cache.put(f"Fonte {worker} {i}", pd.DataFrame({'valor': [worker, i]}), "arquivo", f"t{worker}_{i}",
+                  owner=f"sessao:{worker}")
+
+
+def test_concurrent_processes_do_not_lose_index_entries(tmp_path):
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        pool.map(_put_many, [(str(tmp_path), worker) for worker in range(4)])
+    cache = ColumnarCache(root=str(tmp_path))
+    assert len(cache.entries()) == 120
+    assert len(cache.entries(owner="sessao:2")) == 30
+
+
+def test_a_hit_adds_the_reader_as_owner(tmp_path):
+    cache = ColumnarCache(root=str(tmp_path))
+    cache.put("Fonte", pd.DataFrame({'valor': [1, 2]}), "mysql://u@h:3306/db", "riscos", "s1", owner="sessao:a")
+    assert cache.get("mysql://u@h:3306/db", "riscos", "s1", owner="sessao:b")['valor'].tolist() == [1, 2]
+    assert list(cache.entries(owner="sessao:b")) == list(cache.entries(owner="sessao:a"))
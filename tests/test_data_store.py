@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from data_store import compact_frame
+from expressions import evaluate
+
+
+def test_integers_are_not_narrowed_below_32_bits():
+    df = compact_frame(pd.DataFrame({
+        'small': [100, 120, 127],
+        'nullable': pd.array([1, None, 3], dtype='Int64'),
+        'int8': np.array([1, 2, 3], dtype='int8'),
+        'wide': [2 ** 40, 1, 2]
+    }))
+    assert df['small'].dtype == np.int32
+    assert df['nullable'].dtype == pd.Int32Dtype()
+    assert df['int8'].dtype == np.int32
+    assert df['wide'].dtype == np.int64
+    assert (df['small'] * 3).tolist() == [300, 360, 381]
+
+
+def test_calculated_columns_on_compacted_integers_do_not_wrap():
+    df = compact_frame(pd.DataFrame({
+        'valor': [2_000_000_000, 1_500_000_000],
+        'nullable': pd.array([2_000_000_000, None], dtype='Int64')
+    }))
+    assert df['valor'].dtype == np.int32
+    assert evaluate('valor * 2', df).tolist() == [4_000_000_000, 3_000_000_000]
+    assert evaluate('nullable + valor', df).tolist()[0] == 4_000_000_000
+    assert df.groupby([0, 0])['valor'].sum().iloc[0] == 3_500_000_000
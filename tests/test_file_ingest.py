@@ -0,0 +1,20 @@
+import io
+import zipfile
+
+import pytest
+
+from file_ingest import read_upload
+
+
+def _zip_without_workbook():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('notas.txt', 'não é uma planilha')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('content', [b'id;valor\n1;2', b'PK\x03\x04corrompido', _zip_without_workbook()],
+                         ids=['csv-renamed', 'truncated-zip', 'zip-without-workbook'])
+def test_unreadable_workbooks_raise_value_error(content):
+    with pytest.raises(ValueError, match="ilegível"):
+        read_upload(io.BytesIO(content), 'planilha.xlsx')
@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+from mysql.connector import FieldType
+
+from mysql_stream import read_streaming
+
+
+class FakeCursor:
+    def __init__(self, columns, rows):
+        self.description = [(name, type_code) + (None,) * 5 for name, type_code in columns]
+        self.rows = list(rows)
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def test_decimals_keep_their_exact_value():
+    cursor = FakeCursor([('valor', FieldType.NEWDECIMAL)], [(Decimal('12345678901234567.89'),), (None,)])
+    df = read_streaming(cursor, "SELECT valor FROM multas")
+    assert df['valor'].dtype == object
+    assert df['valor'].iloc[0] == Decimal('12345678901234567.89')
+
+
+def test_untyped_columns_widen_when_a_later_chunk_disagrees():
+    rows = [(1, 1, 1.5), (2, 2, 2.5), (3.5, 'três', 'n/d'), (None, 4, None)]
+    cursor = FakeCursor([('inteiro', None), ('misto', None), ('real', None)], rows)
+    df = read_streaming(cursor, "SELECT * FROM riscos", chunk_size=2)
+    assert df['inteiro'].tolist()[:3] == [1, 2, 3.5] and df['inteiro'].isna().iloc[3]
+    assert df['misto'].tolist() == [1, 2, 'três', 4]
+    assert df['real'].tolist()[:3] == [1.5, 2.5, 'n/d']
@@ -0,0 +1,19 @@
+import multiprocessing
+
+from report_store import ReportStore
+
+
+def _put_many(args):
+    root, worker = args
+    store = ReportStore(root=root)
+    for i in range(50):
+        store.put(f"pdf {worker} {i}".encode(), "Relatório", "Gerencial", report_id=f"r{worker}_{i}")
+
+
+def test_concurrent_processes_do_not_lose_index_entries(tmp_path):
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        pool.map(_put_many, [(str(tmp_path), worker) for worker in range(4)])
+    store = ReportStore(root=str(tmp_path))
+    assert len(store.entries()) == 200
+    assert len(list(tmp_path.glob('*.pdf.gz'))) == 200
+    assert store.read('r3_49') == b"pdf 3 49"
@@ -0,0 +1,205 @@
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_store import DataSourceStore
+from sql_pushdown import compile_steps
+from transformations import PipelineCache, PipelineEngine
+
+DTYPES = {'unidade': np.dtype(object), 'score': np.dtype('float64'), 'casos': np.dtype('int64'),
+          'ativo': np.dtype(bool)}
+
+
+def step(op, **params):
+    return {'op': op, 'params': params}
+
+
+def test_filter_values_are_coerced_to_the_column_type():
+    query, params, pushed = compile_steps('riscos', DTYPES, [
+        step('filter', column='score', operator='>', value='7.5'),
+        step('filter', column='casos', operator='<=', value='3'),
+        step('filter', column='unidade', operator='==', value='A')
+    ])
+    assert query == ("SELECT `unidade`, `score`, `casos`, `ativo` FROM `riscos` "
+                     "WHERE `score` > %s AND `casos` <= %s AND CONVERT(`unidade` USING utf8mb4) COLLATE utf8mb4_bin = %s")
+    assert params == [7.5, 3, 'A']
+    assert pushed == 3
+
+
+@pytest.mark.parametrize('filter_step', [
+    step('filter', column='score', operator='>', value='alto'),
+    step('filter', column='ativo', operator='==', value='True'),
+    step('filter', column='score', operator='em', value='1, 2'),
+])
+def test_filters_pandas_evaluates_differently_stay_in_pandas(filter_step):
+    assert compile_steps('riscos', DTYPES, [filter_step]) is None
+
+
+def test_pushdown_stops_at_the_last_reducing_step():
+    query, params, pushed = compile_steps('riscos', DTYPES, [
+        step('filter', column='casos', operator='>', value='0'),
+        step('derive', name='dobro', expression='score * 2'),
+        step('filter', column='dobro', operator='<', value='9'),
+        step('derive', name='triplo', expression='score * 3'),
+        step('derive', name='alto', expression='score > 5'),
+        step('select', columns=['unidade', 'alto'])
+    ])
+    assert pushed == 3
+    assert "(`score` * 2) AS `dobro`" in query
+    assert "triplo" not in query
+    assert params == [0, 9]
+
+
+def test_aggregate_drops_missing_keys_and_wraps_later_filters():
+    query, params, pushed = compile_steps('riscos', DTYPES, [
+        step('aggregate', by=['unidade'], measures=[['casos', 'sum'], ['score', 'mean']]),
+        step('filter', column='casos_sum', operator='>=', value='10')
+    ])
+    assert pushed == 2
+    unidade = "CONVERT(`unidade` USING utf8mb4) COLLATE utf8mb4_bin"
+    assert query == (
+        "SELECT `unidade`, `casos_sum`, `score_mean` FROM ("
+        f"SELECT {unidade} AS `unidade`, COALESCE(SUM(`casos`), 0) AS `casos_sum`, AVG(`score`) AS `score_mean` "
+        f"FROM `riscos` WHERE {unidade} IS NOT NULL GROUP BY {unidade}) AS `t2` WHERE `casos_sum` >= %s"
+    )
+    assert params == [10]
+
+
+@pytest.mark.parametrize('text_step, fragment', [
+    (step('filter', column='unidade', operator='==', value='São Paulo'),
+     "CONVERT(`unidade` USING utf8mb4) COLLATE utf8mb4_bin = %s"),
+    (step('filter', column='unidade', operator='!=', value='sao paulo'),
+     "NOT (CONVERT(`unidade` USING utf8mb4) COLLATE utf8mb4_bin <=> %s)"),
+    (step('filter', column='unidade', operator='em', value='SP, sp'),
+     "CONVERT(CAST(`unidade` AS CHAR) USING utf8mb4) COLLATE utf8mb4_bin IN (%s, %s)"),
+    (step('filter', column='unidade', operator='contém', value='são'),
+     "CONVERT(LOWER(CAST(`unidade` AS CHAR)) USING utf8mb4) COLLATE utf8mb4_bin LIKE LOWER(%s)"),
+    (step('aggregate', by=['unidade'], measures=[['unidade', 'nunique'], ['unidade', 'count']]),
+     "COUNT(DISTINCT CONVERT(`unidade` USING utf8mb4) COLLATE utf8mb4_bin) AS `unidade_nunique`, "
+     "COUNT(`unidade`) AS `unidade_count`"),
+    (step('sort', column='unidade', ascending=True, limit=10),
+     "ORDER BY CONVERT(`unidade` USING utf8mb4) COLLATE utf8mb4_bin IS NULL"),
+])
+def test_text_is_compared_by_code_point_not_by_the_table_collation(text_step, fragment):
+    # Under utf8mb4_0900_ai_ci "SP" = "sp" and "São" = "Sao"; pandas keeps
+    # them apart.
+    query, _, _ = compile_steps('riscos', DTYPES, [text_step])
+    assert fragment in query
+
+
+@pytest.fixture
+def riscos():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'unidade': rng.choice(['A', 'B', 'C', 'D'], 400).astype(object),
+        'nivel': rng.choice(['Alto', 'Crítico', 'Baixo'], 400).astype(object),
+        'score': rng.random(400) * 10,
+        'casos': rng.integers(0, 20, 400)
+    })
+    df.loc[::13, 'unidade'] = None
+    df.loc[::7, 'nivel'] = None
+    return df
+
+
+def sqlite_fetch(df):
+    connection = sqlite3.connect(':memory:')
+    df.to_sql('riscos', connection, index=False)
+
+    def fetch(query, params):
+        # MySQL spellings of what the compiler emits, in sqlite terms.
+        query = query.replace('`', '"').replace('%s', '?').replace('AS CHAR', 'AS TEXT').replace('<=>', 'IS')
+        query = query.replace('CONVERT(', '(').replace(' USING utf8mb4) COLLATE utf8mb4_bin', ') COLLATE BINARY')
+        query = re.sub(r"LIKE LOWER\(\?\)", r"LIKE LOWER(?) ESCAPE '\\'", query)
+        return pd.read_sql(query, connection, params=params)
+    return fetch
+
+
+@pytest.mark.parametrize('steps', [
+    [step('filter', column='score', operator='>', value='5'),
+     step('derive', name='s2', expression='score * 2 + 1'),
+     step('filter', column='nivel', operator='em', value='Alto, Crítico'),
+     step('aggregate', by=['unidade'], measures=[['s2', 'mean'], ['casos', 'sum'], ['nivel', 'count']]),
+     step('filter', column='casos_sum', operator='>=', value='20'),
+     step('sort', column='s2_mean', ascending=False, limit=3)],
+    [step('filter', column='nivel', operator='!=', value='Alto'),
+     step('select', columns=['unidade', 'nivel', 'casos'])],
+    [step('filter', column='nivel', operator='contém', value='crí'),
+     step('filter', column='casos', operator='<', value='10.5')],
+    [step('aggregate', by=['unidade', 'nivel'], measures=[['score', 'max'], ['casos', 'nunique']]),
+     step('sort', column='score_max', ascending=True, limit=None)],
+    [step('sort', column='unidade', ascending=False, limit=50)],
+], ids=['chain', 'not-equal', 'contains', 'group-by', 'top-n'])
+def test_pushed_pipeline_matches_pandas(riscos, steps):
+    sources = DataSourceStore()
+    sources['MySQL: riscos'] = riscos
+    pipelines = {'p': {'source': 'MySQL: riscos', 'steps': steps}}
+    pushed, info = PipelineEngine(
+        sources, pipelines, cache=PipelineCache(), remote=lambda name: ('riscos', sqlite_fetch(riscos))
+    ).evaluate('🔄 p')
+    local, _ = PipelineEngine(sources, pipelines, cache=PipelineCache()).evaluate('🔄 p')
+    assert info['pushed'] > 0
+    if steps[-1]['op'] != 'sort':
+        sort_by = list(local.columns)
+        pushed = pushed.sort_values(sort_by).reset_index(drop=True)
+        local = local.sort_values(sort_by).reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        pushed.reset_index(drop=True).astype(object).where(pushed.notna().to_numpy(), None),
+        local.reset_index(drop=True).astype(object).where(local.notna().to_numpy(), None),
+        check_dtype=False, check_exact=False
+    )
+
+
+def test_unloaded_tables_are_queried_without_a_full_load(riscos):
+    loads = []
+
+    def load():
+        loads.append('riscos')
+        return riscos
+
+    remote_sources = {'MySQL: riscos': {'version': 'mysql:riscos:1', 'dtypes': riscos.dtypes.to_dict(), 'load': load}}
+    pipelines = {
+        'altos': {'source': 'MySQL: riscos', 'steps': [step('filter', column='score', operator='>', value='9')]},
+        'ordenados': {'source': 'MySQL: riscos', 'steps': [step('sort', column='score', ascending=True, limit=None)]}
+    }
+    engine = PipelineEngine(DataSourceStore(), pipelines, cache=PipelineCache(),
+                            remote=lambda name: ('riscos', sqlite_fetch(riscos)), remote_sources=remote_sources)
+    assert 'MySQL: riscos' in engine.inputs() and 'MySQL: riscos' not in engine.names()
+    assert engine.columns('🔄 altos', upto=0) == list(riscos.columns)
+    df, info = engine.evaluate('🔄 altos')
+    assert info['pushed'] == 1 and len(df) == (riscos['score'] > 9).sum()
+    assert loads == []
+    engine.evaluate('🔄 ordenados')
+    assert loads == ['riscos']
+
+
+def test_decimal_columns_filter_and_push_down_as_numbers():
+    from decimal import Decimal
+
+    sources = DataSourceStore()
+    sources['MySQL: multas'] = pd.DataFrame({'valor': [Decimal('10.10'), Decimal('2.05'), None]})
+    pipelines = {'p': {'source': 'MySQL: multas', 'steps': [step('filter', column='valor', operator='>', value='2.5'),
+                                                            step('derive', name='dobro', expression='valor * 1.5')]}}
+    engine = PipelineEngine(sources, pipelines, cache=PipelineCache(), remote=lambda name: ('multas', None))
+    assert engine.pushdown('🔄 p')['query'] == "SELECT `valor` FROM `multas` WHERE `valor` > %s"
+    df, _ = PipelineEngine(sources, pipelines, cache=PipelineCache()).evaluate('🔄 p')
+    assert df['valor'].tolist() == [Decimal('10.10')] and df['dobro'].tolist() == pytest.approx([15.15])
+
+
+def test_walking_back_to_a_memoized_step_is_one_lookup(riscos):
+    sources = DataSourceStore()
+    sources['riscos'] = riscos
+    steps = [step('filter', column='casos', operator='>', value='2'),
+             step('derive', name='s2', expression='score * 2'),
+             step('sort', column='s2', ascending=True, limit=5)]
+    pipelines = {'p': {'source': 'riscos', 'steps': steps}}
+    cache = PipelineCache()
+    engine = PipelineEngine(sources, pipelines, cache=cache)
+    engine.evaluate('🔄 p')
+    assert (cache.hits, cache.misses) == (0, 1)
+    steps[2] = step('sort', column='s2', ascending=False, limit=5)
+    _, info = engine.evaluate('🔄 p')
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (info['reused'], info['computed']) == (2, 1)
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+import pandas as pd
+
+from data_store import add_discard_hook, is_decimal, memory_bytes
+from expressions import evaluate
+from sql_pushdown import compile_steps
+
+PIPELINE_PREFIX = "🔄 "
+DEFAULT_MAX_BYTES = int(os.environ.get('COMPLIANCE_PIPELINE_CACHE_MB', '512')) * 1024 ** 2
+OPERATIONS = {
+    "Filtrar": 'filter',
+    "Coluna calculada": 'derive',
+    "Selecionar colunas": 'select',
+    "Juntar": 'join',
+    "Agregar": 'aggregate',
+    "Ordenar": 'sort'
+}
+FILTER_OPERATORS = ['==', '!=', '>', '>=', '<', '<=', 'contém', 'em']
+JOIN_TYPES = {"Interna": 'inner', "À esquerda": 'left', "À direita": 'right', "Completa": 'outer'}
+AGGREGATIONS = {"Soma": 'sum', "Média": 'mean', "Contagem": 'count', "Distintos": 'nunique', "Mínimo": 'min',
+                "Máximo": 'max'}
+
+
+def pipeline_name(name):
+    return f"{PIPELINE_PREFIX}{name}"
+
+
+def describe(step):
+    params = step['params']
+    op = step['op']
+    if op == 'filter':
+        return f"Filtrar {params['column']} {params['operator']} {params['value']}"
+    if op == 'derive':
+        return f"{params['name']} = {params['expression']}"
+    if op == 'select':
+        return f"Selecionar {', '.join(params['columns'])}"
+    if op == 'join':
+        return f"Juntar com {params['right']} por {', '.join(params['on'])} ({params['how']})"
+    if op == 'aggregate':
+        measures = ", ".join(f"{agg}({column})" for column, agg in params['measures'])
+        return f"Agregar {measures} por {', '.join(params['by']) or '(total)'}"
+    if op == 'sort':
+        order = "crescente" if params.get('ascending', True) else "decrescente"
+        limit = f", primeiras {params['limit']}" if params.get('limit') else ""
+        return f"Ordenar por {params['column']} ({order}{limit})"
+    return op
+
+
+def _coerce(series, value):
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return pd.to_numeric(pd.Series([value]), errors='coerce').iloc[0]
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.Timestamp(value)
+    if is_decimal(series):
+        try:
+            return Decimal(str(value).strip())
+        except InvalidOperation:
+            return None
+    return value
+
+
+def _filter(df, params):
+    series = df[params['column']]
+    operator, value = params['operator'], params['value']
+    if operator == 'contém':
+        mask = series.astype('string').str.contains(str(value), case=False, regex=False).fillna(False)
+    elif operator == 'em':
+        values = [v.strip() for v in str(value).split(',') if v.strip()]
+        mask = series.astype('string').isin(values)
+    else:
+        value = _coerce(series, value)
+        mask = {'==': series.__eq__, '!=': series.__ne__, '>': series.__gt__, '>=': series.__ge__,
+                '<': series.__lt__, '<=': series.__le__}[operator](value)
+    return df[mask.fillna(False).to_numpy(dtype=bool)]
+
+
+def apply_step(df, step, resolve):
+    params = step['params']
+    op = step['op']
+    if op == 'filter':
+        return _filter(df, params)
+    if op == 'derive':
+        result = df.copy(deep=False)
+        result[params['name']] = evaluate(params['expression'], df)
+        return result
+    if op == 'select':
+        return df[list(params['columns'])]
+    if op == 'join':
+        right = resolve(params['right'])
+        return df.merge(right, on=list(params['on']), how=params['how'], suffixes=('', '_dir'))
+    if op == 'aggregate':
+        by = list(params['by'])
+        named = {f"{column}_{agg}": (column, agg) for column, agg in params['measures']}
+        if not by:
+            return pd.DataFrame({name: [df[column].agg(agg)] for name, (column, agg) in named.items()})
+        return df.groupby(by, observed=True, sort=False).agg(**named).reset_index()
+    if op == 'sort':
+        result = df.sort_values(params['column'], ascending=params.get('ascending', True), kind='stable')
+        return result.head(params['limit']) if params.get('limit') else result
+    raise ValueError(f"Operação desconhecida: {op}")
+
+
+def _node_key(parent, step, inputs):
+    payload = json.dumps([parent, step['op'], step['params'], inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+class PipelineCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._by_version = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def newest(self, keys):
+        # The last of keys that is memoized, as one lookup: probing the older
+        # ones on the way does not count as misses.
+        with self._lock:
+            for index in range(len(keys) - 1, -1, -1):
+                if keys[index] in self._entries:
+                    self._entries.move_to_end(keys[index])
+                    self.hits += 1
+                    return index, self._entries[keys[index]][0]
+            self.misses += 1
+            return None, None
+
+    def put(self, key, versions, df):
+        size = memory_bytes(df)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (df, size, tuple(versions))
+            self._bytes += size
+            for version in versions:
+                self._by_version.setdefault(version, set()).add(key)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, size, versions = self._entries.pop(key)
+        self._bytes -= size
+        for version in versions:
+            keys = self._by_version.get(version)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_version[version]
+
+    def invalidate_version(self, version):
+        with self._lock:
+            for key in list(self._by_version.get(version, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_version.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pipeline_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PipelineCache()
+            add_discard_hook(_cache.invalidate_version)
+        return _cache
+
+
+class PipelineEngine:
+    # Pipelines are chains of steps over a loaded source or another
+    # pipeline's output; joins add edges, so together they form a DAG. Each
+    # step is a node whose key hashes its parent's key, its parameters and
+    # the keys of any joined input, so a node's key changes exactly when
+    # something upstream of it changes.
+    def __init__(self, sources, pipelines, cache=None, remote=None, remote_sources=None):
+        self.sources = sources
+        self.pipelines = pipelines
+        self.cache = cache or get_pipeline_cache()
+        # remote(source) returns (table, fetch) for sources that can run a
+        # prefix of the steps as SQL, or None.
+        self.remote = remote
+        # Tables registered without being loaded: {name: {'version', 'dtypes',
+        # 'load'}}. Pipelines over them run as SQL and only call load() when
+        # a step has to run in pandas.
+        self.remote_sources = remote_sources or {}
+
+    def names(self):
+        return list(self.sources.keys()) + [pipeline_name(name) for name in self.pipelines]
+
+    def inputs(self):
+        return list(self.sources.keys()) + [
+            name for name in self.remote_sources if name not in self.sources
+        ] + [pipeline_name(name) for name in self.pipelines]
+
+    def _unloaded(self, name):
+        return name not in self.sources and name in self.remote_sources
+
+    def keys(self):
+        return self.names()
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __contains__(self, name):
+        return name in self.sources or self._unloaded(name) or self._pipeline(name) in self.pipelines
+
+    def __getitem__(self, name):
+        return self.evaluate(name)[0]
+
+    @staticmethod
+    def _pipeline(name):
+        if isinstance(name, str) and name.startswith(PIPELINE_PREFIX):
+            return name[len(PIPELINE_PREFIX):]
+        return None
+
+    def _plan(self, name, visiting=()):
+        # Returns [(key, step, source_versions)] for the base input followed
+        # by every step, without touching any data.
+        pipeline = self._pipeline(name)
+        if pipeline is None:
+            version = self.version(name)
+            return [(f"src:{version}", None, (version,))]
+        if pipeline in visiting:
+            raise ValueError(f"Ciclo entre transformações: {' → '.join(visiting + (pipeline,))}")
+        definition = self.pipelines[pipeline]
+        visiting = visiting + (pipeline,)
+        base = self._plan(definition['source'], visiting)
+        nodes = [(base[-1][0], None, base[-1][2])]
+        for step in definition['steps']:
+            parent, _, versions = nodes[-1]
+            inputs = []
+            if step['op'] == 'join':
+                right = self._plan(step['params']['right'], visiting)[-1]
+                inputs.append(right[0])
+                versions = tuple(sorted(set(versions) | set(right[2]), key=str))
+            nodes.append((_node_key(parent, step, inputs), step, versions))
+        return nodes
+
+    def version(self, name):
+        if self._pipeline(name) is None:
+            if self._unloaded(name):
+                return self.remote_sources[name]['version']
+            return self.sources.version(name)
+        return f"pipe:{self._plan(name)[-1][0]}"
+
+    def dtypes(self, name):
+        if self._unloaded(name):
+            return self.remote_sources[name]['dtypes']
+        df = self.sources[name]
+        # Decimal columns are numbers to the SQL compiler, as they are in MySQL.
+        return {column: np.dtype('float64') if is_decimal(df[column]) else dtype
+                for column, dtype in df.dtypes.items()}
+
+    def columns(self, name, upto=None):
+        pipeline = self._pipeline(name)
+        if pipeline is not None and (upto == 0 or not self.pipelines[pipeline]['steps']):
+            return self.columns(self.pipelines[pipeline]['source'])
+        if self._unloaded(name):
+            return list(self.remote_sources[name]['dtypes'])
+        return list(self.evaluate(name, upto)[0].columns)
+
+    def evaluate(self, name, upto=None):
+        started = time.perf_counter()
+        info = {'computed': 0, 'reused': 0, 'pushed': 0, 'steps': [], 'sql': []}
+        df = self._evaluate(name, upto, info)
+        info['seconds'] = time.perf_counter() - started
+        return df, info
+
+    def _evaluate(self, name, upto, info):
+        if self._pipeline(name) is None:
+            if self._unloaded(name):
+                return self.remote_sources[name]['load']()
+            return self.sources[name]
+        nodes = self._plan(name)
+        if upto is not None:
+            nodes = nodes[:upto + 1]
+        # Walk back to the newest memoized node and only compute after it.
+        start = 0
+        df = None
+        if len(nodes) > 1:
+            index, df = self.cache.newest([key for key, _, _ in nodes[1:]])
+            start = 0 if index is None else index + 1
+        pushed = 0
+        if df is None:
+            source = self.pipelines[self._pipeline(name)]['source']
+            df, pushed = self._push_down(name, source, nodes, info)
+            if df is None:
+                df = self._evaluate(source, None, info)
+            start = pushed
+        for index, (key, step, versions) in enumerate(nodes[1:], start=1):
+            if index <= pushed:
+                continue
+            if index <= start:
+                info['reused'] += 1
+                info['steps'].append({'pipeline': name, 'step': index, 'description': describe(step),
+                                      'status': 'reutilizado', 'rows': len(df) if index == start else None, 'ms': 0.0})
+                continue
+            step_started = time.perf_counter()
+            df = apply_step(df, step, lambda right: self._evaluate(right, None, info))
+            self.cache.put(key, versions, df)
+            info['computed'] += 1
+            info['steps'].append({'pipeline': name, 'step': index, 'description': describe(step), 'status': 'calculado',
+                                  'rows': len(df), 'ms': (time.perf_counter() - step_started) * 1000})
+        return df
+
+    def _compile(self, source, nodes):
+        remote = self.remote(source) if self.remote is not None and self._pipeline(source) is None else None
+        if remote is None:
+            return None
+        table, fetch = remote
+        compiled = compile_steps(table, self.dtypes(source), [step for _, step, _ in nodes[1:]])
+        return None if compiled is None else compiled + (fetch,)
+
+    def pushdown(self, name):
+        # The SQL a cold evaluation of the pipeline would send, without
+        # running it; None when every step runs in pandas.
+        pipeline = self._pipeline(name)
+        if pipeline is None:
+            return None
+        compiled = self._compile(self.pipelines[pipeline]['source'], self._plan(name))
+        if compiled is None:
+            return None
+        query, params, pushed, _ = compiled
+        return {'pipeline': name, 'query': query, 'params': params, 'steps': pushed}
+
+    def _push_down(self, name, source, nodes, info):
+        compiled = self._compile(source, nodes)
+        if compiled is None:
+            return None, 0
+        query, params, pushed, fetch = compiled
+        started = time.perf_counter()
+        df = fetch(query, params)
+        if df is None:
+            return None, 0
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        key, _, versions = nodes[pushed]
+        self.cache.put(key, versions, df)
+        info['pushed'] += pushed
+        info['sql'].append({'pipeline': name, 'query': query, 'params': params, 'steps': pushed, 'rows': len(df),
+                            'ms': elapsed_ms})
+        for index in range(1, pushed + 1):
+            info['steps'].append({'pipeline': name, 'step': index, 'description': describe(nodes[index][1]),
+                                  'status': 'MySQL', 'rows': len(df) if index == pushed else None,
+                                  'ms': elapsed_ms if index == pushed else 0.0})
+        return df, pushed